@@ -0,0 +1,422 @@
+# =============================================================================
+# Minet Benchmarks
+# =============================================================================
+#
+# Reproducible benchmarks of minet's hot paths, run against a local server
+# & a generated corpus so that their results can be compared across minet
+# versions. Each benchmark runs in its own process, so that its CPU time &
+# peak RSS can be measured, while the server runs in yet another process.
+#
+# Usage (from the repository's root):
+#   python -m ftest.bench
+#   python -m ftest.bench --only fetch,scrape -o results.json
+#   python -m ftest.bench --compare baseline.json
+#
+# Latencies are measured from the moment an item is consumed from the input
+# to the moment its result is yielded.
+#
+import sys
+import json
+import time
+import resource
+import platform
+import subprocess
+from argparse import ArgumentParser
+from collections import OrderedDict
+from queue import Empty
+from multiprocessing import Process, Queue
+from tempfile import TemporaryDirectory
+
+from ftest.bench.corpus import generate_corpus, read_file
+from ftest.bench.server import serve
+
+SCRAPER = {
+    'fields': {
+        'title': {
+            'sel': 'h1'
+        },
+        'links': {
+            'iterator': 'a',
+            'item': 'href'
+        },
+        'paragraphs': {
+            'iterator': '.content p'
+        }
+    }
+}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def stamped(items, starts):
+    for item in items:
+        starts[item[0]] = time.perf_counter()
+        yield item
+
+
+def mixed_urls(base_url, n, latency):
+    """
+    Function returning urls exercising every feature of the server: plain
+    pages, redirection chains, large pages, slow bodies & other charsets.
+    """
+    urls = []
+
+    for i in range(n):
+        kind = i % 10
+        query = 'latency=%i' % latency
+
+        if kind == 6:
+            url = '/page/%i?%s&size=500' % (i, query)
+        elif kind == 7:
+            url = '/redirect/3/%i?%s' % (i, query)
+        elif kind == 8:
+            url = '/page/%i?%s&chunks=4&chunk_delay=10' % (i, query)
+        elif kind == 9:
+            url = '/page/%i?%s&charset=windows-1252' % (i, query)
+        else:
+            url = '/page/%i?%s' % (i, query)
+
+        urls.append((i, base_url + url))
+
+    return urls
+
+
+def bench_fetch(context):
+    from minet import multithreaded_fetch
+
+    urls = mixed_urls(context['base_url'], context['n'], context['latency'])
+    starts = {}
+    latencies = []
+    errors = 0
+
+    results = multithreaded_fetch(
+        stamped(urls, starts),
+        key=lambda item: item[1],
+        threads=context['threads'],
+        throttle=0,
+        domain_parallelism=context['threads']
+    )
+
+    for result in results:
+        latencies.append(time.perf_counter() - starts[result.item[0]])
+
+        if result.error is not None:
+            errors += 1
+
+    return len(latencies), errors, latencies
+
+
+def bench_resolve(context):
+    from minet import multithreaded_resolve
+
+    urls = [
+        (i, '%s/redirect/%i/%i?latency=%i' % (context['base_url'], 1 + i % 4, i, context['latency']))
+        for i in range(context['n'])
+    ]
+    starts = {}
+    latencies = []
+    errors = 0
+
+    results = multithreaded_resolve(
+        stamped(urls, starts),
+        key=lambda item: item[1],
+        threads=context['threads'],
+        throttle=0,
+        domain_parallelism=context['threads']
+    )
+
+    for result in results:
+        latencies.append(time.perf_counter() - starts[result.item[0]])
+
+        if result.error is not None:
+            errors += 1
+
+    return len(latencies), errors, latencies
+
+
+def bench_crawl(context):
+    from minet import Crawler
+
+    spec = {
+        'start_url': '%s/page/0?pages=%i&links=5&latency=%i' % (
+            context['base_url'],
+            context['n'],
+            context['latency']
+        ),
+        'next': {
+            'scraper': {
+                'iterator': 'a',
+                'item': 'href'
+            }
+        }
+    }
+
+    crawler = Crawler(
+        spec,
+        threads=context['threads'],
+        throttle=0,
+        domain_parallelism=context['threads']
+    )
+
+    jobs = 0
+    errors = 0
+
+    for result in crawler:
+        jobs += 1
+
+        if result.error is not None:
+            errors += 1
+
+    # NOTE: the crawler does not expose when a job was consumed
+    return jobs, errors, None
+
+
+def make_bench_scrape(engine):
+    def bench_scrape(context):
+        from minet import Scraper
+
+        scraper = Scraper(SCRAPER, engine=engine)
+        latencies = []
+
+        for path, encoding in context['files']:
+            start = time.perf_counter()
+            scraper(read_file(path, encoding))
+            latencies.append(time.perf_counter() - start)
+
+        return len(latencies), 0, latencies
+
+    return bench_scrape
+
+
+def bench_extract(context):
+    try:
+        from dragnet import extract_content
+    except ImportError:
+        return None
+
+    latencies = []
+    errors = 0
+
+    for path, encoding in context['files']:
+        start = time.perf_counter()
+
+        try:
+            extract_content(read_file(path, encoding))
+        except Exception:
+            errors += 1
+
+        latencies.append(time.perf_counter() - start)
+
+    return len(latencies), errors, latencies
+
+
+BENCHMARKS = OrderedDict([
+    ('fetch', bench_fetch),
+    ('resolve', bench_resolve),
+    ('crawl', bench_crawl),
+    ('scrape', make_bench_scrape('bs4')),
+    ('scrape-lxml', make_bench_scrape('lxml')),
+    ('extract', bench_extract)
+])
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # NOTE: ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        peak /= 1024
+
+    return peak / 1024
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_benchmark(name, context, queue):
+    cpu_before = cpu_time()
+    start = time.perf_counter()
+
+    outcome = BENCHMARKS[name](context)
+
+    elapsed = time.perf_counter() - start
+
+    if outcome is None:
+        queue.put(None)
+        return
+
+    items, errors, latencies = outcome
+
+    queue.put({
+        'items': items,
+        'errors': errors,
+        'seconds': elapsed,
+        'items_per_second': items / elapsed if elapsed else None,
+        'p50_ms': percentile(latencies, 0.5) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+        'cpu_seconds': cpu_time() - cpu_before,
+        'peak_rss_mb': peak_rss_mb()
+    })
+
+
+def wait_for_result(process, queue):
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+
+            # NOTE: the benchmark crashed
+            if not process.is_alive():
+                return None
+
+
+def run_server(queue):
+    server, base_url = serve()
+    queue.put(base_url)
+
+    while True:
+        time.sleep(3600)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def format_number(value, precision=1):
+    if value is None:
+        return '-'
+
+    return '%.*f' % (precision, value)
+
+
+def print_results(results, baseline=None):
+    columns = ['benchmark', 'items', 'items/s', 'p50 ms', 'p99 ms', 'cpu s', 'rss MB', 'errors']
+
+    if baseline is not None:
+        columns.append('vs baseline')
+
+    rows = []
+
+    for name, result in results.items():
+        if result is None:
+            rows.append([name, 'skipped'] + [''] * (len(columns) - 2))
+            continue
+
+        row = [
+            name,
+            str(result['items']),
+            format_number(result['items_per_second']),
+            format_number(result['p50_ms'], 2),
+            format_number(result['p99_ms'], 2),
+            format_number(result['cpu_seconds'], 2),
+            format_number(result['peak_rss_mb']),
+            str(result['errors'])
+        ]
+
+        if baseline is not None:
+            reference = baseline['benchmarks'].get(name)
+
+            if reference and reference['items_per_second'] and result['items_per_second']:
+                row.append('%+.1f%%' % (100 * (result['items_per_second'] / reference['items_per_second'] - 1)))
+            else:
+                row.append('-')
+
+        rows.append(row)
+
+    widths = [max(len(str(r[i])) for r in [columns] + rows) for i in range(len(columns))]
+
+    for row in [columns] + rows:
+        print('  '.join(str(cell).ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = ArgumentParser(prog='python -m ftest.bench')
+    parser.add_argument('--only', help='Benchmarks to run, separated by commas. Runs everything by default.')
+    parser.add_argument('-n', type=int, default=2000, help='Number of urls to fetch & resolve, or of pages to crawl. Defaults to 2000.')
+    parser.add_argument('--corpus-size', type=int, default=500, help='Number of files to scrape & extract. Defaults to 500.')
+    parser.add_argument('--latency', type=int, default=20, help='Simulated server latency, in milliseconds. Defaults to 20.')
+    parser.add_argument('-t', '--threads', type=int, default=25, help='Number of threads to use. Defaults to 25.')
+    parser.add_argument('-o', '--output', help='Path of a JSON file where the results will be written.')
+    parser.add_argument('--compare', help='Path of a JSON file of previous results to compare with.')
+
+    args = parser.parse_args()
+
+    names = list(BENCHMARKS) if args.only is None else args.only.split(',')
+
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark "%s"' % name)
+
+    baseline = None
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    from minet import __version__
+
+    server_queue = Queue()
+    server = Process(target=run_server, args=(server_queue,), daemon=True)
+    server.start()
+
+    base_url = server_queue.get()
+
+    results = OrderedDict()
+
+    with TemporaryDirectory(prefix='minet-bench-') as folder:
+        _, files = generate_corpus(folder, n=args.corpus_size)
+
+        context = {
+            'base_url': base_url,
+            'files': files,
+            'n': args.n,
+            'latency': args.latency,
+            'threads': args.threads
+        }
+
+        for name in names:
+            print('Running %s...' % name, file=sys.stderr)
+
+            queue = Queue()
+            process = Process(target=run_benchmark, args=(name, context, queue))
+            process.start()
+            results[name] = wait_for_result(process, queue)
+            process.join()
+
+    server.terminate()
+
+    report = {
+        'minet': __version__,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': vars(args),
+        'benchmarks': results
+    }
+
+    print_results(results, baseline)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# =============================================================================
+# Minet Benchmark Corpus
+# =============================================================================
+#
+# Function generating a deterministic corpus of stored html files, laid out
+# exactly like the output of `minet fetch`, i.e. a report & a folder of
+# files, some of them gzipped and using various charsets, used by the
+# scrape & extract benchmarks.
+#
+import csv
+import gzip
+from os import makedirs
+from os.path import join
+
+from ftest.bench.server import generate_page
+
+CHARSETS = ['utf-8', 'utf-8', 'utf-8', 'windows-1252', 'latin-1', 'shift_jis']
+SIZES = [5, 10, 20, 50, 200]
+
+
+def generate_corpus(folder, n=1000):
+    """
+    Function writing the corpus in the given folder and returning the path
+    of its report & the list of its files, as (path, encoding) tuples.
+    """
+    content_folder = join(folder, 'content')
+    makedirs(content_folder, exist_ok=True)
+
+    report_path = join(folder, 'report.csv')
+    files = []
+
+    with open(report_path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['url', 'status', 'filename', 'encoding'])
+
+        for i in range(n):
+            charset = CHARSETS[i % len(CHARSETS)]
+            size = SIZES[i % len(SIZES)]
+            compressed = i % 4 == 0
+
+            filename = '%i.html' % i
+
+            if compressed:
+                filename += '.gz'
+
+            body = generate_page(i, size=size, links=20, charset=charset)
+
+            with open(join(content_folder, filename), 'wb') as cf:
+                cf.write(gzip.compress(body) if compressed else body)
+
+            writer.writerow(['http://localhost/page/%i' % i, 200, filename, charset])
+            files.append((join(content_folder, filename), charset))
+
+    return report_path, files
+
+
+def read_file(path, encoding):
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            return f.read().decode(encoding, errors='replace')
+
+    with open(path, 'rb') as f:
+        return f.read().decode(encoding, errors='replace')
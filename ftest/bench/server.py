@@ -0,0 +1,170 @@
+# =============================================================================
+# Minet Benchmark Server
+# =============================================================================
+#
+# Local HTTP server used by the benchmarks, able to simulate latency,
+# redirection chains, slow bodies, various charsets & large pages. Every
+# page is deterministically generated from its path so that results are
+# comparable across runs & versions.
+#
+# Routes:
+#   /page/<n>             html page n, linking to other pages
+#   /redirect/<k>/<n>     chain of k redirections ending on /page/<n>
+#
+# Query parameters (for every route):
+#   latency=<ms>          time to wait before responding
+#   size=<kb>             approximative size of the page's body
+#   charset=<name>        encoding of the body (declared in a meta tag)
+#   links=<k>             number of links to other pages (modulo pages)
+#   pages=<n>             total number of pages, for links
+#   chunks=<k>            number of chunks the body is sent in
+#   chunk_delay=<ms>      time to wait between two chunks
+#
+import time
+import random
+from threading import Thread
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+WORDS = [
+    'minet', 'crawl', 'fetch', 'scrape', 'page', 'web', 'media', 'social',
+    'données', 'résumé', 'élection', 'société', 'ça', 'naïve', 'œuvre'
+]
+
+
+def generate_page(n, size=10, links=5, pages=1000, charset='utf-8', query=''):
+    rng = random.Random(n)
+    title = ' '.join(rng.choice(WORDS) for _ in range(5))
+
+    parts = [
+        '<!DOCTYPE html>\n<html><head>',
+        '<meta charset="%s">' % charset,
+        '<title>%s</title></head><body>' % title,
+        '<h1>%s</h1>' % title,
+        '<ul class="links">'
+    ]
+
+    for _ in range(links):
+        target = rng.randrange(pages)
+        parts.append('<li><a href="/page/%i%s">page %i</a></li>' % (target, query, target))
+
+    parts.append('</ul><div class="content">')
+
+    length = sum(len(part) for part in parts)
+
+    while length < size * 1024:
+        paragraph = '<p>%s.</p>\n' % ' '.join(rng.choice(WORDS) for _ in range(40))
+        parts.append(paragraph)
+        length += len(paragraph)
+
+    parts.append('</div></body></html>')
+
+    return ''.join(parts).encode(charset, errors='xmlcharrefreplace')
+
+
+class BenchmarkRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # NOTE: headers & body are written separately, which would otherwise
+    # wait for delayed ACKs on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        path = url.path.strip('/').split('/')
+
+        latency = float(params.get('latency', 0)) / 1000
+
+        if latency:
+            time.sleep(latency)
+
+        try:
+            if path[0] == 'redirect':
+                hops, n = int(path[1]), int(path[2])
+
+                if hops > 1:
+                    location = '/redirect/%i/%i' % (hops - 1, n)
+                else:
+                    location = '/page/%i' % n
+
+                if url.query:
+                    location += '?' + url.query
+
+                self.send_response(302)
+                self.send_header('Location', location)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            if path[0] != 'page':
+                raise ValueError
+
+            n = int(path[1])
+        except (ValueError, IndexError):
+            self.send_error(404)
+            return
+
+        charset = params.get('charset', 'utf-8')
+
+        # Links keep the same query so that crawled pages behave the same
+        body = generate_page(
+            n,
+            size=int(params.get('size', 10)),
+            links=int(params.get('links', 5)),
+            pages=int(params.get('pages', 1000)),
+            charset=charset,
+            query=('?' + url.query) if url.query else ''
+        )
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        chunks = int(params.get('chunks', 1))
+        chunk_delay = float(params.get('chunk_delay', 0)) / 1000
+        chunk_size = len(body) // chunks + 1
+
+        for i in range(0, len(body), chunk_size):
+            if i and chunk_delay:
+                time.sleep(chunk_delay)
+
+            self.wfile.write(body[i:i + chunk_size])
+
+
+class BenchmarkServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    # NOTE: clients may close connections early, e.g. when resolving urls
+    def handle_error(self, request, client_address):
+        pass
+
+
+def serve(port=0):
+    """
+    Function starting the benchmark server in a daemon thread and returning
+    the server & its base url.
+    """
+    server = BenchmarkServer(('localhost', port), BenchmarkRequestHandler)
+
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server, 'http://localhost:%i' % server.server_address[1]
+
+
+if __name__ == '__main__':
+    server, base_url = serve(8000)
+    print('Serving on %s' % base_url)
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -9,7 +9,13 @@ from minet.crawl import (
     DefinitionSpider
 )
 from minet.fetch import multithreaded_fetch, multithreaded_resolve
-from minet.scrape import scrape, Scraper
+from minet.rate_limiting import (
+    GCRARateLimiter,
+    MemoryRateLimiterBackend,
+    SharedMemoryRateLimiterBackend,
+    FileRateLimiterBackend
+)
+from minet.scrape import scrape, Scraper, ParsedDocument
 from minet.utils import (
     RateLimiter,
     RateLimiterState,
@@ -0,0 +1,583 @@
+# =============================================================================
+# Minet Async Fetch
+# =============================================================================
+#
+# Exposing an asyncio-based alternative to `multithreaded_fetch` able to keep
+# thousands of sockets open on a single event loop, while still respecting
+# the same per-domain throttle, parallelism & buffering semantics.
+#
+# Note that this engine relies on the optional `aiohttp` dependency.
+#
+import ssl
+import socket
+import asyncio
+import certifi
+import aiohttp
+from queue import Queue
+from threading import Thread
+from itertools import islice
+from collections import deque, OrderedDict
+from urllib.parse import urljoin
+from urllib3 import HTTPResponse, Timeout
+from urllib3._collections import HTTPHeaderDict
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    NewConnectionError,
+    ProtocolError,
+    ReadTimeoutError,
+    SSLError
+)
+from ural import ensure_protocol, is_url
+
+from minet.url_cache import get_domain_name
+from minet.fetch import FetchWorkerPayload, FetchWorkerResult, write_chunks
+from minet.utils import (
+    build_request_headers,
+    check_content_length,
+    extract_response_meta,
+    parse_http_refresh,
+    REDIRECT_STATUSES,
+    STREAM_CHUNK_SIZE
+)
+
+from minet.exceptions import (
+    MaxRedirectsError,
+    InfiniteRedirectsError,
+    InvalidRedirectError,
+    InvalidURLError,
+    ResponseTooLargeError,
+    SelfRedirectError
+)
+
+from minet.defaults import (
+    DEFAULT_ASYNC_CONCURRENCY,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_GROUP_PARALLELISM,
+    DEFAULT_GROUP_BUFFER_SIZE,
+    DEFAULT_THROTTLE
+)
+
+# Number of input items read at once from the given iterator
+INPUT_CHUNK_SIZE = 256
+
+# Time to wait when the consumer cannot keep up with the produced results
+BACKPRESSURE_SLEEP = 0.01
+
+THE_END = object()
+AN_ERROR = object()
+
+# NOTE: those are only distinguished by recent versions of aiohttp
+CONNECT_TIMEOUT_ERRORS = getattr(aiohttp, 'ConnectionTimeoutError', ())
+DNS_ERRORS = getattr(aiohttp, 'ClientConnectorDNSError', ())
+
+
+def timeout_to_aiohttp(timeout):
+    if timeout is None:
+        return aiohttp.ClientTimeout(
+            sock_connect=DEFAULT_CONNECT_TIMEOUT,
+            sock_read=DEFAULT_READ_TIMEOUT
+        )
+
+    if isinstance(timeout, Timeout):
+        return aiohttp.ClientTimeout(
+            total=timeout.total,
+            sock_connect=timeout.connect_timeout,
+            sock_read=timeout.read_timeout
+        )
+
+    return aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+
+
+def to_urllib3_error(error, url):
+    """
+    Function converting an aiohttp or asyncio error into the urllib3 one
+    `multithreaded_fetch` would return in the same situation, so that both
+    engines report & retry the same errors.
+    """
+    if isinstance(error, CONNECT_TIMEOUT_ERRORS):
+        return ConnectTimeoutError('Connection to %s timed out.' % url)
+
+    if isinstance(error, asyncio.TimeoutError):
+        return ReadTimeoutError(None, url, 'Read timed out.')
+
+    if isinstance(error, aiohttp.ClientSSLError):
+        return SSLError(str(error))
+
+    if isinstance(error, aiohttp.ClientConnectorError):
+        os_error = error.os_error
+
+        # NOTE: the cause tells unresolvable hosts from refused connections
+        if isinstance(error, DNS_ERRORS) and not isinstance(os_error, socket.gaierror):
+            os_error = socket.gaierror(os_error.errno, os_error.strerror)
+
+        converted = NewConnectionError(
+            None,
+            'Failed to establish a new connection: %s' % os_error
+        )
+        converted.__cause__ = os_error
+
+        return converted
+
+    if isinstance(error, (
+        aiohttp.ServerDisconnectedError,
+        aiohttp.ClientOSError,
+        aiohttp.ClientPayloadError
+    )):
+        return ProtocolError('Connection aborted.', error)
+
+    return error
+
+
+def to_urllib3_response(method, url, response, data):
+    """
+    Function converting an aiohttp response into an urllib3 one, so that the
+    results are interchangeable with those of `multithreaded_fetch`.
+    """
+    headers = HTTPHeaderDict()
+
+    for k, v in response.headers.items():
+
+        # NOTE: body has already been decompressed by aiohttp
+        if k.lower() == 'content-encoding':
+            continue
+
+        headers.add(k, v)
+
+    converted = HTTPResponse(
+        headers=headers,
+        status=response.status,
+        reason=response.reason,
+        preload_content=False,
+        request_method=method,
+        request_url=url
+    )
+
+    converted._body = data
+
+    return converted
+
+
+async def read_body(response, max_body_size=None):
+    if max_body_size is None:
+        return await response.read()
+
+    body = bytearray()
+
+    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+        body.extend(chunk)
+
+        if len(body) > max_body_size:
+            raise ResponseTooLargeError(
+                'Response body exceeds the %i bytes limit' % max_body_size
+            )
+
+    return bytes(body)
+
+
+async def async_request(session, url, method='GET', headers=None, cookie=None,
+                        spoof_ua=True, follow_redirects=True, max_redirects=5,
+                        follow_refresh_header=True, timeout=None, body=None,
+                        json_body=None, max_body_size=None):
+    """
+    Coroutine performing a request using the given aiohttp session and
+    following redirections the same way `minet.utils.request` does.
+    """
+
+    final_headers = build_request_headers(
+        headers=headers,
+        cookie=cookie,
+        spoof_ua=spoof_ua,
+        json_body=json_body is not None
+    )
+
+    request_kwargs = {
+        'headers': final_headers,
+        'allow_redirects': False
+    }
+
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    if body is not None:
+        request_kwargs['data'] = body
+
+    if json_body is not None:
+        request_kwargs['json'] = json_body
+
+    if timeout is not None:
+        request_kwargs['timeout'] = timeout_to_aiohttp(timeout)
+
+    seen = set()
+
+    for _ in range(max_redirects if follow_redirects else 1):
+
+        # Validating URL
+        if not is_url(url, require_protocol=True, tld_aware=True, allow_spaces_in_path=True):
+            return InvalidURLError('Invalid URL'), None
+
+        # Cycle
+        if url in seen:
+            return InfiniteRedirectsError('Infinite redirects'), None
+
+        seen.add(url)
+
+        location = None
+
+        try:
+            async with session.request(method, url, **request_kwargs) as response:
+                if follow_redirects:
+                    if response.status in REDIRECT_STATUSES:
+                        location = response.headers.get('location')
+
+                        # Invalid redirection
+                        if not location:
+                            return InvalidRedirectError('Redirection is invalid'), None
+
+                    elif response.status < 400 and follow_refresh_header:
+                        refresh = response.headers.get('refresh')
+
+                        if refresh is not None:
+                            p = parse_http_refresh(refresh)
+
+                            if p is not None:
+                                location = p[1]
+
+                # Found the end
+                if location is None:
+                    converted = to_urllib3_response(method, url, response, None)
+
+                    if max_body_size is not None:
+                        check_content_length(converted, max_body_size)
+
+                    converted._body = await read_body(response, max_body_size)
+
+                    return None, converted
+
+        except Exception as e:
+            return to_urllib3_error(e, url), None
+
+        # Resolving next url
+        next_url = urljoin(url, location.strip())
+
+        # Self loop?
+        if next_url == url:
+            return SelfRedirectError('Self redirection'), None
+
+        url = next_url
+
+    return MaxRedirectsError('Maximum number of redirects exceeded'), None
+
+
+class DomainState(object):
+    __slots__ = ('running', 'buffer', 'parked', 'next_start', 'timer')
+
+    def __init__(self):
+        self.running = 0
+        self.buffer = deque()
+        self.parked = deque()
+        self.next_start = 0.0
+        self.timer = None
+
+    def is_idle(self):
+        return (
+            self.running == 0 and
+            not self.buffer and
+            not self.parked and
+            self.timer is None
+        )
+
+
+def async_fetch(iterator, key=None, request_args=None, concurrency=DEFAULT_ASYNC_CONCURRENCY,
+                throttle=DEFAULT_THROTTLE, guess_extension=True, guess_encoding=True,
+                buffer_size=DEFAULT_GROUP_BUFFER_SIZE, insecure=False, timeout=None,
+                domain_parallelism=DEFAULT_GROUP_PARALLELISM, max_body_size=None,
+                stream_to=None):
+    """
+    Function returning an iterator over fetched urls, using a single asyncio
+    event loop running in a separate thread.
+
+    Args:
+        iterator (iterable): An iterator over urls or arbitrary items.
+        key (callable, optional): Function extracting url from yielded items.
+        request_args (callable, optional): Function returning specific
+            arguments to pass to the request util per yielded item.
+        concurrency (int, optional): Max number of requests in flight at once.
+            Defaults to 1000.
+        throttle (float or callable, optional): Per-domain throttle in seconds.
+            Or a function taking domain name and item and returning the
+            throttle to apply. Defaults to 0.2.
+        guess_extension (bool, optional): Attempt to guess the resource's
+            extension? Defaults to True.
+        guess_encoding (bool, optional): Attempt to guess the resource's
+            encoding? Defaults to True.
+        domain_parallelism (int, optional): Max number of urls per domain to
+            hit at the same time. Defaults to 1.
+        buffer_size (int, optional): Max number of items per domain to enqueue
+            into memory in hope of finding a new domain that can be processed
+            immediately. Items of a domain whose buffer is full are parked
+            until it has room, without blocking other domains, as long as
+            less than `concurrency` items are parked overall. Defaults to 25.
+        insecure (bool, optional): Whether to ignore SSL certification errors
+            when performing requests. Defaults to False.
+        timeout (float or urllib3.Timeout, optional): Custom timeout for every
+            request.
+        max_body_size (int, optional): Max number of bytes to read from a
+            response's body before giving up with a `ResponseTooLargeError`.
+        stream_to (callable, optional): Function taking url, item & meta and
+            returning a writable binary file into which the response's body
+            will be written, or None. Note that, contrary to
+            `multithreaded_fetch`, bodies are still read in memory first
+            but will be written & released from a separate thread.
+
+    Yields:
+        FetchWorkerResult
+
+    """
+
+    output_queue = Queue()
+    iterator = iter(iterator)
+
+    def take():
+        return list(islice(iterator, INPUT_CHUNK_SIZE))
+
+    async def run():
+        loop = asyncio.get_event_loop()
+
+        if insecure:
+            ssl_context = False
+        else:
+            ssl_context = ssl.create_default_context(cafile=certifi.where())
+
+        connector = aiohttp.TCPConnector(limit=concurrency, ssl=ssl_context)
+
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout_to_aiohttp(timeout),
+            cookie_jar=aiohttp.DummyCookieJar()
+        )
+
+        domains = {}
+        waiting_domains = OrderedDict()
+        changed = asyncio.Event()
+
+        # NOTE: using a dict to be able to mutate counters from closures
+        counters = {'in_flight': 0, 'buffered': 0, 'parked': 0}
+
+        def notify():
+            changed.set()
+
+        def forget(domain):
+            state = domains.get(domain)
+
+            if state is not None and state.is_idle() and state.next_start <= loop.time():
+                del domains[domain]
+
+        def release_throttled(domain, state):
+            state.timer = None
+            dispatch(domain, state)
+
+        def dispatch(domain, state):
+            while state.buffer and state.running < domain_parallelism:
+
+                if counters['in_flight'] >= concurrency:
+                    waiting_domains[domain] = state
+                    return
+
+                now = loop.time()
+
+                if now < state.next_start:
+                    if state.timer is None:
+                        state.timer = loop.call_at(state.next_start, release_throttled, domain, state)
+                    return
+
+                item, url = state.buffer.popleft()
+                counters['buffered'] -= 1
+
+                if state.parked:
+                    state.buffer.append(state.parked.popleft())
+                    counters['buffered'] += 1
+                    counters['parked'] -= 1
+
+                state.running += 1
+                counters['in_flight'] += 1
+
+                payload = FetchWorkerPayload(http=session, item=item, url=url)
+
+                throttle_time = (
+                    (throttle(domain, payload) or 0)
+                    if callable(throttle)
+                    else throttle
+                )
+
+                state.next_start = now + throttle_time
+
+                loop.create_task(work(domain, state, payload))
+                notify()
+
+        async def work(domain, state, payload):
+            _, item, url = payload
+
+            try:
+                kwargs = request_args(url, item) if request_args is not None else {}
+
+                error, response = await async_request(
+                    session,
+                    url,
+                    max_body_size=max_body_size,
+                    **kwargs
+                )
+
+                meta = None
+
+                if error is None:
+                    meta = extract_response_meta(
+                        response,
+                        guess_encoding=guess_encoding,
+                        guess_extension=guess_extension,
+                        data=response._body
+                    )
+
+                    if stream_to is not None and response._body:
+                        try:
+                            await loop.run_in_executor(None, write_body, url, item, meta, response)
+                        except Exception as e:
+                            error = e
+
+                output_queue.put_nowait((None, FetchWorkerResult(
+                    url=url,
+                    item=item,
+                    error=error,
+                    response=response,
+                    meta=meta
+                )))
+
+            except BaseException as e:
+                output_queue.put_nowait((AN_ERROR, e))
+                return
+
+            # Holding the slot while the consumer is lagging behind
+            while output_queue.qsize() >= concurrency:
+                await asyncio.sleep(BACKPRESSURE_SLEEP)
+
+            state.running -= 1
+            counters['in_flight'] -= 1
+
+            dispatch(domain, state)
+
+            while waiting_domains and counters['in_flight'] < concurrency:
+                other_domain, other_state = waiting_domains.popitem(last=False)
+                dispatch(other_domain, other_state)
+
+            if state.is_idle():
+                loop.call_at(state.next_start, forget, domain)
+
+            notify()
+
+        def write_body(url, item, meta, response):
+            f = stream_to(url, item, meta)
+
+            if f is None:
+                return
+
+            try:
+                meta['size'] = write_chunks(f, [response._body])
+            finally:
+                f.close()
+
+            response._body = None
+
+        async def admit(item):
+            url = item if key is None else key(item)
+
+            if not url:
+                output_queue.put_nowait((None, FetchWorkerResult(
+                    url=None,
+                    item=item,
+                    error=None,
+                    response=None,
+                    meta=None
+                )))
+
+                return
+
+            # Url cleanup
+            url = ensure_protocol(url.strip())
+
+            domain = get_domain_name(url)
+            state = domains.get(domain)
+
+            if state is None:
+                state = DomainState()
+                domains[domain] = state
+
+            # Parking the item when its domain's buffer is full, so that other
+            # domains can still be admitted
+            if len(state.buffer) >= buffer_size or state.parked:
+                while counters['parked'] >= concurrency:
+                    changed.clear()
+                    await changed.wait()
+
+                # NOTE: the domain may have been forgotten in the meantime
+                state = domains.setdefault(domain, state)
+
+                # NOTE: the buffer may have been drained in the meantime
+                if len(state.buffer) >= buffer_size or state.parked:
+                    state.parked.append((item, url))
+                    counters['parked'] += 1
+                    return
+
+            # Waiting for some room in the buffers
+            while counters['buffered'] >= concurrency:
+                changed.clear()
+                await changed.wait()
+
+            state = domains.setdefault(domain, state)
+            state.buffer.append((item, url))
+            counters['buffered'] += 1
+
+            dispatch(domain, state)
+
+        async with session:
+            while True:
+                chunk = await loop.run_in_executor(None, take)
+
+                if not chunk:
+                    break
+
+                for item in chunk:
+                    await admit(item)
+
+            while counters['in_flight'] != 0 or counters['buffered'] != 0:
+                changed.clear()
+                await changed.wait()
+
+    def boot():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        try:
+            loop.run_until_complete(run())
+        except BaseException as e:
+            output_queue.put_nowait((AN_ERROR, e))
+        finally:
+            loop.close()
+
+        output_queue.put_nowait((None, THE_END))
+
+    thread = Thread(target=boot, daemon=True)
+    thread.start()
+
+    def output():
+        while True:
+            error, result = output_queue.get()
+
+            if error is AN_ERROR:
+                raise result
+
+            if result is THE_END:
+                break
+
+            yield result
+
+    return output()
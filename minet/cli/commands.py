@@ -7,8 +7,14 @@
 import sys
 from argparse import FileType
 
-from minet.defaults import DEFAULT_THROTTLE
-from minet.cli.defaults import DEFAULT_CONTENT_FOLDER
+from minet.defaults import (
+    DEFAULT_GROUP_PARALLELISM,
+    DEFAULT_THROTTLE,
+    DEFAULT_ADAPTIVE_THROTTLE_MIN_DELAY,
+    DEFAULT_ADAPTIVE_THROTTLE_MAX_DELAY,
+    DEFAULT_DNS_TTL
+)
+from minet.cli.defaults import DEFAULT_CONTENT_FOLDER, DEFAULT_METRICS_INTERVAL
 from minet.cli.utils import die
 from minet.cli.argparse import (
     BooleanAction,
@@ -19,9 +25,79 @@ from minet.cli.argparse import (
 from minet.crowdtangle.constants import (
     CROWDTANGLE_SORT_TYPES,
     CROWDTANGLE_SUMMARY_SORT_TYPES,
-    CROWDTANGLE_DEFAULT_RATE_LIMIT
+    CROWDTANGLE_DEFAULT_RATE_LIMIT,
+    CROWDTANGLE_SUMMARY_DEFAULT_THREADS
 )
 
+CACHE_ARGUMENTS = [
+    {
+        'flag': '--cache',
+        'help': 'Path to a directory used as a persistent HTTP cache, so that responses don\'t need to be downloaded again when re-running a command.'
+    },
+    {
+        'flag': '--cache-max-size',
+        'help': 'Max size - in bytes - of the HTTP cache. Least recently used responses will be evicted when exceeding it.',
+        'type': int
+    },
+    {
+        'flag': '--cache-ttl',
+        'help': 'Number of seconds after which a cached response must be revalidated, using ETag or Last-Modified when possible, or downloaded again. By default, cached responses never expire.',
+        'type': float
+    }
+]
+
+ADAPTIVE_THROTTLE_ARGUMENTS = [
+    {
+        'flag': '--adaptive-throttle',
+        'help': 'Whether to adapt the throttle & parallelism of each domain to its response times, errors & Retry-After headers. --throttle then becomes the initial throttle of every domain and --domain-parallelism their max parallelism.',
+        'action': 'store_true'
+    },
+    {
+        'flag': '--max-throttle',
+        'help': 'Max throttle - in seconds - of a domain when using --adaptive-throttle, which also caps the time waited because of Retry-After headers. Defaults to %s.' % DEFAULT_ADAPTIVE_THROTTLE_MAX_DELAY,
+        'type': float,
+        'default': DEFAULT_ADAPTIVE_THROTTLE_MAX_DELAY
+    },
+    {
+        'flag': '--min-throttle',
+        'help': 'Min throttle - in seconds - of a domain when using --adaptive-throttle. Defaults to %s.' % DEFAULT_ADAPTIVE_THROTTLE_MIN_DELAY,
+        'type': float,
+        'default': DEFAULT_ADAPTIVE_THROTTLE_MIN_DELAY
+    }
+]
+
+DNS_CACHE_ARGUMENTS = [
+    {
+        'flag': '--dns-cache',
+        'help': 'Whether to cache DNS lookups in memory, and to prefetch the hostnames of urls waiting to be processed, instead of resolving them using the system resolver for each new connection.',
+        'action': 'store_true'
+    },
+    {
+        'flag': '--dns-ttl',
+        'help': 'Time - in seconds - to keep DNS lookups in cache when using --dns-cache. Defaults to %s.' % DEFAULT_DNS_TTL,
+        'type': float,
+        'default': DEFAULT_DNS_TTL
+    }
+]
+
+INSTRUMENTATION_ARGUMENTS = [
+    {
+        'flag': '--instrument',
+        'help': 'Whether to record how long every url spends in each stage of its processing (queue, dns, connect, tls, ttfb, body, meta, write etc.) and regularly print a summary of those timings.',
+        'action': 'store_true'
+    },
+    {
+        'flag': '--metrics',
+        'help': 'Path to a JSON file where global & per-domain timing histograms will be regularly written. Implies --instrument.'
+    },
+    {
+        'flag': '--metrics-interval',
+        'help': 'Number of seconds between two summaries or writes of the metrics file. Defaults to %s.' % DEFAULT_METRICS_INTERVAL,
+        'type': float,
+        'default': DEFAULT_METRICS_INTERVAL
+    }
+]
+
 
 def check_dragnet():
     try:
@@ -59,11 +135,22 @@ MINET_COMMANDS = {
                 'name': 'crawler',
                 'help': 'Path to the crawler definition file.'
             },
+            {
+                'flag': '--domain-parallelism',
+                'help': 'Max number of urls per domain to hit at the same time. Defaults to %s.' % DEFAULT_GROUP_PARALLELISM,
+                'type': int,
+                'default': DEFAULT_GROUP_PARALLELISM
+            },
             {
                 'flags': ['-d', '--output-dir'],
                 'help': 'Output directory.',
                 'default': 'crawl'
             },
+            {
+                'flag': '--engine',
+                'help': 'Scraping engine to use. "lxml" is faster but definitions relying on python evaluation will still run using "bs4". Defaults to the engine given by the definitions, else "bs4".',
+                'choices': ['bs4', 'lxml']
+            },
             {
                 'flag': '--resume',
                 'help': 'Whether to resume an interrupted crawl.',
@@ -75,7 +162,7 @@ MINET_COMMANDS = {
                 'type': float,
                 'default': DEFAULT_THROTTLE
             },
-        ]
+        ] + ADAPTIVE_THROTTLE_ARGUMENTS + CACHE_ARGUMENTS + DNS_CACHE_ARGUMENTS + INSTRUMENTATION_ARGUMENTS
     },
 
     # Crowdtangle action subparser
@@ -99,6 +186,10 @@ MINET_COMMANDS = {
                     'type': int,
                     'default': CROWDTANGLE_DEFAULT_RATE_LIMIT
                 },
+                {
+                    'flag': '--rate-limit-file',
+                    'help': 'Path to a local file used to share the rate limit with other minet processes using the same token.'
+                },
                 {
                     'flags': ['-o', '--output'],
                     'help': 'Path to the output file. By default, everything will be printed to stdout.'
@@ -107,7 +198,7 @@ MINET_COMMANDS = {
                     'flags': ['-t', '--token'],
                     'help': 'CrowdTangle dashboard API token.'
                 }
-            ],
+            ] + CACHE_ARGUMENTS,
             'commands': {
                 'leaderboard': {
                     'title': 'Minet CrowdTangle Leaderboard Command',
@@ -215,6 +306,12 @@ MINET_COMMANDS = {
                         {
                             'flag': '--start-date',
                             'help': 'The earliest date at which a post could be posted (UTC!).'
+                        },
+                        {
+                            'flag': '--threads',
+                            'help': 'Number of days to fetch concurrently, within the rate limit. Requires `--partition-strategy day`. Defaults to 1.',
+                            'type': int,
+                            'default': 1
                         }
                     ]
                 },
@@ -333,6 +430,12 @@ MINET_COMMANDS = {
                             'flag': '--start-date',
                             'help': 'The earliest date at which a post could be posted (UTC!).'
                         },
+                        {
+                            'flag': '--threads',
+                            'help': 'Number of days to fetch concurrently, within the rate limit. Requires `--partition-strategy day`. Defaults to 1.',
+                            'type': int,
+                            'default': 1
+                        },
                         {
                             'flag': '--types',
                             'help': 'Types of post to include, separated by comma.',
@@ -366,8 +469,12 @@ MINET_COMMANDS = {
                         },
                         {
                             'name': '--posts',
-                            'help': 'Path to a file containing the retrieved posts.',
-                            'type': FileType('w')
+                            'help': 'Path to a file containing the retrieved posts.'
+                        },
+                        {
+                            'flag': '--resume',
+                            'help': 'Whether to resume an aborted collection. Requires -o/--output.',
+                            'action': 'store_true'
                         },
                         {
                             'flags': ['-s', '--select'],
@@ -383,6 +490,12 @@ MINET_COMMANDS = {
                             'flag': '--start-date',
                             'help': 'The earliest date at which a post could be posted (UTC!).'
                         },
+                        {
+                            'flag': '--threads',
+                            'help': 'Max number of links to summarize concurrently, within the rate limit. Defaults to %i.' % CROWDTANGLE_SUMMARY_DEFAULT_THREADS,
+                            'type': int,
+                            'default': CROWDTANGLE_SUMMARY_DEFAULT_THREADS
+                        },
                         {
                             'flag': '--total',
                             'help': 'Total number of HTML documents. Necessary if you want to display a finite progress indicator.',
@@ -700,11 +813,28 @@ MINET_COMMANDS = {
                 'dest': 'contents_in_report',
                 'action': BooleanAction
             },
+            {
+                'flag': '--dedupe',
+                'help': 'Whether to fetch urls occurring many times in the input only once, as compared using their normalized form. Duplicate lines will be reported using the response, and file, of the first occurrence, which is why this flag cannot be used with -f/--filename & --filename-template.',
+                'action': 'store_true'
+            },
+            {
+                'flag': '--domain-parallelism',
+                'help': 'Max number of urls per domain to hit at the same time. Defaults to %s.' % DEFAULT_GROUP_PARALLELISM,
+                'type': int,
+                'default': DEFAULT_GROUP_PARALLELISM
+            },
             {
                 'flags': ['-d', '--output-dir'],
                 'help': 'Directory where the fetched files will be written. Defaults to "%s".' % DEFAULT_CONTENT_FOLDER,
                 'default': DEFAULT_CONTENT_FOLDER
             },
+            {
+                'flag': '--engine',
+                'help': 'Fetch engine to use. `threads` relies on a pool of threads while `async` runs every request on a single asyncio event loop, which scales better to thousands of concurrent connections but requires the `aiohttp` library. Defaults to `threads`.',
+                'choices': ['threads', 'async'],
+                'default': 'threads'
+            },
             {
                 'flags': ['-f', '--filename'],
                 'help': 'Name of the column used to build retrieved file names. Defaults to an uuid v4 with correct extension.'
@@ -724,11 +854,20 @@ MINET_COMMANDS = {
                 'action': 'append',
                 'dest': 'headers'
             },
+            {
+                'flag': '--max-body-size',
+                'help': 'Maximum size - in bytes - of a response\'s body. Larger responses will be aborted as soon as possible and reported with a "response-too-large" error.',
+                'type': int
+            },
             {
                 'flag': '--resume',
                 'help': 'Whether to resume from an aborted report.',
                 'action': 'store_true'
             },
+            {
+                'flag': '--retries',
+                'help': 'Max number of times to retry urls failing with transient errors, after an exponential backoff. Either a number, or comma-separated error classes along with their own number, e.g. "3,too-many-requests=10". Error classes are connect-timeout, read-timeout, connection-error, too-many-requests (429) & server-error (502, 503 & 504). Defaults to no retries.'
+            },
             {
                 'flag': '--standardize-encoding',
                 'help': 'Whether to systematically convert retrieved text to UTF-8.',
@@ -744,7 +883,7 @@ MINET_COMMANDS = {
             },
             {
                 'flags': ['-t', '--threads'],
-                'help': 'Number of threads to use. Defaults to 25.',
+                'help': 'Number of threads to use, or max number of concurrent requests when using `--engine async`. Defaults to 25.',
                 'type': int,
                 'default': 25
             },
@@ -769,7 +908,7 @@ MINET_COMMANDS = {
                 'dest': 'method',
                 'default': 'GET'
             }
-        ]
+        ] + ADAPTIVE_THROTTLE_ARGUMENTS + CACHE_ARGUMENTS + DNS_CACHE_ARGUMENTS + INSTRUMENTATION_ARGUMENTS
     },
 
     # Hyphe action subparser
@@ -845,7 +984,7 @@ MINET_COMMANDS = {
                     'flags': ['-o', '--output'],
                     'help': 'Path to the output report file. By default, the report will be printed to stdout.'
                 }
-            ],
+            ] + CACHE_ARGUMENTS,
             'commands': {
                 'search': {
                     'title': 'Minet Mediacloud Search Command',
@@ -944,6 +1083,11 @@ MINET_COMMANDS = {
                 'default': sys.stdin,
                 'nargs': '?'
             },
+            {
+                'flag': '--engine',
+                'help': 'Scraping engine to use. "lxml" is faster but definitions relying on python evaluation will still run using "bs4". Defaults to the engine given by the definition, else "bs4".',
+                'choices': ['bs4', 'lxml']
+            },
             {
                 'flags': ['-f', '--format'],
                 'help': 'Output format.',
@@ -1108,6 +1252,12 @@ MINET_COMMANDS = {
                 'flags': ['-o', '--output'],
                 'help': 'Path to the output file. By default, the result will be printed to stdout.'
             },
+            {
+                'flags': ['-p', '--processes'],
+                'help': 'Number of processes to use. Defaults to 1.',
+                'type': int,
+                'default': 1
+            },
             {
                 'flags': ['-s', '--select'],
                 'help': 'Columns to keep in output, separated by comma.'
@@ -1208,6 +1358,12 @@ MINET_COMMANDS = {
                 'flags': ['-o', '--output'],
                 'help': 'Path to the output file. By default, the result will be printed to stdout.'
             },
+            {
+                'flags': ['-p', '--processes'],
+                'help': 'Number of processes to use. Defaults to 1.',
+                'type': int,
+                'default': 1
+            },
             {
                 'flags': ['-s', '--select'],
                 'help': 'Columns to keep in output, separated by comma.',
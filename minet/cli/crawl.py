@@ -8,12 +8,20 @@ import os
 import csv
 from os.path import join, isfile, dirname
 from tqdm import tqdm
-from shutil import rmtree
 
 from minet.crawl import Crawler
 from minet.utils import load_definition
 from minet.cli.reporters import report_error
-from minet.cli.utils import print_err
+from minet.exceptions import InvalidScraperError
+from minet.cli.utils import (
+    print_err,
+    die,
+    get_dns_cache,
+    get_http_cache,
+    get_instrumentation,
+    get_throttle,
+    MetricsReporter
+)
 
 JOBS_HEADERS = [
     'spider',
@@ -157,13 +165,15 @@ class ScraperReporterPool(object):
 def crawl_action(namespace):
 
     # Loading crawler definition
-    queue_path = join(namespace.output_dir, 'queue')
+    frontier_path = join(namespace.output_dir, 'frontier.sqlite')
     definition = load_definition(namespace.crawler)
 
     if namespace.resume:
         print_err('Resuming crawl...')
     else:
-        rmtree(queue_path, ignore_errors=True)
+        for path in [frontier_path, frontier_path + '-wal', frontier_path + '-shm']:
+            if isfile(path):
+                os.remove(path)
 
     # Scaffolding output directory
     os.makedirs(namespace.output_dir, exist_ok=True)
@@ -175,12 +185,24 @@ def crawl_action(namespace):
         resume=namespace.resume
     )
 
+    http_cache = get_http_cache(namespace)
+    dns_cache = get_dns_cache(namespace)
+    instrumentation = get_instrumentation(namespace)
+
     # Creating crawler
-    crawler = Crawler(
-        definition,
-        throttle=namespace.throttle,
-        queue_path=queue_path
-    )
+    try:
+        crawler = Crawler(
+            definition,
+            throttle=get_throttle(namespace),
+            domain_parallelism=namespace.domain_parallelism,
+            frontier_path=frontier_path,
+            cache=http_cache,
+            engine=namespace.engine,
+            instrumentation=instrumentation,
+            dns=dns_cache
+        )
+    except InvalidScraperError as e:
+        die(['Invalid scraper definition:'] + str(e).split('\n'))
 
     reporter_pool = ScraperReporterPool(
         crawler,
@@ -195,10 +217,36 @@ def crawl_action(namespace):
         dynamic_ncols=True
     )
 
+    metrics_reporter = None
+
+    if instrumentation is not None:
+        metrics_reporter = MetricsReporter(
+            instrumentation,
+            loading_bar,
+            path=namespace.metrics,
+            interval=namespace.metrics_interval,
+            http=crawler.http,
+            cache=http_cache,
+            dns=dns_cache
+        )
+
     def update_loading_bar(result):
         state = crawler.state
 
-        loading_bar.set_postfix(queue=state.jobs_queued, spider=result.job.spider)
+        postfix = {
+            'queue': state.jobs_queued,
+            'spider': result.job.spider,
+            'reuse': '%.0f%%' % (crawler.http.connection_stats.reuse_rate * 100)
+        }
+
+        if dns_cache is not None:
+            postfix['dns'] = '%.0f%%' % (dns_cache.stats.hit_rate * 100)
+
+        if metrics_reporter is not None:
+            postfix.update(metrics_reporter.postfix())
+            metrics_reporter.maybe_report()
+
+        loading_bar.set_postfix(**postfix)
         loading_bar.update()
 
     # Starting crawler
@@ -214,6 +262,9 @@ def crawl_action(namespace):
 
         reporter_pool.write(result.job.spider, result.scraped)
 
+    if metrics_reporter is not None:
+        metrics_reporter.report()
+
     loading_bar.close()
     jobs_output.close()
     reporter_pool.close()
@@ -6,7 +6,7 @@
 #
 import csv
 
-from minet.cli.utils import die
+from minet.cli.utils import die, get_http_cache
 from minet.crowdtangle.constants import CROWDTANGLE_LIST_CSV_HEADERS
 from minet.crowdtangle.client import CrowdTangleClient
 from minet.crowdtangle.exceptions import CrowdTangleInvalidTokenError
@@ -14,7 +14,12 @@ from minet.crowdtangle.exceptions import CrowdTangleInvalidTokenError
 
 def crowdtangle_lists_action(namespace, output_file):
 
-    client = CrowdTangleClient(namespace.token, rate_limit=namespace.rate_limit)
+    client = CrowdTangleClient(
+        namespace.token,
+        rate_limit=namespace.rate_limit,
+        rate_limit_file=namespace.rate_limit_file,
+        cache=get_http_cache(namespace)
+    )
     writer = csv.writer(output_file)
     writer.writerow(CROWDTANGLE_LIST_CSV_HEADERS)
 
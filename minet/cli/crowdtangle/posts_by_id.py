@@ -10,7 +10,7 @@ from ural import ensure_protocol
 from ural.facebook import is_facebook_post_url
 
 import minet.facebook as facebook
-from minet.cli.utils import die, LoadingBarContext
+from minet.cli.utils import die, get_http_cache, LoadingBarContext
 from minet.crowdtangle.constants import CROWDTANGLE_POST_CSV_HEADERS
 from minet.crowdtangle.client import CrowdTangleClient
 from minet.crowdtangle.exceptions import CrowdTangleInvalidTokenError
@@ -18,7 +18,12 @@ from minet.crowdtangle.exceptions import CrowdTangleInvalidTokenError
 
 def crowdtangle_posts_by_id_action(namespace, output_file):
 
-    client = CrowdTangleClient(namespace.token, rate_limit=namespace.rate_limit)
+    client = CrowdTangleClient(
+        namespace.token,
+        rate_limit=namespace.rate_limit,
+        rate_limit_file=namespace.rate_limit_file,
+        cache=get_http_cache(namespace)
+    )
 
     already_done = 0
 
@@ -7,10 +7,12 @@
 import csv
 import casanova
 from io import StringIO
+from os.path import isfile
 from tqdm import tqdm
+from quenouille import imap
 from ural import is_url
 
-from minet.cli.utils import die
+from minet.cli.utils import die, get_http_cache
 from minet.crowdtangle.constants import (
     CROWDTANGLE_SUMMARY_CSV_HEADERS,
     CROWDTANGLE_POST_CSV_HEADERS_WITH_LINK
@@ -21,26 +23,63 @@ from minet.crowdtangle.exceptions import (
 from minet.crowdtangle import CrowdTangleClient
 
 
+POST_ID_POS = CROWDTANGLE_POST_CSV_HEADERS_WITH_LINK.index('ct_id')
+
+
+def post_key(post):
+    return post[0], post[POST_ID_POS]
+
+
 def crowdtangle_summary_action(namespace, output_file):
     if not namespace.start_date:
         die('Missing --start-date!')
 
+    if namespace.resume and not namespace.output:
+        die([
+            'Cannot --resume without specifying -o/--output.'
+        ])
+
     if is_url(namespace.column):
         namespace.file = StringIO('url\n%s' % namespace.column)
         namespace.column = 'url'
 
+    already_done = 0
+
+    def listener(event, row):
+        nonlocal already_done
+
+        if event == 'resume.input':
+            already_done += 1
+
     enricher = casanova.enricher(
         namespace.file,
         output_file,
         keep=namespace.select.split(',') if namespace.select else None,
-        add=CROWDTANGLE_SUMMARY_CSV_HEADERS
+        add=CROWDTANGLE_SUMMARY_CSV_HEADERS,
+        resumable=namespace.resume,
+        listener=listener
     )
 
+    posts_file = None
     posts_writer = None
 
+    # NOTE: posts of a row are written before the row itself, so when
+    # resuming, the posts of the last rows may have been written already
+    already_written_posts = set()
+
     if namespace.posts is not None:
-        posts_writer = csv.writer(namespace.posts)
-        posts_writer.writerow(CROWDTANGLE_POST_CSV_HEADERS_WITH_LINK)
+        if namespace.resume and isfile(namespace.posts):
+            with open(namespace.posts) as f:
+                for post in csv.reader(f):
+                    if len(post) > POST_ID_POS:
+                        already_written_posts.add(post_key(post))
+
+        posts_file = open(namespace.posts, 'a' if namespace.resume else 'w')
+        posts_writer = csv.writer(posts_file)
+
+        # NOTE: when resuming, the header is only written if the file is new
+        if posts_file.tell() == 0:
+            posts_writer.writerow(CROWDTANGLE_POST_CSV_HEADERS_WITH_LINK)
 
     loading_bar = tqdm(
         desc='Collecting data',
@@ -49,36 +88,71 @@ def crowdtangle_summary_action(namespace, output_file):
         unit=' urls'
     )
 
-    client = CrowdTangleClient(namespace.token, rate_limit=namespace.rate_limit)
+    loading_bar.update(already_done)
+
+    client = CrowdTangleClient(
+        namespace.token,
+        rate_limit=namespace.rate_limit,
+        rate_limit_file=namespace.rate_limit_file,
+        cache=get_http_cache(namespace)
+    )
 
-    for row, url in enricher.cells(namespace.column, with_rows=True):
+    def work(item):
+        row, url = item
         url = url.strip()
 
-        try:
-            stats = client.summary(
-                url,
-                start_date=namespace.start_date,
-                with_top_posts=namespace.posts is not None,
-                sort_by=namespace.sort_by,
-                format='csv_row'
-            )
+        stats = client.summary(
+            url,
+            start_date=namespace.start_date,
+            with_top_posts=namespace.posts is not None,
+            sort_by=namespace.sort_by,
+            format='csv_row'
+        )
+
+        return row, url, stats
+
+    # NOTE: results are yielded in input order, so that the output is the
+    # same as a sequential run and can be resumed by casanova
+    results = imap(
+        enricher.cells(namespace.column, with_rows=True),
+        work,
+        namespace.threads,
+        ordered=True
+    )
+
+    try:
+        for row, url, stats in results:
+            if namespace.posts is not None:
+                stats, posts = stats
+
+                # NOTE: posts are written first so they cannot be lost when
+                # resuming, and are deduplicated using the posts file
+                if posts is not None:
+                    for post in posts:
+                        post = [url] + post
+
+                        if already_written_posts and post_key(post) in already_written_posts:
+                            continue
+
+                        posts_writer.writerow(post)
+
+                posts_file.flush()
 
-        except CrowdTangleInvalidTokenError:
-            die([
-                'Your API token is invalid.',
-                'Check that you indicated a valid one using the `--token` argument.'
-            ])
+            enricher.writerow(row, stats)
 
-        except Exception as err:
-            raise err
+            # NOTE: flushing so that --resume knows exactly what was done
+            output_file.flush()
 
-        if namespace.posts is not None:
-            stats, posts = stats
+            loading_bar.update()
 
-            if posts is not None:
-                for post in posts:
-                    posts_writer.writerow(post)
+    except CrowdTangleInvalidTokenError:
+        die([
+            'Your API token is invalid.',
+            'Check that you indicated a valid one using the `--token` argument.'
+        ])
 
-        enricher.writerow(row, stats)
+    finally:
+        if posts_file is not None:
+            posts_file.close()
 
-        loading_bar.update()
+    loading_bar.close()
@@ -9,7 +9,7 @@ import casanova
 import ndjson
 from tqdm import tqdm
 
-from minet.cli.utils import print_err, die
+from minet.cli.utils import print_err, die, get_http_cache
 from minet.crowdtangle import CrowdTangleClient
 from minet.crowdtangle.exceptions import (
     CrowdTangleInvalidTokenError
@@ -20,6 +20,12 @@ def make_paginated_action(method_name, item_name, csv_headers, get_args=None):
 
     def action(namespace, output_file):
 
+        # NOTE: not every paginated action can use several threads
+        threads = getattr(namespace, 'threads', 1)
+
+        if threads > 1 and getattr(namespace, 'partition_strategy', None) != 'day':
+            die('Cannot use several --threads without `--partition-strategy day`.')
+
         # Do we need to resume?
         need_to_resume = False
 
@@ -71,7 +77,12 @@ def make_paginated_action(method_name, item_name, csv_headers, get_args=None):
         else:
             writer = ndjson.writer(output_file)
 
-        client = CrowdTangleClient(namespace.token, rate_limit=namespace.rate_limit)
+        client = CrowdTangleClient(
+            namespace.token,
+            rate_limit=namespace.rate_limit,
+            rate_limit_file=namespace.rate_limit_file,
+            cache=get_http_cache(namespace)
+        )
 
         args = []
 
@@ -86,7 +97,8 @@ def make_paginated_action(method_name, item_name, csv_headers, get_args=None):
             format='csv_row' if namespace.format == 'csv' else 'raw',
             per_call=True,
             detailed=True,
-            namespace=namespace
+            namespace=namespace,
+            threads=threads
         )
 
         try:
@@ -94,8 +106,11 @@ def make_paginated_action(method_name, item_name, csv_headers, get_args=None):
                 if details is not None:
                     loading_bar.set_postfix(**details)
 
-                for item in items:
-                    writer.writerow(item)
+                if namespace.format == 'csv':
+                    writer.writerows(items)
+                else:
+                    for item in items:
+                        writer.writerow(item)
 
                 loading_bar.update(len(items))
 
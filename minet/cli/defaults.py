@@ -7,3 +7,10 @@
 
 # Miscellaneous
 DEFAULT_CONTENT_FOLDER = 'content'
+
+# Output
+DEFAULT_OUTPUT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_TQDM_WRITE_INTERVAL = 0.1
+
+# Instrumentation
+DEFAULT_METRICS_INTERVAL = 10
@@ -16,20 +16,22 @@ from minet.encodings import is_supported_encoding
 from minet.cli.utils import (
     custom_reader,
     open_output_file,
-    create_report_iterator
+    create_report_iterator,
+    imap_chunks
 )
 from minet.cli.reporters import report_error
 
 from minet.exceptions import UnknownEncodingError
+from minet.defaults import DEFAULT_PROCESS_CHUNKSIZE
 
 OUTPUT_ADDITIONAL_HEADERS = ['extract_error', 'extracted_text']
 
 
 def worker(payload):
-    line, _, path, encoding, content, _ = payload
+    _, _, path, encoding, content = payload
 
     if not is_supported_encoding(encoding):
-        return UnknownEncodingError('Unknown encoding: "%s"' % encoding), line, None
+        return UnknownEncodingError('Unknown encoding: "%s"' % encoding), None
 
     # Reading file
     if content is None:
@@ -43,7 +45,7 @@ def worker(payload):
                 with codecs.open(path, 'r', encoding=encoding, errors='replace') as f:
                     raw_html = f.read()
         except UnicodeDecodeError as e:
-            return e, line, None
+            return e, None
     else:
         raw_html = content
 
@@ -53,9 +55,13 @@ def worker(payload):
             warnings.simplefilter('ignore')
             content = extract_content(raw_html)
     except BaseException as e:
-        return e, line, None
+        return e, None
 
-    return None, line, content
+    return None, content
+
+
+def chunk_worker(payloads):
+    return [worker(payload) for payload in payloads]
 
 
 def extract_action(namespace):
@@ -81,19 +87,33 @@ def extract_action(namespace):
 
     namespace.report.close()
     namespace.report = open(namespace.report.name)
-    files = create_report_iterator(namespace, loading_bar=loading_bar)
 
-    with Pool(namespace.processes) as pool:
-        for error, line, content in pool.imap_unordered(worker, files):
-            loading_bar.update()
+    _, payloads = create_report_iterator(namespace, loading_bar=loading_bar)
 
-            if error is not None:
-                message = report_error(error)
-                line.extend([message, ''])
+    # NOTE: the report lines are kept by the main process, which only
+    # consumes the report a bounded number of chunks ahead of the workers
+    with Pool(namespace.processes) as pool:
+        results = imap_chunks(
+            pool,
+            chunk_worker,
+            payloads,
+            key=lambda payload: payload._replace(line=None),
+            chunksize=DEFAULT_PROCESS_CHUNKSIZE,
+            processes=namespace.processes
+        )
+
+        for chunk, chunk_results in results:
+            for payload, (error, content) in zip(chunk, chunk_results):
+                loading_bar.update()
+                line = payload.line
+
+                if error is not None:
+                    message = report_error(error)
+                    line.extend([message, ''])
+                    output_writer.writerow(line)
+                    continue
+
+                line.extend(['', content])
                 output_writer.writerow(line)
-                continue
-
-            line.extend(['', content])
-            output_writer.writerow(line)
 
     output_file.close()
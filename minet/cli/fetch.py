@@ -20,7 +20,9 @@ from ural import is_url
 from minet.contiguous_range_set import ContiguousRangeSet
 
 from minet.fetch import multithreaded_fetch
+from minet.dedupe import Deduplicator
 from minet.utils import (
+    create_pool,
     grab_cookies,
     parse_http_header,
     PseudoFStringFormatter
@@ -30,7 +32,16 @@ from minet.cli.utils import (
     custom_reader,
     open_output_file,
     die,
-    LazyLineDict
+    get_dns_cache,
+    get_http_cache,
+    get_instrumentation,
+    get_throttle,
+    get_retry_policy,
+    MetricsReporter,
+    LazyLineDict,
+    TranscodingWriter,
+    ByteOffsetLineReader,
+    ResumeCheckpoint
 )
 
 OUTPUT_ADDITIONAL_HEADERS = [
@@ -64,6 +75,23 @@ def fetch_action(namespace):
         if namespace.contents_in_report is None:
             namespace.contents_in_report = True
 
+    # When reading from an actual file, we track byte offsets so that resuming
+    # can seek the input directly
+    input_tracker = None
+
+    if (
+        namespace.output is not None and
+        namespace.file is not sys.stdin and
+        isfile(getattr(namespace.file, 'name', '')) and
+        ByteOffsetLineReader.supports(namespace.file.encoding)
+    ):
+        input_tracker = ByteOffsetLineReader(
+            namespace.file.name,
+            encoding=namespace.file.encoding
+        )
+        namespace.file.close()
+        namespace.file = input_tracker
+
     input_headers, pos, reader = custom_reader(namespace.file, namespace.column)
     filename_pos = input_headers.index(namespace.filename) if namespace.filename else None
     indexed_input_headers = {h: p for p, h in enumerate(input_headers)}
@@ -104,13 +132,35 @@ def fetch_action(namespace):
 
     output_writer = csv.writer(output_file)
 
+    checkpoint = None
+    resume_prefix = 0
+    input_offset = -1
+
+    if namespace.output is not None:
+        checkpoint = ResumeCheckpoint(namespace.output + '.checkpoint')
+
     if not resuming:
         output_writer.writerow(output_headers)
+
+        if checkpoint is not None:
+            ResumeCheckpoint.remove(checkpoint.path)
     else:
 
         # Reading report to know what need to be done
         _, rpos, resuming_reader = custom_reader(output_file, 'line')
 
+        resumed = ResumeCheckpoint.load(
+            checkpoint.path,
+            report_size=os.fstat(output_file.fileno()).st_size
+        )
+
+        # Only the rows written after the checkpoint need to be read
+        if resumed is not None:
+            already_done, report_offset, resume_prefix, input_offset = resumed
+            output_file.seek(report_offset)
+        else:
+            already_done = ContiguousRangeSet()
+
         resuming_reader_loading = tqdm(
             resuming_reader,
             desc='Resuming',
@@ -118,12 +168,11 @@ def fetch_action(namespace):
             unit=' lines'
         )
 
-        already_done = ContiguousRangeSet()
-
-        for line in resuming_reader_loading:
-            index = line[rpos]
+        already_done |= ContiguousRangeSet.from_indices(
+            int(line[rpos]) for line in resuming_reader_loading
+        )
 
-            already_done.add(int(index))
+        checkpoint.done = already_done.copy()
 
     # Loading bar
     total = namespace.total
@@ -170,6 +219,51 @@ def fetch_action(namespace):
             'headers': headers
         }
 
+    def build_filename(line, meta):
+        if filename_pos is not None or namespace.filename_template:
+            if namespace.filename_template:
+                return CUSTOM_FORMATTER.format(
+                    namespace.filename_template,
+                    value=line[filename_pos] if filename_pos is not None else None,
+                    ext=meta['ext'],
+                    line=LazyLineDict(indexed_input_headers, line)
+                )
+
+            return line[filename_pos] + meta['ext']
+
+        # NOTE: it would be nice to have an id that can be sorted by time
+        return str(uuid4()) + meta['ext']
+
+    # NOTE: this function is called from within the fetching threads so that
+    # bodies can be streamed directly to disk
+    def open_resource_file(url, item, meta):
+        _, line = item
+
+        filename = build_filename(line, meta)
+
+        if namespace.compress:
+            filename += '.gz'
+
+        meta['filename'] = filename
+
+        resource_path = join(namespace.output_dir, filename)
+        resource_dir = dirname(resource_path)
+
+        os.makedirs(resource_dir, exist_ok=True)
+
+        if namespace.compress:
+            f = gzip.open(resource_path, 'wb')
+        else:
+            f = open(resource_path, 'wb')
+
+        # Standardize encoding?
+        encoding = meta['encoding']
+
+        if namespace.standardize_encoding and encoding != 'utf-8':
+            f = TranscodingWriter(f, encoding if encoding is not None else 'utf-8')
+
+        return f
+
     def write_output(index, line, resolved=None, status=None, error=None,
                      filename=None, encoding=None, data=None):
 
@@ -190,23 +284,138 @@ def fetch_action(namespace):
 
         output_writer.writerow(line)
 
+        if checkpoint is not None:
+            checkpoint.add(index)
+            checkpoint.maybe_save(output_file)
+
     errors = 0
     status_codes = Counter()
 
-    target_iterator = enumerate(reader)
+    start = 0
+
+    if resuming and input_tracker is not None and input_offset >= 0:
+        input_tracker.seek(input_offset)
+        start = resume_prefix
+
+    def enumerate_input():
+        if input_tracker is None:
+            yield from enumerate(reader, start)
+            return
+
+        index = start
+        offset = input_tracker.offset
+
+        for line in reader:
+            checkpoint.track(index, offset)
+            offset = input_tracker.offset
+
+            yield index, line
+
+            index += 1
+
+    target_iterator = enumerate_input()
 
     if resuming:
         target_iterator = (pair for pair in target_iterator if not already_done.stateful_contains(pair[0]))
 
-    multithreaded_iterator = multithreaded_fetch(
-        target_iterator,
-        key=url_key,
-        request_args=request_args,
-        threads=namespace.threads,
-        throttle=namespace.throttle
-    )
+    http = None
+    connection_stats = None
+    http_cache = get_http_cache(namespace)
+    dns_cache = get_dns_cache(namespace)
+    instrumentation = get_instrumentation(namespace)
+    throttle = get_throttle(namespace)
+    retry = get_retry_policy(namespace)
+    dedupe = Deduplicator() if namespace.dedupe else None
+
+    # NOTE: duplicates share the file of their first occurrence
+    if dedupe is not None and (namespace.filename or namespace.filename_template):
+        die('The --dedupe flag cannot be used with -f/--filename & --filename-template.')
+
+    # Contents are streamed to disk unless they must end up in the report
+    stream_to = None if namespace.contents_in_report else open_resource_file
+
+    if namespace.engine == 'async':
+        if http_cache is not None:
+            die('The --cache flag is not supported by the `async` engine.')
+
+        if instrumentation is not None:
+            die('The --instrument & --metrics flags are not supported by the `async` engine.')
+
+        if namespace.adaptive_throttle:
+            die('The --adaptive-throttle flag is not supported by the `async` engine.')
+
+        if retry is not None:
+            die('The --retries flag is not supported by the `async` engine.')
+
+        if dns_cache is not None:
+            die('The --dns-cache flag is not supported by the `async` engine.')
+
+        if dedupe is not None:
+            die('The --dedupe flag is not supported by the `async` engine.')
+
+        try:
+            from minet.async_fetch import async_fetch
+        except ImportError:
+            die([
+                'The `aiohttp` library is not installed. The `async` engine won\'t work.',
+                'To install it, run the following command:',
+                '',
+                '  pip install aiohttp'
+            ])
+
+        fetch_iterator = async_fetch(
+            target_iterator,
+            key=url_key,
+            request_args=request_args,
+            concurrency=namespace.threads,
+            throttle=namespace.throttle,
+            domain_parallelism=namespace.domain_parallelism,
+            max_body_size=namespace.max_body_size,
+            stream_to=stream_to
+        )
+    else:
+        http = create_pool(
+            threads=namespace.threads,
+            domain_parallelism=namespace.domain_parallelism,
+            cache=http_cache,
+            instrumentation=instrumentation,
+            dns=dns_cache
+        )
 
-    for result in multithreaded_iterator:
+        connection_stats = http.connection_stats
+
+        fetch_iterator = multithreaded_fetch(
+            target_iterator,
+            key=url_key,
+            request_args=request_args,
+            threads=namespace.threads,
+            throttle=throttle,
+            domain_parallelism=namespace.domain_parallelism,
+            http=http,
+            max_body_size=namespace.max_body_size,
+            stream_to=stream_to,
+            instrumentation=instrumentation,
+            retry=retry,
+            dns=dns_cache,
+            dedupe=dedupe
+        )
+
+    metrics_reporter = None
+
+    if instrumentation is not None:
+        metrics_reporter = MetricsReporter(
+            instrumentation,
+            loading_bar,
+            path=namespace.metrics,
+            interval=namespace.metrics_interval,
+            http=http,
+            cache=http_cache,
+            retry=retry,
+            dns=dns_cache,
+            dedupe=dedupe
+        )
+
+    for result in fetch_iterator:
         line_index, line = result.item
 
         if not result.url:
@@ -220,9 +429,6 @@ def fetch_action(namespace):
             continue
 
         response = result.response
-        data = response.data if response is not None else None
-
-        content_write_flag = 'wb'
 
         # Updating stats
         if result.error is not None:
@@ -236,6 +442,25 @@ def fetch_action(namespace):
         for code, count in status_codes.most_common(1):
             postfix[str(code)] = count
 
+        if connection_stats is not None:
+            postfix['reuse'] = '%.0f%%' % (connection_stats.reuse_rate * 100)
+
+        if http_cache is not None:
+            postfix['cached'] = http_cache.stats.hits
+
+        if retry is not None:
+            postfix['retries'] = retry.stats.retries
+
+        if dns_cache is not None:
+            postfix['dns'] = '%.0f%%' % (dns_cache.stats.hit_rate * 100)
+
+        if dedupe is not None:
+            postfix['dupes'] = dedupe.stats.duplicates
+
+        if metrics_reporter is not None:
+            postfix.update(metrics_reporter.postfix())
+            metrics_reporter.maybe_report()
+
         loading_bar.set_postfix(**postfix)
         loading_bar.update()
 
@@ -243,47 +468,22 @@ def fetch_action(namespace):
         if result.error is None:
 
             filename = None
-
-            # Building filename
-            if data:
-                if filename_pos is not None or namespace.filename_template:
-                    if namespace.filename_template:
-                        filename = CUSTOM_FORMATTER.format(
-                            namespace.filename_template,
-                            value=line[filename_pos] if filename_pos is not None else None,
-                            ext=result.meta['ext'],
-                            line=LazyLineDict(indexed_input_headers, line)
-                        )
-                    else:
-                        filename = line[filename_pos] + result.meta['ext']
-                else:
-                    # NOTE: it would be nice to have an id that can be sorted by time
-                    filename = str(uuid4()) + result.meta['ext']
-
-            # Standardize encoding?
+            data = None
             encoding = result.meta['encoding']
 
-            if data and namespace.standardize_encoding or namespace.contents_in_report:
-                if encoding is None or encoding != 'utf-8' or namespace.contents_in_report:
+            if namespace.contents_in_report:
+                data = response.data
+
+                if data:
                     data = data.decode(encoding if encoding is not None else 'utf-8', errors='replace')
                     encoding = 'utf-8'
-                    content_write_flag = 'w'
-
-            # Writing file on disk
-            if data and not namespace.contents_in_report:
-
-                if namespace.compress:
-                    filename += '.gz'
 
-                resource_path = join(namespace.output_dir, filename)
-                resource_dir = dirname(resource_path)
+            # Body was streamed to disk
+            elif 'filename' in result.meta:
+                filename = result.meta['filename']
 
-                os.makedirs(resource_dir, exist_ok=True)
-
-                with open(resource_path, content_write_flag) as f:
-
-                    # TODO: what if standardize_encoding + compress?
-                    f.write(gzip.compress(data) if namespace.compress else data)
+                if namespace.standardize_encoding:
+                    encoding = 'utf-8'
 
             # Reporting in output
             resolved_url = response.geturl()
@@ -302,12 +502,26 @@ def fetch_action(namespace):
         else:
             error_code = report_error(result.error)
 
+            # Removing partially written file
+            if result.meta is not None and 'filename' in result.meta:
+                resource_path = join(namespace.output_dir, result.meta['filename'])
+
+                if isfile(resource_path):
+                    os.remove(resource_path)
+
             write_output(
                 line_index,
                 line,
                 error=error_code
             )
 
+    if metrics_reporter is not None:
+        metrics_reporter.report()
+
     # Closing files
     if namespace.output is not None:
+        checkpoint.save(output_file)
         output_file.close()
+
+    if input_tracker is not None:
+        input_tracker.close()
@@ -7,7 +7,7 @@
 import csv
 from tqdm import tqdm
 
-from minet.cli.utils import die
+from minet.cli.utils import die, get_http_cache
 from minet.mediacloud import MediacloudClient
 from minet.mediacloud.constants import MEDIACLOUD_STORIES_CSV_HEADER
 from minet.mediacloud.exceptions import MediacloudServerError
@@ -17,7 +17,7 @@ def mediacloud_search_action(namespace, output_file):
     writer = csv.writer(output_file)
     writer.writerow(MEDIACLOUD_STORIES_CSV_HEADER)
 
-    client = MediacloudClient(namespace.token)
+    client = MediacloudClient(namespace.token, cache=get_http_cache(namespace))
 
     kwargs = {
         'collections': namespace.collections
@@ -7,6 +7,7 @@
 import csv
 from tqdm import tqdm
 
+from minet.cli.utils import get_http_cache
 from minet.mediacloud import MediacloudClient
 from minet.mediacloud.constants import MEDIACLOUD_TOPIC_STORIES_CSV_HEADERS
 
@@ -21,7 +22,7 @@ def mediacloud_topic_action(namespace, output_file):
         unit=' stories'
     )
 
-    client = MediacloudClient(namespace.token)
+    client = MediacloudClient(namespace.token, cache=get_http_cache(namespace))
 
     iterator = client.topic_stories(
         namespace.topic_id,
@@ -5,16 +5,20 @@
 # Various reporters whose goal is to convert errors etc. into human-actionable
 # labels in CSV format, for instance.
 #
+import socket
 from urllib3.exceptions import (
     ConnectTimeoutError,
     MaxRetryError,
+    NewConnectionError,
+    ProtocolError,
     ReadTimeoutError,
     ResponseError
 )
 
 from minet.exceptions import (
     UnknownEncodingError,
-    InvalidURLError
+    InvalidURLError,
+    ResponseTooLargeError
 )
 
 
@@ -31,11 +35,25 @@ def max_retry_error_reporter(error):
     return 'max-retries-exceeded'
 
 
+def new_connection_error_reporter(error):
+    cause = error.__cause__ or error.__context__
+
+    if isinstance(cause, socket.gaierror):
+        return 'unknown-host'
+
+    return 'connection-refused'
+
+
 ERROR_REPORTERS = {
     UnicodeDecodeError: 'wrong-encoding',
     UnknownEncodingError: 'unknown-encoding',
     MaxRetryError: max_retry_error_reporter,
-    InvalidURLError: 'invalid-url'
+    ConnectTimeoutError: 'connect-timeout',
+    ReadTimeoutError: 'read-timeout',
+    NewConnectionError: new_connection_error_reporter,
+    ProtocolError: 'connection-error',
+    InvalidURLError: 'invalid-url',
+    ResponseTooLargeError: 'response-too-large'
 }
 
 
@@ -14,7 +14,9 @@ from multiprocessing import Pool
 from tqdm import tqdm
 
 from minet.utils import load_definition
-from minet.scrape import scrape, headers_from_definition
+from minet.scrape import Scraper, headers_from_definition
+from minet.exceptions import InvalidScraperError
+from minet.defaults import DEFAULT_PROCESS_CHUNKSIZE
 from minet.cli.utils import (
     open_output_file,
     die,
@@ -29,8 +31,23 @@ ScrapeWorkerResult = namedtuple(
 )
 
 
+# NOTE: the scraper is compiled once per process by the pool initializer,
+# and the report's headers sent once, so that they do not have to be pickled
+# along with each payload
+SCRAPER = None
+HEADERS = None
+
+
+def init_process(definition, headers):
+    global SCRAPER
+    global HEADERS
+
+    SCRAPER = Scraper(definition)
+    HEADERS = headers
+
+
 def worker(payload):
-    line, headers, path, encoding, content, scraper = payload
+    _, line, path, encoding, content = payload
 
     # Reading from file
     if content is None:
@@ -50,14 +67,14 @@ def worker(payload):
     context = {}
 
     if line:
-        context['line'] = LazyLineDict(headers, line)
+        context['line'] = LazyLineDict(HEADERS, line)
 
     if path:
         context['path'] = path
         context['basename'] = basename(path)
 
     # Attempting to scrape
-    items = scrape(scraper, content, context=context)
+    items = SCRAPER(content, context=context)
 
     return ScrapeWorkerResult(None, items)
 
@@ -77,6 +94,15 @@ def scrape_action(namespace):
     except:
         die('Invalid scraper file.')
 
+    # NOTE: the engine travels with the definition to the worker processes
+    if namespace.engine is not None:
+        scraper = dict(scraper, engine=namespace.engine)
+
+    try:
+        Scraper(scraper)
+    except InvalidScraperError as e:
+        die(['Invalid scraper definition:'] + str(e).split('\n'))
+
     if namespace.format == 'csv':
         output_headers = headers_from_definition(scraper)
         output_writer = csv.DictWriter(output_file, fieldnames=output_headers)
@@ -94,12 +120,25 @@ def scrape_action(namespace):
     loading_bar.set_postfix(p=namespace.processes)
 
     if namespace.glob is not None:
-        files = create_glob_iterator(namespace, scraper)
+        headers = None
+        files = create_glob_iterator(namespace)
     else:
-        files = create_report_iterator(namespace, scraper, loading_bar)
+        headers, files = create_report_iterator(namespace, loading_bar=loading_bar)
+
+    pool = Pool(
+        namespace.processes,
+        initializer=init_process,
+        initargs=(scraper, headers)
+    )
+
+    with pool:
+        results = pool.imap_unordered(
+            worker,
+            files,
+            chunksize=DEFAULT_PROCESS_CHUNKSIZE
+        )
 
-    with Pool(namespace.processes) as pool:
-        for error, items in pool.imap_unordered(worker, files):
+        for error, items in results:
             loading_bar.update()
 
             if not isinstance(items, list):
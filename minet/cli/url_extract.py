@@ -5,11 +5,13 @@
 # Logic of the `url-extract` action.
 #
 import casanova
+from functools import partial
+from multiprocessing import Pool
 from tqdm import tqdm
 from ural import urls_from_text, urls_from_html
 from urllib.parse import urljoin
 
-from minet.cli.utils import open_output_file
+from minet.cli.utils import open_output_file, imap_chunks
 
 REPORT_HEADERS = [
     'url'
@@ -21,6 +23,31 @@ EXTRACTORS = {
 }
 
 
+def extract_cells(cells, source='text', base_url=None):
+    """
+    Function returning, for each given cell, the list of the urls it
+    contains. Runs in worker processes.
+    """
+    extract = EXTRACTORS[source]
+    results = []
+
+    for content in cells:
+        content = content.strip()
+
+        if not content:
+            results.append(None)
+            continue
+
+        urls = list(extract(content))
+
+        if base_url is not None:
+            urls = [urljoin(base_url, url) for url in urls]
+
+        results.append(urls)
+
+    return results
+
+
 def url_extract_action(namespace):
     output_file = open_output_file(namespace.output)
 
@@ -31,8 +58,6 @@ def url_extract_action(namespace):
         keep=namespace.select.split(',') if namespace.select else None
     )
 
-    extract = EXTRACTORS[getattr(namespace, 'from')]
-
     loading_bar = tqdm(
         desc='Extracting',
         dynamic_ncols=True,
@@ -40,18 +65,35 @@ def url_extract_action(namespace):
         total=namespace.total
     )
 
-    for row, content in enricher.cells(namespace.column, with_rows=True):
-        loading_bar.update()
+    work = partial(
+        extract_cells,
+        source=getattr(namespace, 'from'),
+        base_url=namespace.base_url
+    )
 
-        content = content.strip()
+    pool = Pool(namespace.processes) if namespace.processes > 1 else None
 
-        if not content:
-            continue
+    results = imap_chunks(
+        pool,
+        work,
+        enricher.cells(namespace.column, with_rows=True),
+        key=lambda item: item[1],
+        processes=namespace.processes
+    )
+
+    try:
+        for chunk, chunk_results in results:
+            for (row, _), urls in zip(chunk, chunk_results):
+                if urls is None:
+                    continue
 
-        for url in extract(content):
-            if namespace.base_url is not None:
-                url = urljoin(namespace.base_url, url)
+                for url in urls:
+                    enricher.writerow(row, [url])
 
-            enricher.writerow(row, [url])
+            loading_bar.update(len(chunk))
+    finally:
+        if pool is not None:
+            pool.terminate()
 
+    loading_bar.close()
     output_file.close()
@@ -5,16 +5,18 @@
 # Logic of the `url-parse` action.
 #
 import casanova
-from ural import (
+from functools import partial
+from multiprocessing import Pool
+from ural import get_hostname
+from tqdm import tqdm
+
+from minet.url_cache import (
     is_url,
     normalize_url,
-    get_hostname,
     get_domain_name,
     get_normalized_hostname
 )
-from tqdm import tqdm
-
-from minet.cli.utils import open_output_file
+from minet.cli.utils import open_output_file, imap_chunks
 
 REPORT_HEADERS = [
     'normalized_url',
@@ -24,6 +26,42 @@ REPORT_HEADERS = [
 ]
 
 
+def parse_url(url, strip_protocol=True):
+    if not is_url(url, allow_spaces_in_path=True):
+        return None
+
+    return [
+        normalize_url(
+            url,
+            strip_protocol=strip_protocol,
+            strip_trailing_slash=True
+        ),
+        get_domain_name(url),
+        get_hostname(url),
+        get_normalized_hostname(url)
+    ]
+
+
+def parse_cells(cells, separator=None, strip_protocol=True):
+    """
+    Function returning, for each given cell, the list of the parsed urls
+    it contains. Runs in worker processes.
+    """
+    results = []
+
+    for url in cells:
+        url = url.strip()
+
+        if separator:
+            urls = url.split(separator)
+        else:
+            urls = [url]
+
+        results.append([parse_url(url, strip_protocol) for url in urls])
+
+    return results
+
+
 def url_parse_action(namespace):
 
     output_file = open_output_file(namespace.output)
@@ -42,30 +80,36 @@ def url_parse_action(namespace):
         total=namespace.total
     )
 
-    for row, url in enricher.cells(namespace.column, with_rows=True):
-        url = url.strip()
+    work = partial(
+        parse_cells,
+        separator=namespace.separator,
+        strip_protocol=namespace.strip_protocol
+    )
 
-        loading_bar.update()
+    pool = Pool(namespace.processes) if namespace.processes > 1 else None
 
-        if namespace.separator:
-            urls = url.split(namespace.separator)
-        else:
-            urls = [url]
+    results = imap_chunks(
+        pool,
+        work,
+        enricher.cells(namespace.column, with_rows=True),
+        key=lambda item: item[1],
+        processes=namespace.processes
+    )
+
+    try:
+        for chunk, chunk_results in results:
+            for (row, _), parsed_urls in zip(chunk, chunk_results):
+                for parsed_url in parsed_urls:
+                    if parsed_url is None:
+                        enricher.writerow(row)
+                        continue
+
+                    enricher.writerow(row, parsed_url)
 
-        for url in urls:
-            if not is_url(url, allow_spaces_in_path=True):
-                enricher.writerow(row)
-                continue
-
-            enricher.writerow(row, [
-                normalize_url(
-                    url,
-                    strip_protocol=namespace.strip_protocol,
-                    strip_trailing_slash=True
-                ),
-                get_domain_name(url),
-                get_hostname(url),
-                get_normalized_hostname(url)
-            ])
+            loading_bar.update(len(chunk))
+    finally:
+        if pool is not None:
+            pool.terminate()
 
+    loading_bar.close()
     output_file.close()
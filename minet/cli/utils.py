@@ -4,14 +4,36 @@
 #
 # Miscellaneous helpers used by the CLI tools.
 #
+import io
+import os
 import csv
 import sys
+import atexit
+import time
 import codecs
+import struct
 from glob import iglob
 from os.path import join
-from collections import namedtuple
+from collections import namedtuple, deque
 from tqdm import tqdm
 
+from minet.http_cache import HTTPCache
+from minet.dns import DNSCache
+from minet.instrumentation import Instrumentation
+from minet.throttle import AdaptiveThrottle
+from minet.retry import RetryPolicy, RETRYABLE_ERROR_CLASSES
+from minet.url_cache import url_cache_stats
+from minet.contiguous_range_set import ContiguousRangeSet
+from minet.defaults import (
+    DEFAULT_ROWS_CHUNKSIZE,
+    DEFAULT_PENDING_CHUNKS_PER_PROCESS
+)
+from minet.cli.defaults import (
+    DEFAULT_OUTPUT_BUFFER_SIZE,
+    DEFAULT_TQDM_WRITE_INTERVAL,
+    DEFAULT_METRICS_INTERVAL
+)
+
 
 def print_err(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
@@ -27,6 +49,136 @@ def die(msg):
     sys.exit(1)
 
 
+def get_http_cache(namespace):
+    if not getattr(namespace, 'cache', None):
+        return None
+
+    return HTTPCache(
+        namespace.cache,
+        ttl=namespace.cache_ttl,
+        max_size=namespace.cache_max_size
+    )
+
+
+def get_dns_cache(namespace):
+    if not getattr(namespace, 'dns_cache', False):
+        return None
+
+    try:
+        return DNSCache(ttl=namespace.dns_ttl)
+    except TypeError as e:
+        die('Invalid DNS cache: %s.' % e)
+
+
+def get_throttle(namespace):
+    if not getattr(namespace, 'adaptive_throttle', False):
+        return namespace.throttle
+
+    try:
+        return AdaptiveThrottle(
+            initial_delay=namespace.throttle,
+            min_delay=namespace.min_throttle,
+            max_delay=namespace.max_throttle,
+            max_parallelism=namespace.domain_parallelism
+        )
+    except TypeError as e:
+        die('Invalid adaptive throttle: %s.' % e)
+
+
+def parse_retries(string):
+    default = 0
+    retries = {}
+
+    for part in string.split(','):
+        part = part.strip()
+
+        if '=' in part:
+            error_class, count = part.split('=', 1)
+            retries[error_class.strip()] = int(count)
+        else:
+            default = int(part)
+
+    for error_class in RETRYABLE_ERROR_CLASSES:
+        retries.setdefault(error_class, default)
+
+    return retries
+
+
+def get_retry_policy(namespace):
+    if not getattr(namespace, 'retries', None):
+        return None
+
+    try:
+        return RetryPolicy(retries=parse_retries(namespace.retries))
+    except (TypeError, ValueError) as e:
+        die('Invalid --retries: %s.' % e)
+
+
+def get_instrumentation(namespace):
+    if not getattr(namespace, 'instrument', False) and not getattr(namespace, 'metrics', None):
+        return None
+
+    return Instrumentation()
+
+
+class MetricsReporter(object):
+    """
+    Helper regularly printing a summary of the given instrumentation's
+    metrics above the loading bar and writing them into a JSON file, along
+    with connection reuse, url cache, http cache, retry, DNS & deduplication
+    statistics.
+    """
+
+    def __init__(self, instrumentation, loading_bar, path=None,
+                 interval=DEFAULT_METRICS_INTERVAL, http=None, cache=None,
+                 retry=None, dns=None, dedupe=None):
+        self.instrumentation = instrumentation
+        self.loading_bar = loading_bar
+        self.path = path
+        self.interval = interval
+        self.http = http
+        self.cache = cache
+        self.retry = retry
+        self.dns = dns
+        self.dedupe = dedupe
+        self.last_reported = time.time()
+
+    def postfix(self):
+        return self.instrumentation.postfix()
+
+    def extra(self):
+        extra = {'url_cache': url_cache_stats()}
+
+        if self.http is not None:
+            extra['connections'] = self.http.connection_stats.to_dict()
+
+        if self.cache is not None:
+            extra['http_cache'] = self.cache.stats.to_dict()
+
+        if self.retry is not None:
+            extra['retries'] = self.retry.stats.to_dict()
+
+        if self.dns is not None:
+            extra['dns'] = self.dns.stats.to_dict()
+
+        if self.dedupe is not None:
+            extra['dedupe'] = self.dedupe.stats.to_dict()
+
+        return extra
+
+    def report(self):
+        self.loading_bar.write(self.instrumentation.format_stats(), file=sys.stderr)
+
+        if self.path is not None:
+            self.instrumentation.dump(self.path, extra=self.extra())
+
+        self.last_reported = time.time()
+
+    def maybe_report(self):
+        if time.time() - self.last_reported >= self.interval:
+            self.report()
+
+
 def safe_index(l, e):
     try:
         return l.index(e)
@@ -116,94 +268,234 @@ def url_parse_action(namespace):
     writer.writerow(headers + REPORT_HEADERS)
 
 
+class TranscodingWriter(object):
+    """
+    Writable binary file-like wrapper incrementally decoding written bytes
+    from the given encoding and writing them back as UTF-8, so that contents
+    can be standardized while being streamed.
+    """
+
+    def __init__(self, file, encoding):
+        self.file = file
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    def write(self, chunk):
+        self.file.write(self.decoder.decode(chunk).encode('utf-8'))
+
+    def close(self):
+        try:
+            self.file.write(self.decoder.decode(b'', final=True).encode('utf-8'))
+        finally:
+            self.file.close()
+
+
 class DummyTqdmFile(object):
     """
     Dummy file-like that will write to tqdm. Taken straight from the lib's
     documentation: https://github.com/tqdm/tqdm but modified for minet use
     case regarding stdout piping.
+
+    Written lines are buffered and handed over to tqdm at most every
+    `interval` seconds, so that progress bars are not redrawn for every
+    single line.
     """
     file = None
 
-    def __init__(self, file=sys.stdout):
+    def __init__(self, file=sys.stdout, interval=DEFAULT_TQDM_WRITE_INTERVAL):
         self.file = file
         self.cursor = 0
+        self.interval = interval
+        self.buffer = []
+        self.last_write_time = time.monotonic()
+
+        atexit.register(self.flush)
 
     def write(self, x):
         self.cursor += 1
+        self.buffer.append(x)
+
+        now = time.monotonic()
+
+        if now - self.last_write_time >= self.interval:
+            self.last_write_time = now
+            self.write_buffer()
+
+    def write_buffer(self):
+        if not self.buffer:
+            return
+
         # Avoid print() second call (useless \n)
-        tqdm.write(x, file=self.file, end='')
+        tqdm.write(''.join(self.buffer), file=self.file, end='')
+        self.buffer = []
 
     def flush(self):
+        self.write_buffer()
+
         return self.file.flush()
 
     def tell(self):
         return self.cursor
 
     def close(self):
-        pass
+        atexit.unregister(self.flush)
+        self.flush()
+
+
+class BufferedStdoutFile(object):
+    """
+    File-like writing to stdout through a large buffer. Used when stdout is
+    not a terminal, since it does not need to share the console with the
+    progress bars in this case.
+    """
+
+    def __init__(self, buffer_size=DEFAULT_OUTPUT_BUFFER_SIZE):
+        sys.stdout.flush()
+
+        self.file = io.TextIOWrapper(
+            io.open(sys.stdout.fileno(), 'wb', buffering=buffer_size, closefd=False),
+            encoding=sys.stdout.encoding,
+            errors=sys.stdout.errors
+        )
+
+        self.cursor = 0
+
+        atexit.register(self.flush)
+
+    def write(self, x):
+        self.cursor += 1
+        self.file.write(x)
+
+    def flush(self):
+        return self.file.flush()
+
+    def tell(self):
+        return self.cursor
+
+    def close(self):
+        atexit.unregister(self.flush)
+        self.flush()
 
 
 def open_output_file(output, flag='w'):
     if output is None:
-        return DummyTqdmFile(sys.stdout)
+        if sys.stdout.isatty():
+            return DummyTqdmFile(sys.stdout)
 
-    return open(output, flag)
+        return BufferedStdoutFile()
+
+    return open(output, flag, buffering=DEFAULT_OUTPUT_BUFFER_SIZE)
+
+
+def iter_chunks(iterable, size):
+    chunk = []
+
+    for item in iterable:
+        chunk.append(item)
+
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def imap_chunks(pool, fn, iterable, key=None, chunksize=DEFAULT_ROWS_CHUNKSIZE,
+                processes=1):
+    """
+    Generator applying `fn` to chunks of the given iterable's items, mapped
+    through `key` if given, using a process pool, and yielding the (chunk,
+    result) tuples in input order. Contrary to `Pool.imap`, the iterable is
+    only consumed as results are yielded so that memory stays bounded, even
+    when the workers are faster than what consumes the results.
+
+    If `pool` is None, everything is done in the current process.
+    """
+    chunks = iter_chunks(iterable, chunksize)
+
+    if pool is None:
+        for chunk in chunks:
+            yield chunk, fn(chunk if key is None else [key(item) for item in chunk])
+
+        return
+
+    max_pending = processes * DEFAULT_PENDING_CHUNKS_PER_PROCESS
+    pending = deque()
+
+    for chunk in chunks:
+        pending.append((
+            chunk,
+            pool.apply_async(fn, (chunk if key is None else [key(item) for item in chunk],))
+        ))
+
+        if len(pending) >= max_pending:
+            chunk, result = pending.popleft()
+            yield chunk, result.get()
+
+    while pending:
+        chunk, result = pending.popleft()
+        yield chunk, result.get()
 
 
 WorkerPayload = namedtuple(
     'WorkerPayload',
-    ['line', 'headers', 'path', 'encoding', 'content', 'args']
+    ['index', 'line', 'path', 'encoding', 'content']
 )
 
 
-def create_report_iterator(namespace, args=None, loading_bar=None):
+def create_report_iterator(namespace, loading_bar=None):
+    """
+    Function returning the indexed headers of the given report, which are
+    read eagerly so they can be sent once to worker processes, along with
+    an iterator over the payloads of its rows.
+    """
     input_headers, pos, reader = custom_reader(namespace.report, ('status', 'filename', 'encoding', 'raw_content'))
 
     indexed_headers = {h: p for p, h in enumerate(input_headers)}
 
-    for line in reader:
-        status = int(line[pos.status]) if line[pos.status] else None
-        filename = line[pos.filename]
+    def payloads():
+        for index, line in enumerate(reader):
+            status = int(line[pos.status]) if line[pos.status] else None
+            filename = line[pos.filename]
+
+            if status is None or status >= 400 or not filename:
+                if loading_bar is not None:
+                    loading_bar.update()
+                continue
 
-        if status is None or status >= 400 or not filename:
-            if loading_bar is not None:
-                loading_bar.update()
-            continue
+            if pos.raw_content is not None:
+                yield WorkerPayload(
+                    index=index,
+                    line=line,
+                    path=None,
+                    encoding=line[pos.encoding],
+                    content=line[pos.raw_content]
+                )
+
+                continue
+
+            path = join(namespace.input_directory, filename)
+            encoding = line[pos.encoding].strip() or 'utf-8'
 
-        if pos.raw_content is not None:
             yield WorkerPayload(
+                index=index,
                 line=line,
-                headers=indexed_headers,
-                path=None,
-                encoding=line[pos.encoding],
-                content=line[pos.raw_content],
-                args=args
+                path=path,
+                encoding=encoding,
+                content=None
             )
 
-            continue
+    return indexed_headers, payloads()
 
-        path = join(namespace.input_directory, filename)
-        encoding = line[pos.encoding].strip() or 'utf-8'
 
+def create_glob_iterator(namespace):
+    for index, p in enumerate(iglob(namespace.glob, recursive=True)):
         yield WorkerPayload(
-            line=line,
-            headers=indexed_headers,
-            path=path,
-            encoding=encoding,
-            content=None,
-            args=args
-        )
-
-
-def create_glob_iterator(namespace, args):
-    for p in iglob(namespace.glob, recursive=True):
-        yield WorkerPayload(
+            index=index,
             line=None,
-            headers=None,
             path=p,
             encoding='utf-8',
-            content=None,
-            args=args
+            content=None
         )
 
 
@@ -227,3 +519,145 @@ class LoadingBarContext(object):
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         self.loading_bar.update()
+
+
+class ByteOffsetLineReader(object):
+    """
+    Iterator over the decoded lines of a file opened in binary mode, keeping
+    track of the byte offset of what has been consumed so far. Since the csv
+    module only consumes the lines it needs, `offset` is the byte offset of
+    the next row after each parsed row.
+
+    Since lines are split on b'\n', only encodings where newlines, commas &
+    quotes are encoded as single ascii bytes, i.e. not UTF-16 or UTF-32, are
+    supported.
+    """
+
+    def __init__(self, path, encoding='utf-8'):
+        if not ByteOffsetLineReader.supports(encoding):
+            raise TypeError('unsupported encoding "%s"' % encoding)
+
+        self.file = open(path, 'rb')
+        self.encoding = encoding
+        self.offset = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.file.readline()
+
+        if not line:
+            raise StopIteration
+
+        self.offset += len(line)
+
+        return line.decode(self.encoding, errors='replace')
+
+    def seek(self, offset):
+        self.file.seek(offset)
+        self.offset = offset
+
+    @staticmethod
+    def supports(encoding):
+        try:
+            encoder = codecs.getincrementalencoder(encoding)()
+        except LookupError:
+            return False
+
+        # NOTE: skipping a potential BOM
+        encoder.encode('a')
+
+        return encoder.encode('\r\n,"') == b'\r\n,"'
+
+    def close(self):
+        self.file.close()
+
+
+class ResumeCheckpoint(object):
+    """
+    Sidecar file periodically recording which lines of an input file were
+    already processed into a report, so that resuming does not have to
+    parse the whole report again.
+
+    It stores a range set of the done line indices, the size of the report
+    when the checkpoint was taken (rows written afterwards still have to be
+    read from the report), and the index & byte offset of the first input
+    line that was not processed yet so that the input can be seeked
+    directly.
+
+    Only the offsets of the lines that were read but are not done yet are
+    kept, so that memory does not grow when an early line is slow.
+    """
+    HEADER = struct.Struct('<QQq')
+
+    def __init__(self, path, interval=5):
+        self.path = path
+        self.interval = interval
+        self.done = ContiguousRangeSet()
+        self.input_offsets = {}
+        self.last_saved = time.time()
+
+    def track(self, index, offset):
+        if index not in self.done:
+            self.input_offsets[index] = offset
+
+    def add(self, index):
+        self.done.add(index)
+        self.input_offsets.pop(index, None)
+
+    def prefix(self):
+        if not self.done.starts or self.done.starts[0] != 0:
+            return 0
+
+        return self.done.ends[0] + 1
+
+    def save(self, report_file):
+        report_file.flush()
+        report_offset = os.fstat(report_file.fileno()).st_size
+
+        prefix = self.prefix()
+
+        # NOTE: the first line not done yet may not have been read yet
+        input_offset = self.input_offsets.get(prefix, -1)
+
+        tmp_path = self.path + '.tmp'
+
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(report_offset, prefix, input_offset))
+            f.write(self.done.dumps())
+
+        os.replace(tmp_path, self.path)
+
+        self.last_saved = time.time()
+
+    def maybe_save(self, report_file):
+        if time.time() - self.last_saved >= self.interval:
+            self.save(report_file)
+
+    @staticmethod
+    def load(path, report_size=None):
+        """
+        Returns a (done, report_offset, prefix, input_offset) tuple or None
+        if the checkpoint does not exist or is invalid, or if the report,
+        whose current size can be given, is smaller than when the checkpoint
+        was taken.
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            report_offset, prefix, input_offset = ResumeCheckpoint.HEADER.unpack_from(data)
+            done = ContiguousRangeSet.loads(data[ResumeCheckpoint.HEADER.size:])
+        except (OSError, struct.error, TypeError):
+            return None
+
+        if report_size is not None and report_size < report_offset:
+            return None
+
+        return done, report_offset, prefix, input_offset
+
+    @staticmethod
+    def remove(path):
+        if os.path.isfile(path):
+            os.remove(path)
@@ -2,85 +2,217 @@
 # Minet Contiguous Range Set Collection
 # =============================================================================
 #
-# Simplistic implementation of a contiguous range set in python relying on a
-# sorted list of contiguous intervals. It is very useful to represent a set of
-# dense intervals using very little memory & is used across the task-resuming
-# schemes of the CLI tool.
+# Simplistic implementation of a contiguous range set in python relying on
+# sorted arrays of contiguous intervals' starts & ends. It is very useful to
+# represent a set of dense intervals using very little memory & is used
+# across the task-resuming schemes of the CLI tool.
 #
 # It takes a lot of inspiration from the inversion list data structure.
 #
-from bisect import bisect_left
+import os
+import sys
+import struct
+import numpy as np
+from array import array
+from bisect import bisect_right
+
+# Binary serialization format: magic, version & number of intervals followed
+# by the little-endian int64 starts & ends of the intervals.
+SERIALIZATION_MAGIC = b'MCRS'
+SERIALIZATION_VERSION = 1
+SERIALIZATION_HEADER = struct.Struct('<4sBQ')
+
+
+def to_little_endian_bytes(a):
+    if sys.byteorder != 'little':
+        a = array('q', a)
+        a.byteswap()
+
+    return a.tobytes()
+
+
+def from_little_endian_bytes(data):
+    a = array('q')
+    a.frombytes(data)
+
+    if sys.byteorder != 'little':
+        a.byteswap()
+
+    return a
 
 
 class ContiguousRangeSet(object):
     """
     Class representing contiguous ranges of integers as a sorted list of
-    intervals.
+    intervals, stored as two compact arrays of int64.
     """
 
     def __init__(self):
-        # NOTE: replace this by `blist` if not performany enough
-        self.intervals = []
+        self.starts = array('q')
+        self.ends = array('q')
+        self.size = 0
         self.current_stateful_interval = 0
 
+    @staticmethod
+    def from_intervals(intervals):
+        s = ContiguousRangeSet()
+
+        for start, end in intervals:
+            s.starts.append(start)
+            s.ends.append(end)
+            s.size += end + 1 - start
+
+        return s
+
+    @staticmethod
+    def from_indices(indices):
+        """
+        Method building a set from an iterable, or an array, of integers in
+        arbitrary order and possibly containing duplicates. The indices are
+        sorted and merged into intervals in a single vectorized pass.
+        """
+        if isinstance(indices, np.ndarray):
+            indices = indices.astype(np.int64, copy=False)
+        elif isinstance(indices, (list, tuple, array)):
+            indices = np.asarray(indices, dtype=np.int64)
+        else:
+            indices = np.fromiter(indices, dtype=np.int64)
+
+        s = ContiguousRangeSet()
+
+        if indices.size == 0:
+            return s
+
+        indices = np.sort(indices)
+
+        # Dropping duplicates
+        steps = np.diff(indices)
+
+        if not steps.all():
+            indices = indices[np.concatenate(([True], steps != 0))]
+            steps = np.diff(indices)
+
+        breaks = np.flatnonzero(steps != 1)
+
+        starts = indices[np.concatenate(([0], breaks + 1))]
+        ends = indices[np.concatenate((breaks, [indices.size - 1]))]
+
+        s.starts.frombytes(starts.tobytes())
+        s.ends.frombytes(ends.tobytes())
+        s.size = int(indices.size)
+
+        return s
+
+    @property
+    def intervals(self):
+        return list(zip(self.starts, self.ends))
+
     def __len__(self):
-        count = 0
+        return self.size
+
+    def __contains__(self, point):
+        index = bisect_right(self.starts, point) - 1
+
+        return index >= 0 and point <= self.ends[index]
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            yield from range(start, end + 1)
 
-        for start, end in self.intervals:
-            count += (end + 1 - start)
+    def copy(self):
+        s = ContiguousRangeSet()
+        s.starts = array('q', self.starts)
+        s.ends = array('q', self.ends)
+        s.size = self.size
 
-        return count
+        return s
+
+    def __eq__(self, other):
+        return self.starts == other.starts and self.ends == other.ends
 
     def add(self, point):
         """
-        Method adding a single point to the set. We assume that the point
-        cannot yet be in the set.
+        Method adding a single point to the set. Returns whether the point
+        was actually added, i.e. whether it was not already in the set.
         """
+        starts = self.starts
+        ends = self.ends
 
-        interval = (point, point)
-        N = len(self.intervals)
+        # NOTE: index of the first interval starting after the point
+        index = bisect_right(starts, point)
 
-        # Set is empty
-        if N == 0:
-            self.intervals.append(interval)
-            return
+        previous_end = ends[index - 1] if index != 0 else None
 
-        # Finding insertion point
-        index = bisect_left(self.intervals, interval)
+        # Point already in the set
+        if previous_end is not None and point <= previous_end:
+            return False
 
-        if index >= N:
-            last_interval = self.intervals[-1]
+        self.size += 1
 
-            if point == last_interval[1] + 1:
-                self.intervals[-1] = (last_interval[0], point)
-                return
+        touches_previous = previous_end is not None and point == previous_end + 1
+        touches_next = index < len(starts) and point == starts[index] - 1
 
-            self.intervals.append(interval)
-            return
+        # Merging both neighbouring intervals
+        if touches_previous and touches_next:
+            ends[index - 1] = ends[index]
+            del starts[index]
+            del ends[index]
 
-        matched_interval = self.intervals[index]
-        previous_interval = self.intervals[index - 1] if index != 0 else None
+        elif touches_previous:
+            ends[index - 1] = point
 
-        if point == matched_interval[0] - 1:
+        elif touches_next:
+            starts[index] = point
 
-            self.intervals[index] = (point, matched_interval[1])
+        else:
+            starts.insert(index, point)
+            ends.insert(index, point)
 
-            if previous_interval is not None:
+        return True
 
-                if point == previous_interval[1] + 1:
-                    self.intervals[index] = (previous_interval[0], matched_interval[1])
-                    self.intervals.pop(index - 1)
+    def union(self, other):
+        """
+        Method returning a new set containing the points of both sets.
+        """
+        merged = sorted(self.intervals + other.intervals)
+        intervals = []
+
+        for start, end in merged:
+            if intervals and start <= intervals[-1][1] + 1:
+                if end > intervals[-1][1]:
+                    intervals[-1] = (intervals[-1][0], end)
+
+                continue
 
-            return
+            intervals.append((start, end))
+
+        return ContiguousRangeSet.from_intervals(intervals)
+
+    def intersection(self, other):
+        """
+        Method returning a new set containing the points found in both sets.
+        """
+        intervals = []
 
-        elif previous_interval is not None and point == previous_interval[1] + 1:
+        i = 0
+        j = 0
 
-            self.intervals[index - 1] = (previous_interval[0], point)
-            return
+        while i < len(self.starts) and j < len(other.starts):
+            start = max(self.starts[i], other.starts[j])
+            end = min(self.ends[i], other.ends[j])
 
-        if point < matched_interval[0]:
-            self.intervals.insert(index, interval)
-            return
+            if start <= end:
+                intervals.append((start, end))
+
+            if self.ends[i] < other.ends[j]:
+                i += 1
+            else:
+                j += 1
+
+        return ContiguousRangeSet.from_intervals(intervals)
+
+    __or__ = union
+    __and__ = intersection
 
     def stateful_contains(self, point):
         """
@@ -89,18 +221,73 @@ class ContiguousRangeSet(object):
         increasing order.
         """
 
-        N = len(self.intervals)
+        N = len(self.starts)
 
-        if N == 0 or self.current_stateful_interval >= N:
+        while (
+            self.current_stateful_interval < N and
+            point > self.ends[self.current_stateful_interval]
+        ):
+            self.current_stateful_interval += 1
+
+        if self.current_stateful_interval >= N:
             return False
 
-        I = self.intervals[self.current_stateful_interval]
+        return point >= self.starts[self.current_stateful_interval]
 
-        if point < I[0]:
-            return False
+    def dumps(self):
+        return (
+            SERIALIZATION_HEADER.pack(
+                SERIALIZATION_MAGIC,
+                SERIALIZATION_VERSION,
+                len(self.starts)
+            ) +
+            to_little_endian_bytes(self.starts) +
+            to_little_endian_bytes(self.ends)
+        )
 
-        if point > I[1]:
-            self.current_stateful_interval += 1
-            return False
+    @staticmethod
+    def loads(data):
+        magic, version, n = SERIALIZATION_HEADER.unpack_from(data)
 
-        return True
+        if magic != SERIALIZATION_MAGIC or version != SERIALIZATION_VERSION:
+            raise TypeError('Invalid serialized ContiguousRangeSet')
+
+        offset = SERIALIZATION_HEADER.size
+        middle = offset + n * 8
+
+        if len(data) != middle + n * 8:
+            raise TypeError('Truncated serialized ContiguousRangeSet')
+
+        s = ContiguousRangeSet()
+        s.starts = from_little_endian_bytes(data[offset:middle])
+        s.ends = from_little_endian_bytes(data[middle:])
+        s.size = sum(s.ends) - sum(s.starts) + n
+
+        return s
+
+    def save(self, path):
+        """
+        Method atomically writing the set to the given path.
+        """
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'wb') as f:
+            f.write(self.dumps())
+
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return ContiguousRangeSet.loads(f.read())
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s intervals=%(intervals)s size=%(size)s>'
+        ) % {
+            'class_name': class_name,
+            'intervals': len(self.starts),
+            'size': self.size
+        }
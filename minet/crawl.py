@@ -4,16 +4,17 @@
 #
 # Functions related to the crawling utilities of minet.
 #
-from queue import Queue
-from persistqueue import SQLiteQueue
+import time
 from quenouille import imap_unordered, QueueIterator
 from bs4 import BeautifulSoup
-from ural import get_domain_name
 from collections import namedtuple
 from urllib.parse import urljoin
-from shutil import rmtree
 
-from minet.scrape import Scraper
+from minet.scrape import Scraper, ParsedDocument
+from minet.url_cache import get_domain_name, get_normalized_hostname
+from minet.frontier import MemoryFrontier, SQLiteFrontier
+from minet.instrumentation import NULL_INSTRUMENTATION
+from minet.throttle import AdaptiveThrottle
 from minet.utils import (
     create_pool,
     request,
@@ -52,13 +53,14 @@ def ensure_list(value):
 
 
 class CrawlJob(object):
-    __slots__ = ('url', 'level', 'spider', 'data')
+    __slots__ = ('url', 'level', 'spider', 'data', 'priority')
 
-    def __init__(self, url, level=0, spider='default', data=None):
+    def __init__(self, url, level=0, spider='default', data=None, priority=0):
         self.url = url
         self.level = level
         self.spider = spider
         self.data = data
+        self.priority = priority
 
     def id(self):
         return '%x' % id(self)
@@ -159,7 +161,7 @@ class BeautifulSoupSpider(Spider):
 
 
 class DefinitionSpider(Spider):
-    def __init__(self, definition, name='default'):
+    def __init__(self, definition, name='default', engine=None):
 
         # Descriptors
         self.name = name
@@ -175,14 +177,14 @@ class DefinitionSpider(Spider):
         self.next_scraper = None
 
         if 'scraper' in definition:
-            self.scraper = Scraper(definition['scraper'])
+            self.scraper = Scraper(definition['scraper'], engine=engine)
 
         if 'scrapers' in definition:
             for name, scraper in definition['scrapers'].items():
-                self.scrapers[name] = Scraper(scraper)
+                self.scrapers[name] = Scraper(scraper, engine=engine)
 
         if self.next_definition is not None and 'scraper' in self.next_definition:
-            self.next_scraper = Scraper(self.next_definition['scraper'])
+            self.next_scraper = Scraper(self.next_definition['scraper'], engine=engine)
 
     def start_jobs(self):
 
@@ -195,6 +197,13 @@ class DefinitionSpider(Spider):
         for url in start_urls:
             yield CrawlJob(url, spider=self.name)
 
+    def process_content(self, job, response, meta=None):
+        decoded_content = super().process_content(job, response, meta)
+
+        # NOTE: the document will only be parsed once, even if multiple
+        # scrapers need it
+        return ParsedDocument(decoded_content)
+
     def next_targets(self, content, next_level):
 
         # Scraping next results
@@ -228,7 +237,8 @@ class DefinitionSpider(Spider):
                 url=urljoin(current_url, target['url']),
                 spider=target.get('spider', self.name),
                 level=next_level,
-                data=target.get('data')
+                data=target.get('data'),
+                priority=target.get('priority', 0)
             )
 
     def next_jobs(self, job, response, content, meta=None):
@@ -261,15 +271,16 @@ class DefinitionSpider(Spider):
 
 
 class TaskContext(object):
-    def __init__(self, queue, queue_iterator):
-        self.queue = queue
+    def __init__(self, frontier, queue_iterator, job):
+        self.frontier = frontier
         self.queue_iterator = queue_iterator
+        self.job = job
 
     def __enter__(self):
         pass
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.queue.task_done()
+        self.frontier.done(self.job)
         self.queue_iterator.task_done()
 
 
@@ -277,39 +288,62 @@ class Crawler(object):
 
     # TODO: start_jobs with multiple spiders
     def __init__(self, spec=None, spider=None, spiders=None, start_jobs=None,
-                 queue_path=None, threads=25,
-                 buffer_size=DEFAULT_GROUP_BUFFER_SIZE, throttle=DEFAULT_THROTTLE):
+                 frontier_path=None, threads=25,
+                 buffer_size=DEFAULT_GROUP_BUFFER_SIZE, throttle=DEFAULT_THROTTLE,
+                 domain_parallelism=DEFAULT_GROUP_PARALLELISM, cache=None,
+                 engine=None, instrumentation=None, dns=None):
 
         # NOTE: crawling could work depth-first but:
         # buffer_size should be 0 (requires to fix quenouille issue #1)
 
         # Params
         self.start_jobs = start_jobs
-        self.queue_path = queue_path
+        self.frontier_path = frontier_path
         self.threads = threads
         self.buffer_size = buffer_size
         self.throttle = throttle
-
-        self.using_persistent_queue = queue_path is not None
-        self.http = create_pool(threads=threads)
+        self.domain_parallelism = domain_parallelism
+
+        self.http = create_pool(
+            threads=threads,
+            domain_parallelism=domain_parallelism,
+            cache=cache,
+            instrumentation=instrumentation,
+            dns=dns
+        )
+        self.dns = dns
+        self.instrumentation = instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        self.adaptive_throttle = throttle if isinstance(throttle, AdaptiveThrottle) else None
         self.state = CrawlerState()
         self.started = False
 
-        # Memory queue
-        if not self.using_persistent_queue:
-            queue = Queue()
+        # Memory frontier
+        if frontier_path is None:
+            frontier = MemoryFrontier(
+                throttle=throttle,
+                parallelism=domain_parallelism
+            )
 
-        # Persistent queue
+        # Persistent frontier
         else:
-            queue = SQLiteQueue(queue_path, multithreading=True, auto_commit=False)
+            frontier = SQLiteFrontier(
+                frontier_path,
+                throttle=throttle,
+                parallelism=domain_parallelism
+            )
+
+        self.state.jobs_done = frontier.stats.done
 
         # Creating spiders
         if spec is not None:
             if 'spiders' in spec:
-                spiders = {name: DefinitionSpider(s, name=name) for name, s in spec['spiders'].items()}
+                spiders = {
+                    name: DefinitionSpider(s, name=name, engine=engine)
+                    for name, s in spec['spiders'].items()
+                }
                 self.single_spider = False
             else:
-                spiders = {'default': DefinitionSpider(spec)}
+                spiders = {'default': DefinitionSpider(spec, engine=engine)}
                 self.single_spider = True
 
         elif spider is not None:
@@ -323,52 +357,94 @@ class Crawler(object):
             if callable(s) and not isinstance(s, Spider):
                 spiders[name] = FunctionSpider(s, name)
 
-        self.queue = queue
+        self.frontier = frontier
         self.spiders = spiders
 
     def enqueue(self, job_or_jobs):
+        """
+        Method enqueuing the given jobs, ignoring the ones whose url was
+        already seen by the crawler. Returns the number of enqueued jobs.
+        """
         if not isinstance(job_or_jobs, (CrawlJob, str)):
+            jobs = []
+
             for job in job_or_jobs:
                 assert isinstance(job, (CrawlJob, str))
-                self.queue.put(ensure_job(job))
+                jobs.append(ensure_job(job))
         else:
-            self.queue.put(ensure_job(job_or_jobs))
+            jobs = [ensure_job(job_or_jobs)]
+
+        # NOTE: resolving hostnames while the jobs wait in the frontier
+        if self.dns is not None:
+            for job in jobs:
+                self.dns.prefetch_url(job.url)
+
+        added = self.frontier.put_many(jobs)
 
-        self.state.jobs_queued = self.queue.qsize()
+        self.state.jobs_queued = self.frontier.qsize()
+
+        return added
 
     def start(self):
 
         if self.started:
             return
 
-        # Collecting start jobs - we only add those if queue is not pre-existing
-        if self.queue.qsize() == 0:
-
-            # NOTE: start jobs are all buffered into memory
-            # We could use a blocking queue with max size but this could prove
-            # difficult to resume crawls based upon lazy iterators
-            if self.start_jobs:
-                self.enqueue(self.start_jobs)
+        # Collecting start jobs - when resuming, the frontier will ignore them
+        # since it has already seen them
+        # NOTE: start jobs are all buffered into memory
+        # We could use a blocking queue with max size but this could prove
+        # difficult to resume crawls based upon lazy iterators
+        if self.start_jobs:
+            self.enqueue(self.start_jobs)
 
-            for spider in self.spiders.values():
-                spider_start_jobs = spider.start_jobs()
+        for spider in self.spiders.values():
+            spider_start_jobs = spider.start_jobs()
 
-                if spider_start_jobs is not None:
-                    self.enqueue(spider_start_jobs)
+            if spider_start_jobs is not None:
+                self.enqueue(spider_start_jobs)
 
         self.started = True
 
     def work(self, job):
-        self.state.jobs_queued = self.queue.qsize()
+        # NOTE: hosts such as localhost have no domain name
+        domain = CrawlJob.grouper(job) or get_normalized_hostname(job.url)
+        self.instrumentation.start_job(domain, job)
+
+        try:
+            return self.process_job(job)
+        finally:
+            self.instrumentation.end_job()
+
+    def process_job(self, job):
+        self.state.jobs_queued = self.frontier.qsize()
 
         spider = self.spiders.get(job.spider)
 
         if spider is None:
             raise UnknownSpiderError('Unknown spider "%s"' % job.spider)
 
+        if self.adaptive_throttle is not None:
+            domain = CrawlJob.grouper(job)
+
+            # NOTE: requeuing jobs released before a Retry-After was received,
+            # so that threads don't sleep & the throttle holds the domain
+            blocked_for = self.adaptive_throttle.blocked_for(domain)
+
+            if blocked_for > 0:
+                self.frontier.requeue(job, blocked_for)
+                return None
+
+            start = time.monotonic()
+
         err, response = request(self.http, job.url)
 
+        if self.adaptive_throttle is not None:
+            self.adaptive_throttle.observe(domain, time.monotonic() - start, response=response, error=err)
+
         if err:
+            self.instrumentation.increment('errors')
+
             return CrawlWorkerResult(
                 job=job,
                 scraped=None,
@@ -379,24 +455,33 @@ class Crawler(object):
                 next_jobs=None
             )
 
-        meta = spider.extract_meta_from_response(job, response)
+        self.instrumentation.increment('bytes', len(response.data))
 
-        # Decoding response content
-        content = spider.process_content(job, response, meta)
+        with self.instrumentation.timer('meta'):
+            meta = spider.extract_meta_from_response(job, response)
 
-        if isinstance(spider, FunctionSpider):
-            next_jobs, scraped = spider.process(job, response, content, meta)
-        else:
+        with self.instrumentation.timer('process'):
 
-            # Scraping items
-            scraped = spider.scrape(job, response, content, meta)
+            # Decoding response content
+            content = spider.process_content(job, response, meta)
 
-            # Finding next jobs
-            next_jobs = spider.next_jobs(job, response, content, meta)
+            if isinstance(spider, FunctionSpider):
+                next_jobs, scraped = spider.process(job, response, content, meta)
+            else:
+
+                # Scraping items
+                scraped = spider.scrape(job, response, content, meta)
+
+                # Finding next jobs
+                next_jobs = spider.next_jobs(job, response, content, meta)
+
+            if next_jobs is not None:
+                next_jobs = list(next_jobs)
 
         # Enqueuing next jobs
         if next_jobs is not None:
-            self.enqueue(next_jobs)
+            with self.instrumentation.timer('enqueue'):
+                self.enqueue(next_jobs)
 
         self.state.jobs_done += 1
 
@@ -414,22 +499,29 @@ class Crawler(object):
 
         self.start()
 
-        queue_iterator = QueueIterator(self.queue)
-        task_context = TaskContext(self.queue, queue_iterator)
+        queue_iterator = QueueIterator(self.frontier)
 
         multithreaded_iterator = imap_unordered(
-            queue_iterator,
+            self.instrumentation.track_queue(queue_iterator),
             self.work,
             self.threads,
             group=CrawlJob.grouper,
-            group_parallelism=DEFAULT_GROUP_PARALLELISM,
+            group_parallelism=self.domain_parallelism,
             group_buffer_size=self.buffer_size,
-            group_throttle=self.throttle
+
+            # NOTE: the frontier only hands out jobs of ready domains
+            group_throttle=0
         )
 
         def generator():
             for result in multithreaded_iterator:
-                with task_context:
+
+                # NOTE: the job was requeued
+                if result is None:
+                    queue_iterator.task_done()
+                    continue
+
+                with TaskContext(self.frontier, queue_iterator, result.job):
                     yield result
 
             self.cleanup()
@@ -438,10 +530,8 @@ class Crawler(object):
 
     def cleanup(self):
 
-        # Releasing queue (needed by persistqueue)
-        if self.using_persistent_queue:
-            del self.queue
-            rmtree(self.queue_path, ignore_errors=True)
+        # NOTE: the persistent frontier is kept so that we know what was done
+        self.frontier.close()
 
 
 # Transfer __doc__
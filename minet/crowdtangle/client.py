@@ -5,11 +5,8 @@
 # A unified CrowdTangle API client that can be used to keep an eye on the
 # rate limit and the used token etc.
 #
-from minet.utils import (
-    create_pool,
-    RateLimiterState,
-    rate_limited_method
-)
+from minet.utils import create_pool, rate_limited_method
+from minet.rate_limiting import GCRARateLimiter, FileRateLimiterBackend
 from minet.crowdtangle.constants import (
     CROWDTANGLE_DEFAULT_TIMEOUT,
     CROWDTANGLE_DEFAULT_RATE_LIMIT,
@@ -24,7 +21,8 @@ from minet.crowdtangle.summary import crowdtangle_summary
 
 
 class CrowdTangleClient(object):
-    def __init__(self, token, rate_limit=None):
+    def __init__(self, token, rate_limit=None, cache=None, burst=1,
+                 rate_limit_file=None):
         if rate_limit is None:
             rate_limit = CROWDTANGLE_DEFAULT_RATE_LIMIT
             summary_rate_limit = CROWDTANGLE_LINKS_DEFAULT_RATE_LIMIT
@@ -32,10 +30,28 @@ class CrowdTangleClient(object):
             rate_limit = rate_limit
             summary_rate_limit = rate_limit
 
+        backend = None
+        summary_backend = None
+
+        # NOTE: sharing the budget with other processes using the same token
+        if rate_limit_file is not None:
+            backend = FileRateLimiterBackend(rate_limit_file)
+            summary_backend = FileRateLimiterBackend(rate_limit_file + '.links')
+
         self.token = token
-        self.rate_limiter_state = RateLimiterState(rate_limit, period=60)
-        self.summary_rate_limiter_state = RateLimiterState(summary_rate_limit, period=60)
-        self.http = create_pool(timeout=CROWDTANGLE_DEFAULT_TIMEOUT)
+        self.rate_limiter_state = GCRARateLimiter(
+            rate_limit,
+            period=60,
+            burst=burst,
+            backend=backend
+        )
+        self.summary_rate_limiter_state = GCRARateLimiter(
+            summary_rate_limit,
+            period=60,
+            burst=burst,
+            backend=summary_backend
+        )
+        self.http = create_pool(timeout=CROWDTANGLE_DEFAULT_TIMEOUT, cache=cache)
 
     def leaderboard(self, **kwargs):
         return crowdtangle_leaderboard(
@@ -14,6 +14,7 @@ CROWDTANGLE_OUTPUT_FORMATS = {
 
 CROWDTANGLE_DEFAULT_RATE_LIMIT = 6  # Number of hits per minute
 CROWDTANGLE_LINKS_DEFAULT_RATE_LIMIT = 2
+CROWDTANGLE_SUMMARY_DEFAULT_THREADS = 10
 
 CROWDTANGLE_DEFAULT_TIMEOUT = Timeout(connect=10, read=60 * 5)
 
@@ -5,7 +5,9 @@
 # Miscellaneous generic functions used throughout the CrowdTangle namespace.
 #
 import json
+from collections import deque
 from datetime import date, timedelta
+from threading import Condition, Thread
 
 from minet.utils import request, rate_limited_from_state
 from minet.crowdtangle.constants import (
@@ -21,18 +23,38 @@ from minet.crowdtangle.exceptions import (
 
 DAY_DELTA = timedelta(days=1)
 
+# Max number of pages of a day fetched ahead of the consumer
+DAY_PAGES_BUFFER_SIZE = 4
 
-def day_range(end):
-    day_delta = timedelta(days=1)
 
-    start_date = date(*[int(i) for i in end.split('-')])
-    current_date = date.today() + day_delta
+def parse_day(string):
+    return date(*[int(i) for i in string[:10].split('-')])
 
-    while start_date != current_date:
+
+def day_range(start, end=None):
+    """
+    Function yielding (start_date, end_date) partitions of a single day, from
+    the most recent one to the oldest one, between the given dates. If no end
+    is given, the range starts from today.
+
+    Note that an end date having a time part (e.g. when resuming), yields a
+    first partial day ending at the given time.
+    """
+    start_date = parse_day(start)
+
+    if end is None:
+        current_date = date.today() + DAY_DELTA
+    else:
+        current_date = parse_day(end)
+
+        if len(end) > 10 and current_date >= start_date:
+            yield max(current_date.isoformat(), start), end
+
+    while current_date > start_date:
         end_date = current_date
-        current_date -= day_delta
+        current_date -= DAY_DELTA
 
-        yield current_date.isoformat(), end_date.isoformat()
+        yield max(current_date.isoformat(), start), end_date.isoformat()
 
 
 # TODO: __call__ should receive a status to make finer decisions
@@ -61,7 +83,7 @@ class PartitionStrategyDay(PartitionStrategyNoop):
         self.kwargs = kwargs
         self.url_forge = url_forge
 
-        self.range = day_range(kwargs['start_date'])
+        self.range = day_range(kwargs['start_date'], kwargs.get('end_date'))
 
     def __call__(self, items):
         start_date, end_date = next(self.range, (None, None))
@@ -154,12 +176,175 @@ def default_item_id_getter(item):
     return item['id']
 
 
+def iterate_pages(rate_limited_step, http, partition_strategy, item_key,
+                  item_id_getter):
+    """
+    Generator yielding (details, items) for every page of results found by
+    following the pagination & the given partition strategy.
+    """
+    url = partition_strategy(None)
+    last_url = None
+    last_items = set()
+
+    # TODO: those conditions are a bit hacky. code could be clearer
+    while url is not None and url != last_url:
+        try:
+            items, next_url = rate_limited_step(http, url, item_key)
+        except CrowdTangleExhaustedPagination:
+            url = partition_strategy(None)
+            continue
+
+        last_url = url
+
+        yield partition_strategy.get_detail(), [
+            item for item in items
+            if item_id_getter(item) not in last_items
+        ]
+
+        # We need to track last items to avoid registering the same one twice
+        last_items = set(item_id_getter(item) for item in items)
+
+        # Paginating
+        if next_url is None:
+            url = partition_strategy(items)
+            continue
+
+        if partition_strategy.should_go_next(items):
+            url = next_url
+        else:
+            url = partition_strategy(items)
+
+
+class DayPages(object):
+    __slots__ = ('start_date', 'pages', 'done', 'error')
+
+    def __init__(self, start_date):
+        self.start_date = start_date
+        self.pages = deque()
+        self.done = False
+        self.error = None
+
+
+def iterate_day_pages_concurrently(rate_limited_step, http, kwargs, url_forge,
+                                   item_key, item_id_getter, threads):
+    """
+    Generator yielding the same pages as `iterate_pages` using the "day"
+    partition strategy, but fetching the days concurrently. Days are still
+    yielded in the same order, from the most recent one to the oldest one.
+
+    Pages are streamed to the consumer: threads never run more than `threads`
+    days, nor `DAY_PAGES_BUFFER_SIZE` pages of a day, ahead of it, and stop
+    paginating as soon as the generator is closed, e.g. once the consumer's
+    limit is reached.
+    """
+    days = day_range(kwargs['start_date'], kwargs.get('end_date'))
+    condition = Condition()
+    started = deque()
+    stopped = False
+    exhausted = False
+
+    def fetch_day(day, end_date):
+        partition_strategy = PartitionStrategyNoop(
+            dict(kwargs, start_date=day.start_date, end_date=end_date),
+            url_forge
+        )
+
+        pages = iterate_pages(
+            rate_limited_step,
+            http,
+            partition_strategy,
+            item_key,
+            item_id_getter
+        )
+
+        # NOTE: the next page is only requested once this one was buffered
+        for _, items in pages:
+            with condition:
+                while (
+                    not stopped and
+                    len(day.pages) >= DAY_PAGES_BUFFER_SIZE
+                ):
+                    condition.wait()
+
+                if stopped:
+                    return
+
+                day.pages.append(items)
+                condition.notify_all()
+
+    def worker():
+        nonlocal exhausted
+
+        while True:
+            with condition:
+                while not stopped and len(started) >= threads:
+                    condition.wait()
+
+                if stopped:
+                    return
+
+                partition = next(days, None)
+
+                if partition is None:
+                    exhausted = True
+                    condition.notify_all()
+                    return
+
+                day = DayPages(partition[0])
+                started.append(day)
+
+            try:
+                fetch_day(day, partition[1])
+            except Exception as e:
+                day.error = e
+            finally:
+                with condition:
+                    day.done = True
+                    condition.notify_all()
+
+    for _ in range(threads):
+        Thread(target=worker, daemon=True).start()
+
+    try:
+        while True:
+            with condition:
+                while not started and not exhausted:
+                    condition.wait()
+
+                if not started:
+                    return
+
+                day = started[0]
+
+                while not day.pages and not day.done:
+                    condition.wait()
+
+                if not day.pages:
+                    started.popleft()
+                    condition.notify_all()
+
+                    if day.error is not None:
+                        raise day.error
+
+                    continue
+
+                items = day.pages.popleft()
+                condition.notify_all()
+
+            yield {'day': day.start_date}, items
+
+    finally:
+        with condition:
+            stopped = True
+            condition.notify_all()
+
+
 def make_paginated_iterator(url_forge, item_key, formatter,
                             item_id_getter=default_item_id_getter):
 
     def create_iterator(http, token, rate_limiter_state, partition_strategy=None,
                         limit=None, format='csv_dict_row', per_call=False, detailed=False,
-                        namespace=None, **kwargs):
+                        namespace=None, threads=None, **kwargs):
 
         if namespace is not None:
             kwargs = vars(namespace)
@@ -169,85 +354,78 @@ def make_paginated_iterator(url_forge, item_key, formatter,
         if format not in CROWDTANGLE_OUTPUT_FORMATS:
             raise TypeError('minet.crowdtangle: unkown `format`.')
 
-        if partition_strategy is not None:
-            if isinstance(partition_strategy, int):
-                partition_strategy = PartitionStrategyLimit(kwargs, url_forge, partition_strategy)
-            else:
-                if partition_strategy == 'day' and kwargs.get('start_date') is None:
-                    raise CrowdTangleMissingStartDateError
-
-                partition_strategy = PARTITION_STRATEGIES[partition_strategy](kwargs, url_forge)
-        else:
-            partition_strategy = PartitionStrategyNoop(kwargs, url_forge)
+        concurrent = threads is not None and threads > 1
 
-        N = 0
-        C = 0
-        url = partition_strategy(None)
-        last_url = None
-        last_items = set()
+        if concurrent and partition_strategy != 'day':
+            raise TypeError('minet.crowdtangle: only the `day` partition strategy can be used with several `threads`.')
 
-        has_limit = limit is not None
+        if partition_strategy == 'day' and kwargs.get('start_date') is None:
+            raise CrowdTangleMissingStartDateError
 
         rate_limited_step = rate_limited_from_state(rate_limiter_state)(step)
 
-        # TODO: those conditions are a bit hacky. code could be clearer
-        while url is not None and url != last_url:
-            C += 1
-
-            try:
-                items, next_url = rate_limited_step(http, url, item_key)
-            except CrowdTangleExhaustedPagination:
-                url = partition_strategy(None)
-                continue
-
-            enough_to_stop = False
+        if concurrent:
+            pages = iterate_day_pages_concurrently(
+                rate_limited_step,
+                http,
+                kwargs,
+                url_forge,
+                item_key,
+                item_id_getter,
+                threads
+            )
+        else:
+            if partition_strategy is not None:
+                if isinstance(partition_strategy, int):
+                    partition_strategy = PartitionStrategyLimit(kwargs, url_forge, partition_strategy)
+                else:
+                    partition_strategy = PARTITION_STRATEGIES[partition_strategy](kwargs, url_forge)
+            else:
+                partition_strategy = PartitionStrategyNoop(kwargs, url_forge)
 
-            n = 0
+            pages = iterate_pages(
+                rate_limited_step,
+                http,
+                partition_strategy,
+                item_key,
+                item_id_getter
+            )
 
-            last_url = url
+        N = 0
+        has_limit = limit is not None
 
-            acc = []
+        # NOTE: closing the pages so that threads stop paginating at once
+        try:
+            for details, items in pages:
+                enough_to_stop = False
 
-            for item in items:
-                if item_id_getter(item) in last_items:
-                    continue
+                acc = []
 
-                n += 1
-                N += 1
+                for item in items:
+                    N += 1
 
-                if format == 'csv_dict_row':
-                    item = formatter(item, as_dict=True)
-                elif format == 'csv_row':
-                    item = formatter(item)
+                    if format == 'csv_dict_row':
+                        item = formatter(item, as_dict=True)
+                    elif format == 'csv_row':
+                        item = formatter(item)
 
-                acc.append(item)
+                    acc.append(item)
 
-                if has_limit and N >= limit:
-                    enough_to_stop = True
-                    break
+                    if has_limit and N >= limit:
+                        enough_to_stop = True
+                        break
 
-            if per_call:
-                if detailed:
-                    yield partition_strategy.get_detail(), acc
+                if per_call:
+                    if detailed:
+                        yield details, acc
+                    else:
+                        yield acc
                 else:
-                    yield acc
-            else:
-                yield from acc
+                    yield from acc
 
-            if enough_to_stop:
-                break
-
-            # We need to track last items to avoid registering the same one twice
-            last_items = set(item_id_getter(item) for item in items)
-
-            # Paginating
-            if next_url is None:
-                url = partition_strategy(items)
-                continue
-
-            if partition_strategy.should_go_next(items):
-                url = next_url
-            else:
-                url = partition_strategy(items)
+                if enough_to_stop:
+                    break
+        finally:
+            pages.close()
 
     return create_iterator
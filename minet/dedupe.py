@@ -0,0 +1,253 @@
+# =============================================================================
+# Minet Deduplicator
+# =============================================================================
+#
+# Deduplicator that can be given to `multithreaded_fetch` &
+# `multithreaded_resolve` so that urls occurring many times in their input,
+# e.g. shortened urls in social media exports, are only processed once.
+#
+# Only the first occurrence of a url, as keyed by a conservatively normalized
+# form, is handed to the threads. Occurrences found while it is being
+# processed are parked until its result is known, while later occurrences are
+# served from a bounded cache of recent results. Duplicates never reach the
+# threads so that they don't wait for their domain's throttle needlessly.
+# Every item still gets its own result.
+#
+# Since the input is consumed by the threads while results are fanned out by
+# the consumer, the filter blocks when too many cached duplicates wait to be
+# fanned out, as long as some results are still to come. Items waiting for a
+# retry are not counted as such since they can only come back through the
+# very iterator the filter is blocking.
+#
+from threading import Condition
+from collections import OrderedDict, deque
+
+from minet.url_cache import normalize_url
+from minet.defaults import DEFAULT_DEDUPE_CACHE_SIZE, DEFAULT_DEDUPE_MAX_READY
+
+
+def dedupe_key(url):
+    """
+    Function returning the key of the given url, using the same kind of
+    normalization as the crawler's frontier while keeping the protocol,
+    language subdomains & fragment of the url.
+    """
+    try:
+        return normalize_url(
+            url,
+            strip_protocol=False,
+            strip_lang_subdomains=False,
+            strip_fragment=False,
+            infer_redirection=False
+        )
+    except Exception:
+        return url
+
+
+class DeduplicatorStats(object):
+    __slots__ = ('processed', 'joined', 'cached', 'evicted')
+
+    def __init__(self):
+        self.processed = 0
+        self.joined = 0
+        self.cached = 0
+        self.evicted = 0
+
+    @property
+    def duplicates(self):
+        return self.joined + self.cached
+
+    @property
+    def duplicate_rate(self):
+        total = self.processed + self.duplicates
+
+        if total == 0:
+            return 0.0
+
+        return self.duplicates / total
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'joined': self.joined,
+            'cached': self.cached,
+            'evicted': self.evicted,
+            'duplicate_rate': self.duplicate_rate
+        }
+
+
+class Deduplicator(object):
+    """
+    Thread-safe deduplicator of urls with an in-flight & completed results
+    cache.
+
+    Args:
+        max_size (int, optional): Max number of completed results to keep,
+            the least recently used ones being evicted first. Note that
+            results of `multithreaded_fetch` hold bodies in memory unless
+            they are streamed. Defaults to 1000.
+        max_ready (int, optional): Max number of duplicates served from the
+            cache that can wait to be fanned out before the filter blocks.
+            Defaults to 1000.
+        key (callable, optional): Function returning the key of a url.
+            Defaults to `minet.dedupe.dedupe_key`.
+
+    """
+
+    def __init__(self, max_size=DEFAULT_DEDUPE_CACHE_SIZE,
+                 max_ready=DEFAULT_DEDUPE_MAX_READY, key=dedupe_key):
+        if max_size < 0:
+            raise TypeError('max_size should be >= 0')
+
+        if max_ready < 1:
+            raise TypeError('max_ready should be >= 1')
+
+        self.max_size = max_size
+        self.max_ready = max_ready
+        self.key = key
+
+        self.lock = Condition()
+        self.in_flight = {}
+        self.results = OrderedDict()
+        self.ready = deque()
+        self.outstanding = 0
+        self.closed = False
+        self.stats = DeduplicatorStats()
+
+    def filter(self, iterator, url):
+        """
+        Method returning a generator over the items of the given iterator
+        that must actually be processed. The url of an item is returned by
+        the `url` function, items without url being always processed.
+
+        Note that when `max_ready` duplicates wait to be fanned out while no
+        result is to come, the next one is processed again so that the
+        consumer is not starved.
+        """
+        for item in iterator:
+            item_url = url(item)
+
+            if not item_url:
+                with self.lock:
+                    self.outstanding += 1
+
+                yield item
+                continue
+
+            key = self.key(item_url)
+
+            with self.lock:
+                while (
+                    len(self.ready) >= self.max_ready and
+                    self.outstanding > 0 and
+                    not self.closed
+                ):
+                    self.lock.wait()
+
+                result = self.results.get(key)
+
+                if result is not None and len(self.ready) < self.max_ready:
+                    self.results.move_to_end(key)
+                    self.ready.append((item, result))
+                    self.stats.cached += 1
+                    continue
+
+                followers = self.in_flight.get(key)
+
+                if followers is not None:
+                    followers.append(item)
+                    self.stats.joined += 1
+                    continue
+
+                self.in_flight[key] = []
+                self.outstanding += 1
+                self.stats.processed += 1
+
+            yield item
+
+    def complete(self, url, result):
+        """
+        Method recording the result of the given url and returning the items
+        that were waiting for it.
+        """
+        key = self.key(url)
+
+        with self.lock:
+            followers = self.in_flight.pop(key, [])
+
+            if self.max_size > 0:
+                self.results[key] = result
+
+                while len(self.results) > self.max_size:
+                    self.results.popitem(last=False)
+                    self.stats.evicted += 1
+
+        return followers
+
+    def drain(self):
+        """
+        Method returning the items found in the results cache since last
+        call, along with their result.
+        """
+        with self.lock:
+            ready = list(self.ready)
+            self.ready.clear()
+            self.lock.notify_all()
+
+        return ready
+
+    def acknowledge(self):
+        """
+        Method recording that a result of an item returned by the filter was
+        consumed.
+        """
+        with self.lock:
+            self.outstanding -= 1
+            self.lock.notify_all()
+
+    def park(self):
+        """
+        Method recording that an item returned by the filter was put aside,
+        e.g. to be retried later, so that no result is to be expected from it
+        until it is unparked.
+        """
+        with self.lock:
+            self.outstanding -= 1
+            self.lock.notify_all()
+
+    def unpark(self):
+        """
+        Method recording that an item that was put aside is processed again.
+        """
+        with self.lock:
+            self.outstanding += 1
+
+    def fan_out(self, results, url, copy):
+        """
+        Method returning a generator over the given results, along with the
+        results of the duplicate items. The `url` function returns the url
+        of a result, or None if it was not deduplicated, and the `copy`
+        function returns a copy of a result for the given item.
+        """
+        try:
+            for result in results:
+                yield result
+
+                result_url = url(result)
+
+                if result_url:
+                    for item in self.complete(result_url, result):
+                        yield copy(result, item)
+
+                for item, cached in self.drain():
+                    yield copy(cached, item)
+
+                self.acknowledge()
+
+            for item, cached in self.drain():
+                yield copy(cached, item)
+
+        finally:
+            with self.lock:
+                self.closed = True
+                self.lock.notify_all()
@@ -9,6 +9,25 @@
 DEFAULT_GROUP_PARALLELISM = 1
 DEFAULT_GROUP_BUFFER_SIZE = 25
 DEFAULT_THROTTLE = 0.2
+DEFAULT_ADAPTIVE_THROTTLE_MIN_DELAY = 0.05
+DEFAULT_ADAPTIVE_THROTTLE_MAX_DELAY = 30
+DEFAULT_ADAPTIVE_THROTTLE_MAX_PARALLELISM = 4
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BASE_DELAY = 1
+DEFAULT_RETRY_MAX_DELAY = 60
+DEFAULT_DNS_TTL = 300
+DEFAULT_DNS_NEGATIVE_TTL = 30
+DEFAULT_DNS_CACHE_SIZE = 100000
+DEFAULT_DNS_PREFETCH_THREADS = 4
+DEFAULT_DNS_PREFETCH_LOOKAHEAD = 512
+DEFAULT_DEDUPE_CACHE_SIZE = 1000
+DEFAULT_DEDUPE_MAX_READY = 1000
+DEFAULT_ASYNC_CONCURRENCY = 1000
 DEFAULT_CONNECT_TIMEOUT = 5
 DEFAULT_READ_TIMEOUT = 25
 DEFAULT_SPOOFED_UA = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.13; rv:69.0) Gecko/20100101 Firefox/69.0'
+
+# Multiprocessing-related
+DEFAULT_PROCESS_CHUNKSIZE = 16
+DEFAULT_ROWS_CHUNKSIZE = 1024
+DEFAULT_PENDING_CHUNKS_PER_PROCESS = 4
@@ -0,0 +1,317 @@
+# =============================================================================
+# Minet DNS Cache
+# =============================================================================
+#
+# In-process DNS cache that can be given to `minet.utils.create_pool` so that
+# new connections don't resolve their hostname using the system resolver
+# every time, caching successful lookups for a given TTL & failed ones for a
+# shorter one. Hostnames can also be prefetched by a few background threads
+# so that they are already resolved by the time a worker connects to them,
+# which requires to read the items to process a bit ahead.
+#
+# Note that the system resolver does not expose the TTL of records, hence
+# the fixed TTL. Concurrent lookups of a same hostname are performed once.
+#
+import time
+import socket
+from queue import Queue, Full
+from threading import Event, Lock, Thread
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.ssl_ import is_ipaddress
+
+from minet.instrumentation import Histogram
+from minet.defaults import (
+    DEFAULT_DNS_TTL,
+    DEFAULT_DNS_NEGATIVE_TTL,
+    DEFAULT_DNS_CACHE_SIZE,
+    DEFAULT_DNS_PREFETCH_THREADS,
+    DEFAULT_DNS_PREFETCH_LOOKAHEAD
+)
+
+PREFETCH_QUEUE_SIZE = 1024
+
+
+def get_hostname(url):
+    """
+    Function returning the hostname of the given url, as used by urllib3 to
+    connect to it, or None if it cannot be found.
+    """
+    if not url:
+        return None
+
+    try:
+        hostname = urlsplit(url).hostname
+    except ValueError:
+        return None
+
+    if not hostname:
+        return None
+
+    return hostname.rstrip('.')
+
+
+class DNSCacheEntry(object):
+    __slots__ = ('addresses', 'error', 'expires_at', 'prefetched')
+
+    def __init__(self, addresses, error, expires_at, prefetched=False):
+        self.addresses = addresses
+        self.error = error
+        self.expires_at = expires_at
+        self.prefetched = prefetched
+
+
+class DNSCacheStats(object):
+    __slots__ = (
+        'hits',
+        'negative_hits',
+        'misses',
+        'failures',
+        'waits',
+        'prefetches',
+        'prefetch_hits',
+        'evicted',
+        'lookups'
+    )
+
+    def __init__(self):
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.waits = 0
+        self.prefetches = 0
+        self.prefetch_hits = 0
+        self.evicted = 0
+        self.lookups = Histogram()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.negative_hits + self.misses
+
+        if total == 0:
+            return 0.0
+
+        return (self.hits + self.negative_hits) / total
+
+    def to_dict(self):
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'failures': self.failures,
+            'waits': self.waits,
+            'prefetches': self.prefetches,
+            'prefetch_hits': self.prefetch_hits,
+            'evicted': self.evicted,
+            'hit_rate': self.hit_rate,
+            'lookups': self.lookups.to_dict()
+        }
+
+
+class DNSCache(object):
+    """
+    Thread-safe DNS cache with negative caching & prefetching.
+
+    Args:
+        ttl (float, optional): Time - in seconds - to keep successful
+            lookups. Defaults to 300.
+        negative_ttl (float, optional): Time - in seconds - to keep failed
+            lookups. Defaults to 30.
+        max_size (int, optional): Max number of hostnames to keep, the least
+            recently used ones being evicted first. Defaults to 100000.
+        prefetch_threads (int, optional): Number of background threads
+            prefetching hostnames. Defaults to 4.
+        resolver (callable, optional): Function used to perform lookups.
+            Defaults to `socket.getaddrinfo`.
+        clock (callable, optional): Clock to use. Defaults to
+            `time.monotonic`.
+
+    """
+
+    def __init__(self, ttl=DEFAULT_DNS_TTL, negative_ttl=DEFAULT_DNS_NEGATIVE_TTL,
+                 max_size=DEFAULT_DNS_CACHE_SIZE, prefetch_threads=DEFAULT_DNS_PREFETCH_THREADS,
+                 resolver=socket.getaddrinfo, clock=time.monotonic):
+
+        if ttl < 0 or negative_ttl < 0:
+            raise TypeError('ttl & negative_ttl should be >= 0')
+
+        if max_size < 1:
+            raise TypeError('max_size should be >= 1')
+
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.prefetch_threads = prefetch_threads
+        self.resolver = resolver
+        self.clock = clock
+
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.stats = DNSCacheStats()
+
+        self.prefetch_queue = None
+
+    def lookup(self, hostname, prefetched):
+        start = self.clock()
+        error = None
+        addresses = None
+
+        try:
+            infos = self.resolver(hostname, None, allowed_gai_family(), socket.SOCK_STREAM)
+
+            # NOTE: deduplicating while keeping the resolver's preference order
+            addresses = list(OrderedDict.fromkeys(info[4][0] for info in infos))
+
+            if not addresses:
+                raise socket.gaierror(socket.EAI_NONAME, 'getaddrinfo returns an empty list')
+
+        except socket.gaierror as e:
+            error = e
+
+        now = self.clock()
+
+        with self.lock:
+            self.stats.lookups.add(now - start)
+
+            if error is not None:
+                self.stats.failures += 1
+
+            if prefetched:
+                self.stats.prefetches += 1
+
+            self.entries[hostname] = DNSCacheEntry(
+                addresses,
+                error,
+                now + (self.ttl if error is None else self.negative_ttl),
+                prefetched=prefetched
+            )
+            self.entries.move_to_end(hostname)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats.evicted += 1
+
+        return addresses, error
+
+    def resolve(self, hostname, prefetched=False):
+        """
+        Method returning the list of ip addresses of the given hostname,
+        or raising a `socket.gaierror` if it cannot be resolved.
+        """
+        while True:
+            with self.lock:
+                entry = self.entries.get(hostname)
+
+                if entry is not None and entry.expires_at > self.clock():
+                    self.entries.move_to_end(hostname)
+
+                    if not prefetched:
+                        if entry.error is not None:
+                            self.stats.negative_hits += 1
+                        else:
+                            self.stats.hits += 1
+
+                        if entry.prefetched:
+                            entry.prefetched = False
+                            self.stats.prefetch_hits += 1
+
+                    addresses, error = entry.addresses, entry.error
+                    break
+
+                # NOTE: concurrent lookups of a same hostname wait for the first one
+                pending = self.in_flight.get(hostname)
+
+                if pending is None:
+                    pending = Event()
+                    self.in_flight[hostname] = pending
+
+                    if not prefetched:
+                        self.stats.misses += 1
+
+                    owner = True
+                else:
+                    if not prefetched:
+                        self.stats.waits += 1
+
+                    owner = False
+
+            if not owner:
+                if prefetched:
+                    return None
+
+                pending.wait()
+                continue
+
+            try:
+                addresses, error = self.lookup(hostname, prefetched)
+            finally:
+                with self.lock:
+                    del self.in_flight[hostname]
+
+                pending.set()
+
+            break
+
+        if error is not None:
+            raise socket.gaierror(*error.args)
+
+        return addresses
+
+    def prefetch_worker(self):
+        while True:
+            hostname = self.prefetch_queue.get()
+
+            try:
+                self.resolve(hostname, prefetched=True)
+            except Exception:
+                pass
+
+    def prefetch(self, hostname):
+        """
+        Method asynchronously resolving the given hostname, if it is not
+        already cached. Hostnames are dropped if too many are waiting.
+        """
+        if not hostname or self.prefetch_threads < 1 or is_ipaddress(hostname):
+            return
+
+        with self.lock:
+            entry = self.entries.get(hostname)
+
+            if entry is not None and entry.expires_at > self.clock():
+                return
+
+            if hostname in self.in_flight:
+                return
+
+            if self.prefetch_queue is None:
+                self.prefetch_queue = Queue(maxsize=PREFETCH_QUEUE_SIZE)
+
+                for _ in range(self.prefetch_threads):
+                    Thread(target=self.prefetch_worker, daemon=True).start()
+
+        try:
+            self.prefetch_queue.put_nowait(hostname)
+        except Full:
+            pass
+
+    def prefetch_url(self, url):
+        return self.prefetch(get_hostname(url))
+
+    def lookahead(self, iterator, key=None, size=DEFAULT_DNS_PREFETCH_LOOKAHEAD):
+        """
+        Method returning a generator yielding the items of the given iterator
+        while prefetching the hostnames of the urls of the next `size` ones.
+        """
+        buffer = deque()
+
+        for item in iterator:
+            self.prefetch_url(item if key is None else key(item))
+            buffer.append(item)
+
+            if len(buffer) > size:
+                yield buffer.popleft()
+
+        yield from buffer
@@ -20,6 +20,10 @@ class InvalidURLError(MinetError):
     pass
 
 
+class ResponseTooLargeError(MinetError):
+    pass
+
+
 # Redirection errors
 class RedirectError(MinetError):
     pass
@@ -41,6 +45,21 @@ class InvalidRedirectError(RedirectError):
     pass
 
 
+# Scraping errors
+class ScrapeError(MinetError):
+    pass
+
+
+class InvalidScraperError(ScrapeError):
+    def __init__(self, errors):
+        self.errors = errors
+
+        super().__init__('\n'.join(
+            '%s: %s' % ('.'.join(str(k) for k in path) or '<root>', message)
+            for path, message in errors
+        ))
+
+
 # Crawling errors
 class CrawlError(MinetError):
     pass
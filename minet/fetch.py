@@ -5,15 +5,24 @@
 # Exposing a specialized quenouille wrapper grabbing various urls from the
 # web in a multithreaded fashion.
 #
+import time
 from collections import namedtuple
+from itertools import chain
 from quenouille import imap_unordered
-from ural import get_domain_name, ensure_protocol
+from ural import ensure_protocol
 
+from minet.url_cache import get_domain_name, get_normalized_hostname
+from minet.instrumentation import NULL_INSTRUMENTATION
+from minet.throttle import AdaptiveThrottle
+from minet.retry import RetryQueue
 from minet.utils import (
     create_pool,
     request,
     resolve,
-    extract_response_meta
+    stream_response,
+    extract_response_meta,
+    explain_request_error,
+    ENCODING_SNIFF_SIZE
 )
 
 from minet.defaults import (
@@ -53,10 +62,102 @@ ResolveWorkerResult = namedtuple(
 )
 
 
+def read_head(chunks, size=ENCODING_SNIFF_SIZE):
+    """
+    Function consuming the given chunk iterator until at least `size` bytes
+    are read. Returns the read chunks so they can be written later on.
+    """
+    head = []
+    head_size = 0
+
+    for chunk in chunks:
+        head.append(chunk)
+        head_size += len(chunk)
+
+        if head_size >= size:
+            break
+
+    return head
+
+
+def write_chunks(f, chunks, instrumentation=NULL_INSTRUMENTATION):
+    """
+    Function writing the given chunks into the given file and returning the
+    number of bytes consumed.
+    """
+    size = 0
+
+    for chunk in chunks:
+        with instrumentation.timer('write'):
+            f.write(chunk)
+
+        size += len(chunk)
+
+    return size
+
+
+def get_payload_url(payload):
+    return payload.url
+
+
+def copy_fetch_result(result, payload):
+    return result._replace(
+        url=payload.url,
+        item=payload.item,
+        meta=dict(result.meta) if result.meta is not None else None
+    )
+
+
+def copy_resolve_result(result, payload):
+    return result._replace(
+        url=payload.url,
+        item=payload.item
+    )
+
+
+def create_retry_queue(iterator, dedupe=None):
+    if dedupe is None:
+        return RetryQueue(iterator)
+
+    # NOTE: items waiting for a retry must not block the dedupe filter
+    return RetryQueue(iterator, on_schedule=dedupe.park, on_due=dedupe.unpark)
+
+
+def retrying_imap(retry_queue, worker, threads, instrumentation=NULL_INSTRUMENTATION,
+                  **kwargs):
+    """
+    Function consuming the given retry queue using `imap_unordered`. The
+    worker must schedule the retry of an item itself and return None, in
+    which case nothing is yielded, else the item is marked as done.
+    """
+    def retrying_worker(payload):
+        try:
+            result = worker(payload)
+        except BaseException:
+            retry_queue.done(payload)
+            raise
+
+        if result is not None:
+            retry_queue.done(payload)
+
+        return result
+
+    results = imap_unordered(
+        instrumentation.track_queue(retry_queue),
+        retrying_worker,
+        threads,
+        **kwargs
+    )
+
+    return (result for result in results if result is not None)
+
+
 def multithreaded_fetch(iterator, key=None, request_args=None, threads=25,
                         throttle=DEFAULT_THROTTLE, guess_extension=True,
                         guess_encoding=True, buffer_size=DEFAULT_GROUP_BUFFER_SIZE,
-                        insecure=False, timeout=None, domain_parallelism=DEFAULT_GROUP_PARALLELISM):
+                        insecure=False, timeout=None, domain_parallelism=DEFAULT_GROUP_PARALLELISM,
+                        max_body_size=None, stream_to=None, http=None, cache=None,
+                        instrumentation=None, retry=None, dns=None, dedupe=None):
     """
     Function returning a multithreaded iterator over fetched urls.
 
@@ -68,7 +169,8 @@ def multithreaded_fetch(iterator, key=None, request_args=None, threads=25,
         threads (int, optional): Number of threads to use. Defaults to 25.
         throttle (float or callable, optional): Per-domain throttle in seconds.
             Or a function taking domain name and item and returning the
-            throttle to apply. Defaults to 0.2.
+            throttle to apply, such as a `minet.throttle.AdaptiveThrottle`
+            which will be fed the outcome of every request. Defaults to 0.2.
         guess_extension (bool, optional): Attempt to guess the resource's
             extension? Defaults to True.
         guess_encoding (bool, optional): Attempt to guess the resource's
@@ -82,6 +184,36 @@ def multithreaded_fetch(iterator, key=None, request_args=None, threads=25,
             when performing requests. Defaults to False.
         timeout (float or urllib3.Timeout, optional): Custom timeout for every
             request.
+        max_body_size (int, optional): Max number of bytes to read from a
+            response's body before giving up with a `ResponseTooLargeError`.
+        stream_to (callable, optional): Function taking url, item & meta and
+            returning a writable binary file into which the response's body
+            will be streamed by chunks, instead of being buffered in memory.
+            The function may also return None to buffer the body as usual.
+            It is only called for non-empty bodies, and meta is computed
+            using the first few kilobytes of the body. The number of bytes
+            written will be found in meta under the "size" key.
+        http (urllib3.PoolManager, optional): Pool manager to use. Defaults
+            to one created using `create_pool` and sized accordingly.
+        cache (minet.http_cache.HTTPCache, optional): Cache to use when
+            creating the pool manager.
+        instrumentation (minet.instrumentation.Instrumentation, optional):
+            Instrumentation recording how long every url spends in each
+            stage of its fetching. Note that connection-level stages are
+            only recorded if the same instrumentation was given to the pool
+            manager, which is done automatically when `http` is not given.
+        retry (minet.retry.RetryPolicy, optional): Policy used to retry
+            urls failing with transient errors, such as timeouts or 429 &
+            5xx statuses, after an exponential backoff. Only the last
+            attempt of a url is yielded.
+        dns (minet.dns.DNSCache, optional): DNS cache used when creating the
+            pool manager. The hostnames of the next urls to fetch will be
+            prefetched using it.
+        dedupe (minet.dedupe.Deduplicator, optional): Deduplicator used to
+            fetch urls occurring many times only once. Duplicates are given
+            a copy of the result of their first occurrence, sharing its
+            response and its file if it was streamed. Note that this
+            assumes `request_args` only depends on the url.
 
     Yields:
         FetchWorkerResult
@@ -89,7 +221,77 @@ def multithreaded_fetch(iterator, key=None, request_args=None, threads=25,
     """
 
     # Creating the http pool manager
-    http = create_pool(threads=threads, insecure=insecure, timeout=timeout)
+    if http is None:
+        http = create_pool(
+            threads=threads,
+            insecure=insecure,
+            timeout=timeout,
+            domain_parallelism=domain_parallelism,
+            cache=cache,
+            instrumentation=instrumentation,
+            dns=dns
+        )
+
+    if instrumentation is None:
+        instrumentation = NULL_INSTRUMENTATION
+
+    adaptive_throttle = throttle if isinstance(throttle, AdaptiveThrottle) else None
+    retry_queue = None
+
+    # Streaming worker
+    def stream_worker(url, item, response):
+        meta = None
+        f = None
+
+        try:
+            chunks = stream_response(response, max_body_size=max_body_size)
+            head = read_head(chunks)
+            data = b''.join(head)
+
+            # Meta
+            with instrumentation.timer('meta'):
+                meta = extract_response_meta(
+                    response,
+                    guess_encoding=guess_encoding,
+                    guess_extension=guess_extension,
+                    data=data[:ENCODING_SNIFF_SIZE]
+                )
+
+            if data:
+                with instrumentation.timer('write'):
+                    f = stream_to(url, item, meta)
+
+            if f is None:
+                response._body = data + b''.join(chunks)
+                instrumentation.increment('bytes', len(response._body))
+            else:
+                try:
+                    meta['size'] = write_chunks(f, chain(head, chunks), instrumentation)
+                    instrumentation.increment('bytes', meta['size'])
+                finally:
+                    with instrumentation.timer('write'):
+                        f.close()
+
+        except Exception as e:
+            return FetchWorkerResult(
+                url=url,
+                item=item,
+                response=response,
+                error=explain_request_error(e),
+                meta=meta
+            )
+
+        finally:
+            response.close()
+            response.release_conn()
+
+        return FetchWorkerResult(
+            url=url,
+            item=item,
+            response=response,
+            error=None,
+            meta=meta
+        )
 
     # Thread worker
     def worker(payload):
@@ -104,11 +306,62 @@ def multithreaded_fetch(iterator, key=None, request_args=None, threads=25,
                 meta=None
             )
 
+        # NOTE: hosts such as localhost have no domain name
+        domain = get_domain_name(url) or get_normalized_hostname(url)
+        instrumentation.start_job(domain, payload)
+
+        try:
+            result = fetch_worker(payload)
+        finally:
+            instrumentation.end_job()
+
+        return result
+
+    # Fetching worker
+    def fetch_worker(payload):
+        _, item, url = payload
         kwargs = request_args(url, item) if request_args is not None else {}
 
-        error, response = request(http, url, **kwargs)
+        if adaptive_throttle is not None:
+            domain = get_domain_name(url)
+
+            # NOTE: requeuing calls released before a Retry-After was received,
+            # so that threads don't sleep & the throttle holds the domain
+            blocked_for = adaptive_throttle.blocked_for(domain)
+
+            if blocked_for > 0:
+                retry_queue.defer(payload, blocked_for)
+                return None
+
+            start = time.monotonic()
+
+        error, response = request(
+            http,
+            url,
+            max_body_size=max_body_size,
+            stream=stream_to is not None,
+            **kwargs
+        )
+
+        if adaptive_throttle is not None:
+            adaptive_throttle.observe(domain, time.monotonic() - start, response=response, error=error)
+
+        if retry is not None:
+            delay = retry.decide(retry_queue.retries(payload), error=error, response=response)
+
+            if delay is not None:
+                if response is not None:
+                    response.close()
+                    response.release_conn()
+
+                instrumentation.increment('retries')
+                retry_queue.retry(payload, delay)
+
+                return None
 
         if error:
+            instrumentation.increment('errors')
+
             return FetchWorkerResult(
                 url=url,
                 item=item,
@@ -117,15 +370,25 @@ def multithreaded_fetch(iterator, key=None, request_args=None, threads=25,
                 meta=None
             )
 
+        if stream_to is not None:
+            result = stream_worker(url, item, response)
+
+            if result.error is not None:
+                instrumentation.increment('errors')
+
+            return result
+
         # Forcing urllib3 to read data in thread
         data = response.data
+        instrumentation.increment('bytes', len(data))
 
         # Meta
-        meta = extract_response_meta(
-            response,
-            guess_encoding=guess_encoding,
-            guess_extension=guess_extension
-        )
+        with instrumentation.timer('meta'):
+            meta = extract_response_meta(
+                response,
+                guess_encoding=guess_encoding,
+                guess_extension=guess_extension
+            )
 
         return FetchWorkerResult(
             url=url,
@@ -165,22 +428,53 @@ def multithreaded_fetch(iterator, key=None, request_args=None, threads=25,
                 url=url
             )
 
-    return imap_unordered(
-        payloads(),
-        worker,
-        threads,
-        group=grouper,
-        group_parallelism=domain_parallelism,
-        group_buffer_size=buffer_size,
-        group_throttle=throttle
-    )
+    payload_iterator = payloads()
+
+    # NOTE: duplicates must not reach the threads, nor be retried
+    if dedupe is not None:
+        payload_iterator = dedupe.filter(payload_iterator, url=get_payload_url)
+
+    # NOTE: resolving hostnames while their urls wait to be fetched
+    if dns is not None:
+        payload_iterator = dns.lookahead(payload_iterator, key=get_payload_url)
+
+    # NOTE: the adaptive throttle also needs to requeue items
+    if retry is None and adaptive_throttle is None:
+        results = imap_unordered(
+            instrumentation.track_queue(payload_iterator),
+            worker,
+            threads,
+            group=grouper,
+            group_parallelism=domain_parallelism,
+            group_buffer_size=buffer_size,
+            group_throttle=throttle
+        )
+    else:
+        retry_queue = create_retry_queue(payload_iterator, dedupe)
+
+        results = retrying_imap(
+            retry_queue,
+            worker,
+            threads,
+            instrumentation=instrumentation,
+            group=grouper,
+            group_parallelism=domain_parallelism,
+            group_buffer_size=buffer_size,
+            group_throttle=throttle
+        )
+
+    if dedupe is not None:
+        results = dedupe.fan_out(results, url=get_payload_url, copy=copy_fetch_result)
+
+    return results
 
 
 def multithreaded_resolve(iterator, key=None, resolve_args=None, threads=25,
                           throttle=DEFAULT_THROTTLE, max_redirects=5,
                           follow_refresh_header=True, follow_meta_refresh=False,
                           follow_js_relocation=False, buffer_size=DEFAULT_GROUP_BUFFER_SIZE,
-                          insecure=False, timeout=None):
+                          insecure=False, timeout=None, domain_parallelism=DEFAULT_GROUP_PARALLELISM,
+                          retry=None, dns=None, dedupe=None):
     """
     Function returning a multithreaded iterator over resolved urls.
 
@@ -198,6 +492,8 @@ def multithreaded_resolve(iterator, key=None, resolve_args=None, threads=25,
             headers. Defaults to True.
         follow_meta_refresh (bool, optional): Whether to follow meta refresh.
             Defaults to False.
+        domain_parallelism (int, optional): Max number of urls per domain to
+            hit at the same time. Defaults to 1.
         buffer_size (int, optional): Max number of items per domain to enqueue
             into memory in hope of finding a new domain that can be processed
             immediately. Defaults to 1.
@@ -205,6 +501,17 @@ def multithreaded_resolve(iterator, key=None, resolve_args=None, threads=25,
             when performing requests. Defaults to False.
         timeout (float or urllib3.Timeout, optional): Custom timeout for every
             request.
+        retry (minet.retry.RetryPolicy, optional): Policy used to retry
+            urls failing with transient errors, such as timeouts or 429 &
+            5xx statuses, after an exponential backoff. Only the last
+            attempt of a url is yielded.
+        dns (minet.dns.DNSCache, optional): DNS cache used to resolve
+            hostnames. The hostnames of the next urls to resolve will be
+            prefetched using it.
+        dedupe (minet.dedupe.Deduplicator, optional): Deduplicator used to
+            resolve urls occurring many times only once. Duplicates are
+            given a copy of the result of their first occurrence. Note that
+            this assumes `resolve_args` only depends on the url.
 
     Yields:
         ResolveWorkerResult
@@ -212,7 +519,15 @@ def multithreaded_resolve(iterator, key=None, resolve_args=None, threads=25,
     """
 
     # Creating the http pool manager
-    http = create_pool(threads=threads, insecure=insecure, timeout=timeout)
+    http = create_pool(
+        threads=threads,
+        insecure=insecure,
+        timeout=timeout,
+        domain_parallelism=domain_parallelism,
+        dns=dns
+    )
+
+    retry_queue = None
 
     # Thread worker
     def worker(payload):
@@ -238,6 +553,14 @@ def multithreaded_resolve(iterator, key=None, resolve_args=None, threads=25,
             **kwargs
         )
 
+        if retry_queue is not None:
+            status = stack[-1].status if stack else None
+            delay = retry.decide(retry_queue.retries(payload), error=error, status=status)
+
+            if delay is not None:
+                retry_queue.retry(payload, delay)
+                return None
+
         return ResolveWorkerResult(
             url=url,
             item=item,
@@ -275,12 +598,40 @@ def multithreaded_resolve(iterator, key=None, resolve_args=None, threads=25,
                 url=url
             )
 
-    return imap_unordered(
-        payloads(),
-        worker,
-        threads,
-        group=grouper,
-        group_parallelism=DEFAULT_GROUP_PARALLELISM,
-        group_buffer_size=buffer_size,
-        group_throttle=throttle
-    )
+    payload_iterator = payloads()
+
+    # NOTE: duplicates must not reach the threads, nor be retried
+    if dedupe is not None:
+        payload_iterator = dedupe.filter(payload_iterator, url=get_payload_url)
+
+    # NOTE: resolving hostnames while their urls wait to be resolved
+    if dns is not None:
+        payload_iterator = dns.lookahead(payload_iterator, key=get_payload_url)
+
+    if retry is None:
+        results = imap_unordered(
+            payload_iterator,
+            worker,
+            threads,
+            group=grouper,
+            group_parallelism=domain_parallelism,
+            group_buffer_size=buffer_size,
+            group_throttle=throttle
+        )
+    else:
+        retry_queue = create_retry_queue(payload_iterator, dedupe)
+
+        results = retrying_imap(
+            retry_queue,
+            worker,
+            threads,
+            group=grouper,
+            group_parallelism=domain_parallelism,
+            group_buffer_size=buffer_size,
+            group_throttle=throttle
+        )
+
+    if dedupe is not None:
+        results = dedupe.fan_out(results, url=get_payload_url, copy=copy_resolve_result)
+
+    return results
@@ -0,0 +1,541 @@
+# =============================================================================
+# Minet Crawl Frontier
+# =============================================================================
+#
+# Crawl frontiers keeping track of the jobs a crawler has to perform. They
+# behave like queues that can be consumed by quenouille's `QueueIterator` but
+# also remember every url they ever saw (normalized & fingerprinted) so that
+# a same page is never crawled twice, and track whether their jobs are
+# pending, in-flight or done.
+#
+# The SQLite frontier is persisted on disk so that an interrupted crawl can
+# be resumed exactly where it stopped: jobs that were in-flight when the
+# crawl was interrupted are considered pending again when reopening it.
+#
+# Pending jobs are kept in a separate queue per domain, ordered by priority,
+# then level, then insertion order. Jobs are handed out from the domain, among
+# the ones that are ready given the crawler's throttle & parallelism, having
+# the best pending priority, or else from the domain that will be ready the
+# soonest, once it is ready, so that a single domain yielding lots of links
+# cannot hog the crawler. The frontier therefore owns the crawler's throttle.
+#
+import time
+import heapq
+import pickle
+import sqlite3
+import hashlib
+from itertools import count
+from threading import Condition
+
+from minet.url_cache import normalize_url, get_domain_name
+
+PENDING = 0
+IN_FLIGHT = 1
+DONE = 2
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS "jobs" (
+        "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+        "fingerprint" BLOB NOT NULL UNIQUE,
+        "state" INTEGER NOT NULL,
+        "domain" TEXT NOT NULL,
+        "priority" INTEGER NOT NULL,
+        "level" INTEGER NOT NULL,
+        "job" BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS "jobs_schedule" ON "jobs" ("state", "domain", "priority" DESC, "level", "id");
+'''
+
+
+def job_fingerprint(job):
+    """
+    Function returning a binary fingerprint of the given job, based on its
+    spider and its normalized url so that trivial variations of a same url
+    are only crawled once.
+    """
+    try:
+        url = normalize_url(
+            job.url,
+            strip_fragment=True,
+            infer_redirection=False
+        )
+    except Exception:
+        url = job.url
+
+    h = hashlib.sha1()
+    h.update(job.spider.encode())
+    h.update(b'\0')
+    h.update(url.encode())
+
+    return h.digest()
+
+
+def job_domain(job):
+    return get_domain_name(job.url) or ''
+
+
+def job_priority(job):
+    return getattr(job, 'priority', 0) or 0
+
+
+class DomainScheduler(object):
+    """
+    Class keeping track of the pending & in-flight jobs of each domain and
+    electing the domain from which the next job should be taken, i.e. the
+    ready domain having the best pending priority, or else the one that will
+    be ready the soonest, while not being already saturated.
+
+    Domains wait in a heap ordered by the time they will be ready, and are
+    moved to a heap ordered by their best pending priority once ready. Since
+    both heaps are lazy, entries not matching the current state of their
+    domain are just dropped.
+
+    Args:
+        throttle (float or callable, optional): Time to wait between 2 calls
+            to the same domain. Or a function taking domain name and job and
+            returning the time to wait. Defaults to 0.
+        parallelism (int, optional): Max number of calls to the same domain
+            at once. Defaults to infinity.
+
+    """
+
+    def __init__(self, throttle=0, parallelism=float('inf')):
+        self.throttle = throttle
+        self.parallelism = parallelism
+        self.pending = {}
+        self.in_flight = {}
+        self.ready_at = {}
+        self.priority = {}
+        self.waiting = []
+        self.ready = []
+        self.counter = count()
+
+    def push(self, domain):
+        heapq.heappush(
+            self.waiting,
+            (self.ready_at.get(domain, 0), next(self.counter), domain)
+        )
+
+    def is_stale(self, domain, ready_at, priority=None):
+        if not self.pending.get(domain) or ready_at != self.ready_at.get(domain, 0):
+            return True
+
+        return priority is not None and priority != self.priority.get(domain, 0)
+
+    def add(self, domain, n=1, priority=0):
+        pending = self.pending.get(domain, 0)
+        self.pending[domain] = pending + n
+
+        if pending == 0:
+            self.priority[domain] = priority
+            self.push(domain)
+
+        elif priority > self.priority.get(domain, 0):
+            self.priority[domain] = priority
+            self.push(domain)
+
+    def elect(self):
+        now = time.time()
+
+        while self.waiting and self.waiting[0][0] <= now:
+            ready_at, c, domain = heapq.heappop(self.waiting)
+
+            if self.is_stale(domain, ready_at):
+                continue
+
+            heapq.heappush(
+                self.ready,
+                (-self.priority.get(domain, 0), ready_at, c, domain)
+            )
+
+        saturated = []
+        domain = None
+
+        for heap in (self.ready, self.waiting):
+            while heap:
+                item = heapq.heappop(heap)
+                candidate = item[-1]
+
+                if heap is self.ready:
+                    if self.is_stale(candidate, item[1], -item[0]):
+                        continue
+                elif self.is_stale(candidate, item[0]):
+                    continue
+
+                if self.in_flight.get(candidate, 0) >= self.parallelism:
+                    saturated.append((heap, item))
+                    continue
+
+                domain = candidate
+                break
+
+            if domain is not None:
+                break
+
+        # Every domain is saturated, we pick the first ready one, or else the
+        # one that will be ready the soonest
+        if domain is None and saturated:
+            domain = saturated.pop(0)[1][-1]
+
+        for heap, item in saturated:
+            heapq.heappush(heap, item)
+
+        return domain
+
+    def elect_ready(self, condition):
+        """
+        Method electing a domain, waiting on the given condition, whose lock
+        must be held, until the elected domain is ready. The condition should
+        be notified whenever jobs are added, requeued or done so that a domain
+        can be elected again in the meantime.
+        """
+        while True:
+            domain = self.elect()
+
+            if domain is None:
+                return None
+
+            delay = self.ready_at.get(domain, 0) - time.time()
+
+            if delay <= 0:
+                return domain
+
+            # NOTE: the domain was elected but won't be dispatched for now
+            self.push(domain)
+            condition.wait(delay)
+
+    def dispatch(self, domain, job=None, priority=0):
+        pending = self.pending[domain] - 1
+
+        if pending == 0:
+            del self.pending[domain]
+            self.priority.pop(domain, None)
+        else:
+            self.pending[domain] = pending
+            self.priority[domain] = priority
+
+        self.in_flight[domain] = self.in_flight.get(domain, 0) + 1
+        throttle = self.throttle
+
+        if callable(throttle):
+            throttle = throttle(domain, job) or 0
+
+        self.ready_at[domain] = max(time.time(), self.ready_at.get(domain, 0)) + throttle
+
+        if pending:
+            self.push(domain)
+
+    def requeue(self, domain, delay=0, priority=0):
+        self.done(domain)
+
+        self.pending[domain] = self.pending.get(domain, 0) + 1
+        self.priority[domain] = max(priority, self.priority.get(domain, priority))
+        self.ready_at[domain] = max(time.time() + delay, self.ready_at.get(domain, 0))
+
+        # NOTE: former heap entries of the domain are now stale
+        self.push(domain)
+
+    def done(self, domain):
+        in_flight = self.in_flight.get(domain, 0) - 1
+
+        if in_flight <= 0:
+            self.in_flight.pop(domain, None)
+        else:
+            self.in_flight[domain] = in_flight
+
+
+class FrontierStats(object):
+    __slots__ = ('pending', 'in_flight', 'done')
+
+    def __init__(self, pending=0, in_flight=0, done=0):
+        self.pending = pending
+        self.in_flight = in_flight
+        self.done = done
+
+    def to_dict(self):
+        return {
+            'pending': self.pending,
+            'in_flight': self.in_flight,
+            'done': self.done
+        }
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s pending=%(pending)s in_flight=%(in_flight)s done=%(done)s>'
+        ) % {
+            'class_name': class_name,
+            'pending': self.pending,
+            'in_flight': self.in_flight,
+            'done': self.done
+        }
+
+
+class MemoryFrontier(object):
+    """
+    In-memory crawl frontier. Only the binary fingerprints of seen jobs are
+    kept once they are done.
+
+    Args:
+        throttle (float or callable, optional): Time to wait between 2 calls
+            to the same domain. Or a function taking domain name and job and
+            returning the time to wait. Defaults to 0.
+        parallelism (int, optional): Max number of calls to the same domain
+            at once. Defaults to infinity.
+
+    """
+
+    def __init__(self, throttle=0, parallelism=float('inf')):
+        self.lock = Condition()
+        self.seen = set()
+        self.queues = {}
+        self.counter = count()
+        self.scheduler = DomainScheduler(throttle, parallelism)
+        self.stats = FrontierStats()
+
+    def qsize(self):
+        return self.stats.pending
+
+    def put(self, job):
+        return self.put_many([job]) == 1
+
+    def put_many(self, jobs):
+        added = 0
+
+        with self.lock:
+            for job in jobs:
+                fingerprint = job_fingerprint(job)
+
+                if fingerprint in self.seen:
+                    continue
+
+                self.seen.add(fingerprint)
+
+                domain = job_domain(job)
+                queue = self.queues.setdefault(domain, [])
+
+                heapq.heappush(queue, (
+                    -job_priority(job),
+                    job.level,
+                    next(self.counter),
+                    job
+                ))
+
+                self.scheduler.add(domain, priority=job_priority(job))
+                added += 1
+
+            self.stats.pending += added
+            self.lock.notify_all()
+
+        return added
+
+    def get(self, timeout=None):
+        with self.lock:
+            domain = self.scheduler.elect_ready(self.lock)
+            queue = self.queues[domain]
+            job = heapq.heappop(queue)[-1]
+
+            if not queue:
+                del self.queues[domain]
+                priority = 0
+            else:
+                priority = -queue[0][0]
+
+            self.scheduler.dispatch(domain, job, priority)
+
+            self.stats.pending -= 1
+            self.stats.in_flight += 1
+
+        return job
+
+    def requeue(self, job, delay=0):
+        """
+        Method putting back a job that was taken but could not be processed
+        yet, e.g. because its domain asked to be left alone for the given
+        delay, during which other domains are preferred.
+        """
+        with self.lock:
+            domain = job_domain(job)
+
+            # NOTE: requeued jobs come before the other jobs of same priority
+            heapq.heappush(self.queues.setdefault(domain, []), (
+                -job_priority(job),
+                job.level,
+                -next(self.counter),
+                job
+            ))
+
+            self.scheduler.requeue(domain, delay, job_priority(job))
+
+            self.stats.in_flight -= 1
+            self.stats.pending += 1
+            self.lock.notify_all()
+
+    def done(self, job):
+        with self.lock:
+            self.scheduler.done(job_domain(job))
+
+            self.stats.in_flight -= 1
+            self.stats.done += 1
+            self.lock.notify_all()
+
+    def close(self):
+        pass
+
+
+class SQLiteFrontier(object):
+    """
+    Persistent crawl frontier relying on a SQLite database.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        throttle (float or callable, optional): Time to wait between 2 calls
+            to the same domain. Or a function taking domain name and job and
+            returning the time to wait. Defaults to 0.
+        parallelism (int, optional): Max number of calls to the same domain
+            at once. Defaults to infinity.
+
+    """
+
+    def __init__(self, path, throttle=0, parallelism=float('inf')):
+        self.path = path
+        self.lock = Condition()
+        self.scheduler = DomainScheduler(throttle, parallelism)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL;')
+            self.connection.execute('PRAGMA synchronous=NORMAL;')
+            self.connection.executescript(SCHEMA)
+
+            # Jobs that were in-flight when the crawl stopped must be redone
+            self.connection.execute(
+                'UPDATE "jobs" SET "state" = ? WHERE "state" = ?;',
+                (PENDING, IN_FLIGHT)
+            )
+            self.connection.commit()
+
+            self.stats = FrontierStats(
+                pending=self.count(PENDING),
+                done=self.count(DONE)
+            )
+
+            cursor = self.connection.execute(
+                'SELECT "domain", COUNT(*), MAX("priority") FROM "jobs" WHERE "state" = ? GROUP BY "domain";',
+                (PENDING,)
+            )
+
+            for domain, n, priority in cursor:
+                self.scheduler.add(domain, n, priority)
+
+    def count(self, state):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM "jobs" WHERE "state" = ?;',
+            (state,)
+        ).fetchone()[0]
+
+    def qsize(self):
+        return self.stats.pending
+
+    def put(self, job):
+        return self.put_many([job]) == 1
+
+    def put_many(self, jobs):
+        added = 0
+
+        with self.lock:
+            for job in jobs:
+                domain = job_domain(job)
+
+                cursor = self.connection.execute(
+                    'INSERT OR IGNORE INTO "jobs" ("fingerprint", "state", "domain", "priority", "level", "job") VALUES (?, ?, ?, ?, ?, ?);',
+                    (
+                        job_fingerprint(job),
+                        PENDING,
+                        domain,
+                        job_priority(job),
+                        job.level,
+                        pickle.dumps(job)
+                    )
+                )
+
+                if cursor.rowcount == 1:
+                    self.scheduler.add(domain, priority=job_priority(job))
+                    added += 1
+
+            self.connection.commit()
+            self.stats.pending += added
+            self.lock.notify_all()
+
+        return added
+
+    def get(self, timeout=None):
+        with self.lock:
+            domain = self.scheduler.elect_ready(self.lock)
+
+            row = self.connection.execute(
+                'SELECT "id", "job" FROM "jobs" WHERE "state" = ? AND "domain" = ? ORDER BY "priority" DESC, "level", "id" LIMIT 1;',
+                (PENDING, domain)
+            ).fetchone()
+
+            self.connection.execute(
+                'UPDATE "jobs" SET "state" = ? WHERE "id" = ?;',
+                (IN_FLIGHT, row[0])
+            )
+            self.connection.commit()
+
+            job = pickle.loads(row[1])
+
+            priority = self.connection.execute(
+                'SELECT MAX("priority") FROM "jobs" WHERE "state" = ? AND "domain" = ?;',
+                (PENDING, domain)
+            ).fetchone()[0]
+
+            self.scheduler.dispatch(domain, job, priority or 0)
+
+            self.stats.pending -= 1
+            self.stats.in_flight += 1
+
+        return job
+
+    def requeue(self, job, delay=0):
+        """
+        Method putting back a job that was taken but could not be processed
+        yet, e.g. because its domain asked to be left alone for the given
+        delay, during which other domains are preferred.
+        """
+        with self.lock:
+            domain = job_domain(job)
+
+            self.connection.execute(
+                'UPDATE "jobs" SET "state" = ? WHERE "fingerprint" = ?;',
+                (PENDING, job_fingerprint(job))
+            )
+            self.connection.commit()
+
+            self.scheduler.requeue(domain, delay, job_priority(job))
+
+            self.stats.in_flight -= 1
+            self.stats.pending += 1
+            self.lock.notify_all()
+
+    def done(self, job):
+        fingerprint = job_fingerprint(job)
+
+        with self.lock:
+            self.scheduler.done(job_domain(job))
+
+            self.connection.execute(
+                'UPDATE "jobs" SET "state" = ? WHERE "fingerprint" = ?;',
+                (DONE, fingerprint)
+            )
+            self.connection.commit()
+
+            self.stats.in_flight -= 1
+            self.stats.done += 1
+            self.lock.notify_all()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
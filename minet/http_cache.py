@@ -0,0 +1,628 @@
+# =============================================================================
+# Minet HTTP Cache
+# =============================================================================
+#
+# A persistent on-disk HTTP response cache that can be plugged into the
+# urllib3 pool managers created by `minet.utils.create_pool`.
+#
+# Response bodies are stored gzipped & content-addressed (i.e. named after
+# their own sha1 digest) so that identical bodies are only stored once, while
+# a SQLite index keeps track of the cached responses. The cache is bounded
+# in size by evicting least recently used entries and stale entries are
+# revalidated using ETag & Last-Modified conditional requests when possible.
+#
+# Bodies of new responses are written to the cache as they are read by the
+# caller, when the response supports it, so that caching does not prevent
+# them from being streamed or aborted when too large. A response is only
+# cached once its body was read entirely.
+#
+# Note that this is a cache meant to avoid re-downloading the same things
+# over and over when re-running jobs, not a browser cache. Hence it ignores
+# Cache-Control directives.
+#
+import os
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+from io import BytesIO
+from os.path import join, isfile
+from threading import Lock
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+CACHE_INDEX_NAME = 'index.sqlite'
+CACHE_OBJECTS_DIR = 'objects'
+
+# Request headers having an impact on the response and therefore used to
+# compute the cache keys
+CACHE_KEY_HEADERS = [
+    'accept',
+    'accept-language',
+    'authorization',
+    'cookie',
+    'x-api-token'
+]
+
+# Responses whose body is larger than this are not cached
+DEFAULT_MAX_ENTRY_SIZE = 32 * 1024 * 1024
+
+UNCACHEABLE_STATUSES = set([429])
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS "responses" (
+        "key" TEXT PRIMARY KEY,
+        "url" TEXT NOT NULL,
+        "status" INTEGER NOT NULL,
+        "reason" TEXT,
+        "headers" TEXT NOT NULL,
+        "digest" TEXT NOT NULL,
+        "size" INTEGER NOT NULL,
+        "stored_at" REAL NOT NULL,
+        "accessed_at" REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS "responses_accessed_at" ON "responses" ("accessed_at");
+    CREATE INDEX IF NOT EXISTS "responses_digest" ON "responses" ("digest");
+'''
+
+
+class HTTPCacheEntry(object):
+    __slots__ = ('key', 'url', 'status', 'reason', 'headers', 'digest', 'size', 'stored_at')
+
+    def __init__(self, key, url, status, reason, headers, digest, size, stored_at):
+        self.key = key
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.digest = digest
+        self.size = size
+        self.stored_at = stored_at
+
+    def validators(self):
+        validators = {}
+
+        etag = self.headers.get('etag')
+
+        if etag is not None:
+            validators['If-None-Match'] = etag
+
+        last_modified = self.headers.get('last-modified')
+
+        if last_modified is not None:
+            validators['If-Modified-Since'] = last_modified
+
+        return validators
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s status=%(status)s url=%(url)s>'
+        ) % {
+            'class_name': class_name,
+            'status': self.status,
+            'url': self.url
+        }
+
+
+class HTTPCacheWriter(object):
+    """
+    Object given to a response as its `cache_writer` so that the chunks of
+    its (decoded) body are written into the cache as they are read. The
+    response must call `finish` once its body was read entirely, or `abort`
+    if it was not, e.g. because it was closed early.
+    """
+
+    def __init__(self, cache, key, url, status, reason, headers):
+        self.cache = cache
+        self.key = key
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+
+        self.hash = hashlib.sha1()
+        self.size = 0
+        self.file = None
+        self.tmp_path = None
+        self.done = False
+
+    def write(self, data):
+        if self.done or not data:
+            return
+
+        max_entry_size = self.cache.max_entry_size
+
+        if max_entry_size is not None and self.size + len(data) > max_entry_size:
+            self.abort()
+            return
+
+        # NOTE: failing to cache a body must not fail its reading
+        try:
+            if self.file is None:
+                self.open_file()
+
+            self.file.write(data)
+        except OSError:
+            self.abort()
+            return
+
+        self.hash.update(data)
+        self.size += len(data)
+
+    def open_file(self):
+        fd, self.tmp_path = tempfile.mkstemp(
+            dir=join(self.cache.path, CACHE_OBJECTS_DIR),
+            suffix='.tmp'
+        )
+
+        self.file = gzip.GzipFile(fileobj=os.fdopen(fd, 'wb'), mode='wb')
+
+    def close_file(self):
+        if self.file is None:
+            return
+
+        f, self.file = self.file, None
+        fileobj = f.fileobj
+
+        try:
+            f.close()
+        finally:
+            fileobj.close()
+
+    def finish(self):
+        if self.done:
+            return
+
+        try:
+
+            # NOTE: the file is only opened by the first non-empty chunk
+            if self.file is None:
+                self.open_file()
+
+            self.close_file()
+        except OSError:
+            self.abort()
+            return
+
+        self.done = True
+        self.headers['Content-Length'] = str(self.size)
+
+        self.cache.store(
+            self.key,
+            self.url,
+            self.status,
+            self.reason,
+            self.headers,
+            self.hash.hexdigest(),
+            self.tmp_path
+        )
+
+    def abort(self):
+        if self.done:
+            return
+
+        self.done = True
+        self.close_file()
+
+        if self.tmp_path is not None:
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+
+
+class HTTPCacheStats(object):
+    __slots__ = ('hits', 'misses', 'revalidated', 'evicted', 'lock')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+        self.lock = Lock()
+
+    def increment(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+
+        if total == 0:
+            return 0.0
+
+        return self.hits / total
+
+    def to_dict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'evicted': self.evicted,
+            'hit_rate': self.hit_rate
+        }
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s hits=%(hits)s misses=%(misses)s revalidated=%(revalidated)s>'
+        ) % {
+            'class_name': class_name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated
+        }
+
+
+class HTTPCache(object):
+    """
+    Persistent on-disk HTTP response cache.
+
+    Args:
+        path (str): Path of the cache directory.
+        ttl (float, optional): Number of seconds after which a cached response
+            is considered stale and must be revalidated or fetched again.
+            Defaults to None, meaning cached responses never go stale.
+        max_size (int, optional): Max number of bytes the stored bodies may
+            occupy on disk. Defaults to None, meaning no limit.
+        methods (iterable, optional): HTTP methods whose responses can be
+            cached. Defaults to GET only.
+        max_entry_size (int, optional): Responses whose body is larger than
+            this will not be cached. Defaults to 32MB.
+
+    """
+
+    def __init__(self, path, ttl=None, max_size=None, methods=('GET',),
+                 max_entry_size=DEFAULT_MAX_ENTRY_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.methods = set(m.upper() for m in methods)
+        self.max_entry_size = max_entry_size
+        self.stats = HTTPCacheStats()
+
+        os.makedirs(join(path, CACHE_OBJECTS_DIR), exist_ok=True)
+
+        self.lock = Lock()
+        self.connection = sqlite3.connect(
+            join(path, CACHE_INDEX_NAME),
+            check_same_thread=False
+        )
+
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL;')
+            self.connection.execute('PRAGMA synchronous=NORMAL;')
+            self.connection.executescript(SCHEMA)
+            self.connection.commit()
+
+            self.total_size = self.compute_total_size()
+            self.evict()
+            self.connection.commit()
+
+    def compute_total_size(self):
+        cursor = self.connection.execute(
+            'SELECT SUM("size") FROM (SELECT DISTINCT "digest", "size" FROM "responses");'
+        )
+
+        return cursor.fetchone()[0] or 0
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM "responses";').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    @staticmethod
+    def key(method, url, headers=None, body=None):
+        h = hashlib.sha1()
+        h.update(method.upper().encode())
+        h.update(b'\0')
+        h.update(url.encode())
+
+        if headers:
+            normalized = {k.lower(): v for k, v in headers.items()}
+
+            for name in CACHE_KEY_HEADERS:
+                value = normalized.get(name)
+
+                if value is not None:
+                    h.update(b'\0')
+                    h.update(name.encode())
+                    h.update(b':')
+                    h.update(str(value).encode())
+
+        if body:
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+
+            h.update(b'\0')
+            h.update(body)
+
+        return h.hexdigest()
+
+    def object_path(self, digest):
+        return join(self.path, CACHE_OBJECTS_DIR, digest[:2], digest + '.gz')
+
+    def is_fresh(self, entry):
+        if self.ttl is None:
+            return True
+
+        return time.time() - entry.stored_at <= self.ttl
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT "key", "url", "status", "reason", "headers", "digest", "size", "stored_at" FROM "responses" WHERE "key" = ?;',
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            self.connection.execute(
+                'UPDATE "responses" SET "accessed_at" = ? WHERE "key" = ?;',
+                (time.time(), key)
+            )
+            self.connection.commit()
+
+        headers = HTTPHeaderDict()
+
+        for k, v in json.loads(row[4]):
+            headers.add(k, v)
+
+        return HTTPCacheEntry(
+            key=row[0],
+            url=row[1],
+            status=row[2],
+            reason=row[3],
+            headers=headers,
+            digest=row[5],
+            size=row[6],
+            stored_at=row[7]
+        )
+
+    def read(self, entry):
+        path = self.object_path(entry.digest)
+
+        try:
+            with open(path, 'rb') as f:
+                return gzip.decompress(f.read())
+        except (OSError, EOFError):
+            return None
+
+    def set(self, key, url, status, reason, headers, data):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=join(self.path, CACHE_OBJECTS_DIR),
+            suffix='.tmp'
+        )
+
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(data))
+
+        self.store(key, url, status, reason, headers, hashlib.sha1(data).hexdigest(), tmp_path)
+
+    def store(self, key, url, status, reason, headers, digest, tmp_path):
+        path = self.object_path(digest)
+
+        # NOTE: content-addressed bodies are only written once
+        if not isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+
+        size = os.path.getsize(path)
+        serialized_headers = json.dumps(list(headers.items()))
+        now = time.time()
+
+        with self.lock:
+            previous_digest = self.connection.execute(
+                'SELECT "digest" FROM "responses" WHERE "key" = ?;',
+                (key,)
+            ).fetchone()
+
+            if not self.is_referenced(digest):
+                self.total_size += size
+
+            self.connection.execute(
+                'INSERT OR REPLACE INTO "responses" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);',
+                (key, url, status, reason, serialized_headers, digest, size, now, now)
+            )
+
+            if previous_digest is not None and previous_digest[0] != digest:
+                self.release_object(previous_digest[0])
+
+            self.evict()
+            self.connection.commit()
+
+    def touch(self, entry):
+        entry.stored_at = time.time()
+
+        with self.lock:
+            self.connection.execute(
+                'UPDATE "responses" SET "stored_at" = ? WHERE "key" = ?;',
+                (entry.stored_at, entry.key)
+            )
+            self.connection.commit()
+
+    def is_referenced(self, digest):
+        return self.connection.execute(
+            'SELECT 1 FROM "responses" WHERE "digest" = ? LIMIT 1;',
+            (digest,)
+        ).fetchone() is not None
+
+    def release_object(self, digest):
+        if self.is_referenced(digest):
+            return
+
+        path = self.object_path(digest)
+
+        try:
+            self.total_size -= os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        if self.max_size is None:
+            return
+
+        while self.total_size > self.max_size:
+            row = self.connection.execute(
+                'SELECT "key", "digest" FROM "responses" ORDER BY "accessed_at" LIMIT 1;'
+            ).fetchone()
+
+            if row is None:
+                self.total_size = 0
+                break
+
+            self.connection.execute('DELETE FROM "responses" WHERE "key" = ?;', (row[0],))
+            self.release_object(row[1])
+            self.stats.increment('evicted')
+
+    def build_response(self, entry, data, method, preload_content=True):
+        return HTTPResponse(
+            body=BytesIO(data),
+            headers=HTTPHeaderDict(entry.headers),
+            status=entry.status,
+            reason=entry.reason,
+            preload_content=preload_content,
+            decode_content=False,
+            request_method=method,
+            request_url=entry.url
+        )
+
+    def urlopen(self, urlopen, method, url, **kwargs):
+        """
+        Method wrapping the given urllib3 `urlopen` function, serving
+        responses from the cache when possible and storing the new ones.
+        """
+        if method.upper() not in self.methods:
+            return urlopen(method, url, **kwargs)
+
+        headers = kwargs.get('headers')
+        preload_content = kwargs.get('preload_content', True)
+
+        key = self.key(method, url, headers=headers, body=kwargs.get('body'))
+        entry = self.get(key)
+        data = None
+
+        if entry is not None:
+            data = self.read(entry)
+
+            # Object was removed from disk somehow
+            if data is None:
+                entry = None
+
+            elif self.is_fresh(entry):
+                self.stats.increment('hits')
+                return self.build_response(entry, data, method, preload_content)
+
+        validators = entry.validators() if entry is not None else None
+
+        if validators:
+            conditional_headers = dict(headers or {})
+            conditional_headers.update(validators)
+            kwargs['headers'] = conditional_headers
+
+        kwargs['preload_content'] = False
+        kwargs['release_conn'] = False
+
+        response = urlopen(method, url, **kwargs)
+
+        # Still valid: serving from the cache
+        if validators and response.status == 304:
+            response.read()
+            response.release_conn()
+
+            self.touch(entry)
+            self.stats.increment('revalidated')
+            self.stats.increment('hits')
+
+            return self.build_response(entry, data, method, preload_content)
+
+        self.stats.increment('misses')
+
+        if not self.is_cacheable(response):
+            if preload_content:
+                response._body = response.read()
+                response.release_conn()
+
+            return response
+
+        stored_headers = HTTPHeaderDict()
+
+        for k, v in response.headers.items():
+
+            # NOTE: bodies are stored decoded
+            if k.lower() in ('content-encoding', 'transfer-encoding', 'content-length'):
+                continue
+
+            stored_headers.add(k, v)
+
+        writer = HTTPCacheWriter(
+            self,
+            key,
+            url,
+            response.status,
+            response.reason,
+            stored_headers
+        )
+
+        # NOTE: the body is written into the cache as the caller reads it,
+        # except for redirections which are seldom read but must be cached
+        if hasattr(response, 'cache_writer') and not response.get_redirect_location():
+            response.cache_writer = writer
+
+            if preload_content:
+                try:
+                    response._body = response.read()
+                finally:
+                    response.release_conn()
+
+            return response
+
+        # Other responses are read entirely beforehand
+        try:
+            data = response.read()
+        finally:
+            response.release_conn()
+
+        writer.write(data)
+        writer.finish()
+
+        entry = HTTPCacheEntry(
+            key=key,
+            url=url,
+            status=response.status,
+            reason=response.reason,
+            headers=stored_headers,
+            digest=None,
+            size=len(data),
+            stored_at=time.time()
+        )
+
+        return self.build_response(entry, data, method, preload_content)
+
+    def is_cacheable(self, response):
+        if response.status >= 500 or response.status in UNCACHEABLE_STATUSES:
+            return False
+
+        content_length = response.headers.get('content-length')
+
+        if content_length is not None and self.max_entry_size is not None:
+            try:
+                if int(content_length) > self.max_entry_size:
+                    return False
+            except ValueError:
+                pass
+
+        return True
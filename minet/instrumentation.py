@@ -0,0 +1,449 @@
+# =============================================================================
+# Minet Instrumentation
+# =============================================================================
+#
+# Opt-in instrumentation recording how long every job spends in each stage
+# of its processing (waiting to be picked by a thread or for its domain's
+# throttle, resolving hostnames, connecting, TLS handshake, time to first
+# byte, body download, encoding sniffing, writing to disk...) and
+# aggregating those timings into global & per-domain histograms.
+#
+# Timings are recorded for the job currently processed by the calling
+# thread, so that deep layers, such as the http connections, can report them
+# without knowing anything about the job itself. A job's timings are only
+# aggregated once it is done, so that each histogram sample is the total
+# time a single job spent in the stage, e.g. across redirections.
+#
+import os
+import math
+import json
+import time
+from threading import Lock, local
+from collections import Counter
+
+# NOTE: order in which stages are reported, other stages come afterwards
+STAGES = [
+    'queue',
+    'dns',
+    'connect',
+    'tls',
+    'ttfb',
+    'body',
+    'meta',
+    'process',
+    'enqueue',
+    'write'
+]
+
+HISTOGRAM_MIN = 1e-5
+HISTOGRAM_GROWTH = 1.2
+HISTOGRAM_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+DEFAULT_MAX_DOMAINS = 10000
+OTHER_DOMAINS = '<other>'
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '-'
+
+    if seconds < 1:
+        return '%.0fms' % (seconds * 1000)
+
+    return '%.1fs' % seconds
+
+
+class Histogram(object):
+    """
+    Histogram of durations, in seconds, using logarithmic buckets so that
+    percentiles can be estimated with a bounded relative error while using
+    constant memory.
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+
+        if self.min is None or value < self.min:
+            self.min = value
+
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if value <= HISTOGRAM_MIN:
+            bucket = 0
+        else:
+            bucket = int(math.log(value / HISTOGRAM_MIN) / HISTOGRAM_LOG_GROWTH) + 1
+
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return None
+
+        return self.total / self.count
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+
+        rank = max(1, math.ceil(self.count * p))
+        seen = 0
+
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+
+            if seen >= rank:
+                upper_bound = HISTOGRAM_MIN * HISTOGRAM_GROWTH ** bucket
+
+                return min(max(upper_bound, self.min), self.max)
+
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.mean,
+            'min': self.min,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max
+        }
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s count=%(count)s p50=%(p50)s max=%(max)s>'
+        ) % {
+            'class_name': class_name,
+            'count': self.count,
+            'p50': format_duration(self.percentile(0.5)),
+            'max': format_duration(self.max)
+        }
+
+
+class Metrics(object):
+    """
+    Per-stage histograms & counters of a set of jobs.
+    """
+    __slots__ = ('jobs', 'stages', 'counters')
+
+    def __init__(self):
+        self.jobs = Histogram()
+        self.stages = {}
+        self.counters = Counter()
+
+    def record(self, stage, seconds):
+        histogram = self.stages.get(stage)
+
+        if histogram is None:
+            histogram = Histogram()
+            self.stages[stage] = histogram
+
+        histogram.add(seconds)
+
+    def add_job(self, job, duration):
+        self.jobs.add(duration)
+
+        for stage, seconds in job.timings.items():
+            self.record(stage, seconds)
+
+        self.counters.update(job.counters)
+
+    def sorted_stages(self):
+        stages = [stage for stage in STAGES if stage in self.stages]
+        stages.extend(sorted(stage for stage in self.stages if stage not in STAGES))
+
+        return stages
+
+    def shares(self):
+        """
+        Method returning the share of the time spent in every stage.
+        """
+        total = sum(histogram.total for histogram in self.stages.values())
+
+        return {
+            stage: (histogram.total / total if total else 0.0)
+            for stage, histogram in self.stages.items()
+        }
+
+    def to_dict(self):
+        shares = self.shares()
+        stages = {}
+
+        for stage in self.sorted_stages():
+            stages[stage] = self.stages[stage].to_dict()
+            stages[stage]['share'] = shares[stage]
+
+        return {
+            'jobs': self.jobs.to_dict(),
+            'stages': stages,
+            'counters': dict(self.counters)
+        }
+
+
+class InstrumentedJob(object):
+    __slots__ = ('domain', 'started_at', 'timings', 'counters')
+
+    def __init__(self, domain, started_at):
+        self.domain = domain
+        self.started_at = started_at
+        self.timings = {}
+        self.counters = {}
+
+
+class StageTimer(object):
+    __slots__ = ('instrumentation', 'stage', 'start')
+
+    def __init__(self, instrumentation, stage):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = self.instrumentation.clock()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.instrumentation.record(self.stage, self.instrumentation.clock() - self.start)
+
+
+class NullStageTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        pass
+
+
+NULL_STAGE_TIMER = NullStageTimer()
+
+
+class Instrumentation(object):
+    """
+    Thread-safe object recording per-stage timings & counters of jobs and
+    aggregating them, globally & per domain.
+
+    Args:
+        max_domains (int, optional): Max number of domains to keep metrics
+            for. Jobs of subsequent domains are aggregated under "<other>".
+            Defaults to 10000.
+        clock (callable, optional): Clock to use. Defaults to
+            `time.perf_counter`.
+
+    """
+
+    def __init__(self, max_domains=DEFAULT_MAX_DOMAINS, clock=time.perf_counter):
+        self.max_domains = max_domains
+        self.clock = clock
+        self.started_at = clock()
+
+        self.lock = Lock()
+        self.current = local()
+        self.queued_at = {}
+
+        self.metrics = Metrics()
+        self.domains = {}
+
+    def track_queue(self, iterator):
+        """
+        Method wrapping the iterator consumed by a pool of threads so that
+        the time each item waits before being processed can be recorded in
+        the "queue" stage when passing the item to #.start_job.
+        """
+        for item in iterator:
+            self.queued_at[id(item)] = self.clock()
+            yield item
+
+    def start_job(self, domain=None, item=None):
+        now = self.clock()
+        job = InstrumentedJob(domain, now)
+
+        if item is not None:
+            queued_at = self.queued_at.pop(id(item), None)
+
+            if queued_at is not None:
+                job.timings['queue'] = now - queued_at
+
+        self.current.job = job
+
+        return job
+
+    def end_job(self):
+        """
+        Method aggregating the timings of the job currently processed by the
+        calling thread and returning them.
+        """
+        job = getattr(self.current, 'job', None)
+
+        if job is None:
+            return None
+
+        self.current.job = None
+
+        duration = self.clock() - job.started_at
+
+        with self.lock:
+            self.metrics.add_job(job, duration)
+
+            if job.domain is not None:
+                domain_metrics = self.domains.get(job.domain)
+
+                if domain_metrics is None:
+                    key = job.domain if len(self.domains) < self.max_domains else OTHER_DOMAINS
+                    domain_metrics = self.domains.setdefault(key, Metrics())
+
+                domain_metrics.add_job(job, duration)
+
+        return job.timings
+
+    def record(self, stage, seconds):
+        job = getattr(self.current, 'job', None)
+
+        # NOTE: timings recorded outside of any job are aggregated as is
+        if job is None:
+            with self.lock:
+                self.metrics.record(stage, seconds)
+
+            return
+
+        job.timings[stage] = job.timings.get(stage, 0.0) + seconds
+
+    def increment(self, name, count=1):
+        job = getattr(self.current, 'job', None)
+
+        if job is None:
+            with self.lock:
+                self.metrics.counters[name] += count
+
+            return
+
+        job.counters[name] = job.counters.get(name, 0) + count
+
+    def timer(self, stage):
+        return StageTimer(self, stage)
+
+    @property
+    def elapsed(self):
+        return self.clock() - self.started_at
+
+    def to_dict(self, max_domains=50):
+        """
+        Method returning the aggregated metrics, with the metrics of the
+        `max_domains` domains whose jobs took the most time.
+        """
+        with self.lock:
+            elapsed = self.elapsed
+
+            data = self.metrics.to_dict()
+            data['elapsed'] = elapsed
+            data['jobs_per_second'] = self.metrics.jobs.count / elapsed if elapsed else None
+
+            domains = sorted(
+                self.domains.items(),
+                key=lambda item: item[1].jobs.total,
+                reverse=True
+            )
+
+            data['domains'] = {
+                domain: metrics.to_dict()
+                for domain, metrics in domains[:max_domains]
+            }
+
+        return data
+
+    def format_stats(self):
+        """
+        Method returning a single line summarizing the aggregated metrics.
+        """
+        with self.lock:
+            elapsed = self.elapsed
+            jobs = self.metrics.jobs.count
+            shares = self.metrics.shares()
+
+            parts = ['jobs=%i (%.1f/s)' % (jobs, jobs / elapsed if elapsed else 0)]
+
+            for stage in self.metrics.sorted_stages():
+                histogram = self.metrics.stages[stage]
+
+                parts.append('%s p50=%s p99=%s (%.0f%%)' % (
+                    stage,
+                    format_duration(histogram.percentile(0.5)),
+                    format_duration(histogram.percentile(0.99)),
+                    shares[stage] * 100
+                ))
+
+        return ' | '.join(parts)
+
+    def postfix(self):
+        """
+        Method returning a short summary of the aggregated metrics, to be
+        displayed in a loading bar's postfix.
+        """
+        with self.lock:
+            postfix = {'job': format_duration(self.metrics.jobs.percentile(0.5))}
+            shares = self.metrics.shares()
+
+            if shares:
+                stage = max(shares, key=shares.get)
+                postfix['slowest'] = '%s %.0f%%' % (stage, shares[stage] * 100)
+
+        return postfix
+
+    def dump(self, path, extra=None):
+        """
+        Method atomically writing the aggregated metrics as JSON in the
+        given file, along with any extra data.
+        """
+        data = self.to_dict()
+
+        if extra is not None:
+            data.update(extra)
+
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+        os.replace(tmp_path, path)
+
+
+class NullInstrumentation(object):
+    """
+    Instrumentation doing nothing, used when instrumentation is disabled so
+    that instrumented code does not need to check for it.
+    """
+
+    def track_queue(self, iterator):
+        return iterator
+
+    def start_job(self, domain=None, item=None):
+        return None
+
+    def end_job(self):
+        return None
+
+    def record(self, stage, seconds):
+        pass
+
+    def increment(self, name, count=1):
+        pass
+
+    def timer(self, stage):
+        return NULL_STAGE_TIMER
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
@@ -13,9 +13,9 @@ from minet.mediacloud.topic import mediacloud_topic_stories
 
 
 class MediacloudClient(object):
-    def __init__(self, token):
+    def __init__(self, token, cache=None):
         self.token = token
-        self.http = create_pool(timeout=MEDIACLOUD_DEFAULT_TIMEOUT)
+        self.http = create_pool(timeout=MEDIACLOUD_DEFAULT_TIMEOUT, cache=cache)
 
     def count(self, query, **kwargs):
         return mediacloud_search(
@@ -0,0 +1,164 @@
+# =============================================================================
+# Minet Rate Limiting
+# =============================================================================
+#
+# Thread-safe rate limiter implementing the Generic Cell Rate Algorithm
+# (GCRA), which is equivalent to a token bucket but only needs to store a
+# single number: the "theoretical arrival time" (TAT) of the next call.
+#
+# Each call atomically reserves its slot by pushing the TAT forward, then
+# sleeps outside of any lock until its slot is reached, so that concurrent
+# callers are spaced exactly while never serializing the calls themselves.
+#
+# The TAT can be stored in memory (threads), in shared memory (processes
+# forked by `multiprocessing`) or in a local file (unrelated processes).
+#
+import os
+import time
+import struct
+from threading import Lock
+from multiprocessing import Value
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+TAT = struct.Struct('<d')
+
+
+class MemoryRateLimiterBackend(object):
+    """
+    Backend storing the TAT in memory, to be shared by threads.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = Lock()
+        self.tat = None
+
+    def update(self, fn):
+        with self.lock:
+            self.tat, result = fn(self.tat, self.clock())
+
+        return result
+
+
+class SharedMemoryRateLimiterBackend(object):
+    """
+    Backend storing the TAT in shared memory, to be shared by threads and by
+    processes created through `multiprocessing`, e.g. by passing the backend
+    to the pool's initializer.
+    """
+
+    def __init__(self):
+        self.value = Value('d', float('-inf'))
+
+    def update(self, fn):
+        with self.value.get_lock():
+            tat, result = fn(self.value.value, time.monotonic())
+            self.value.value = tat
+
+        return result
+
+
+class FileRateLimiterBackend(object):
+    """
+    Backend storing the TAT in a local file locked using `flock`, to be
+    shared by threads and by unrelated processes on the same machine.
+
+    Args:
+        path (str): Path of the file used to store the TAT.
+
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise TypeError('FileRateLimiterBackend requires fcntl, which is not available on this platform')
+
+        self.path = path
+        self.lock = Lock()
+
+    def update(self, fn):
+
+        # NOTE: flock does not exclude threads sharing a same file descriptor
+        with self.lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+                data = os.pread(fd, TAT.size, 0)
+                tat = TAT.unpack(data)[0] if len(data) == TAT.size else None
+
+                # NOTE: wall-clock time since the file may outlive the machine's uptime
+                tat, result = fn(tat, time.time())
+
+                os.pwrite(fd, TAT.pack(tat), 0)
+            finally:
+                os.close(fd)
+
+        return result
+
+
+class GCRARateLimiter(object):
+    """
+    Thread-safe rate limiter allowing at most `max_per_period` calls per
+    `period` on average, with bursts of at most `burst` calls at once.
+
+    It can be used as a context manager, through its #.acquire method or
+    with the `rate_limited_from_state` & `rate_limited_method` decorators.
+
+    Args:
+        max_per_period (int): Maximum number of calls per period.
+        period (float, optional): Duration of a period in seconds.
+            Defaults to 1.0.
+        burst (int, optional): Maximum number of calls that can be performed
+            at once when the limiter was not used for some time. Defaults
+            to 1, meaning calls are evenly spaced.
+        backend (object, optional): Backend storing the limiter's state.
+            Defaults to a `MemoryRateLimiterBackend`.
+
+    """
+
+    def __init__(self, max_per_period, period=1.0, burst=1, backend=None):
+        if burst < 1:
+            raise TypeError('burst should be at least 1')
+
+        self.emission_interval = period / max_per_period
+        self.tolerance = self.emission_interval * (burst - 1)
+        self.backend = backend if backend is not None else MemoryRateLimiterBackend()
+
+    def schedule(self, tat, now):
+        if tat is None or tat < now:
+            tat = now
+
+        delay = max(0.0, tat - self.tolerance - now)
+
+        return tat + self.emission_interval, delay
+
+    def reserve(self):
+        """
+        Method reserving the next available slot and returning the number of
+        seconds to wait before it is reached.
+        """
+        return self.backend.update(self.schedule)
+
+    def acquire(self):
+        delay = self.reserve()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        pass
+
+    # NOTE: making the limiter a drop-in replacement for `RateLimiterState`
+    def wait_if_needed(self):
+        self.acquire()
+
+    def update(self):
+        pass
@@ -0,0 +1,320 @@
+# =============================================================================
+# Minet Retry
+# =============================================================================
+#
+# Retry policy & queue used by `multithreaded_fetch` & `multithreaded_resolve`
+# to re-enqueue items whose request failed with a transient error, such as
+# timeouts, dropped connections, 429 or 5xx statuses, after an exponential
+# backoff with jitter.
+#
+# Items waiting for their retry are fed back to the pool of threads through
+# the iterator it consumes, so that no thread sleeps while an item waits, and
+# so that retries go through the per-domain throttle & parallelism again.
+# The iterator only blocks once there is nothing left to do but to wait for
+# pending retries.
+#
+import time
+import random
+from heapq import heappush, heappop
+from threading import Condition, Lock
+from collections import Counter
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    MaxRetryError,
+    NewConnectionError,
+    ProtocolError,
+    ReadTimeoutError
+)
+
+from minet.throttle import parse_retry_after
+from minet.defaults import (
+    DEFAULT_RETRIES,
+    DEFAULT_RETRY_BASE_DELAY,
+    DEFAULT_RETRY_MAX_DELAY
+)
+
+RETRYABLE_ERROR_CLASSES = [
+    'connect-timeout',
+    'read-timeout',
+    'connection-error',
+    'too-many-requests',
+    'server-error'
+]
+
+SERVER_ERROR_STATUSES = {502, 503, 504}
+
+
+def classify_retryable_error(error=None, status=None):
+    """
+    Function returning the retryable error class of the given request error
+    or response status, or None if it should not be retried.
+    """
+    if error is not None:
+        if isinstance(error, MaxRetryError):
+            error = error.reason
+
+        # NOTE: refused connections & unresolvable hosts are not transient,
+        # and NewConnectionError is a subclass of ConnectTimeoutError
+        if isinstance(error, NewConnectionError):
+            return None
+
+        if isinstance(error, ConnectTimeoutError):
+            return 'connect-timeout'
+
+        if isinstance(error, ReadTimeoutError):
+            return 'read-timeout'
+
+        if isinstance(error, ProtocolError):
+            return 'connection-error'
+
+        return None
+
+    if status == 429:
+        return 'too-many-requests'
+
+    if status in SERVER_ERROR_STATUSES:
+        return 'server-error'
+
+    return None
+
+
+class RetryStats(object):
+    __slots__ = ('retried', 'given_up', 'lock')
+
+    def __init__(self):
+        self.retried = Counter()
+        self.given_up = 0
+        self.lock = Lock()
+
+    @property
+    def retries(self):
+        return sum(self.retried.values())
+
+    def to_dict(self):
+        return {
+            'retries': self.retries,
+            'retried': dict(self.retried),
+            'given_up': self.given_up
+        }
+
+
+class RetryPolicy(object):
+    """
+    Thread-safe policy deciding whether, and when, a failed request should
+    be retried.
+
+    Args:
+        retries (int or dict, optional): Max number of times an item may be
+            retried, or a dict mapping error classes (connect-timeout,
+            read-timeout, connection-error, too-many-requests & server-error)
+            to their own max number of retries, missing classes not being
+            retried. Defaults to 3.
+        base_delay (float, optional): Delay before the first retry, in
+            seconds, doubled on each subsequent retry. Defaults to 1.
+        max_delay (float, optional): Max delay before a retry, in seconds,
+            also capping the delay asked by `Retry-After`. Defaults to 60.
+        rng (random.Random, optional): Random number generator used to
+            jitter delays.
+
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, base_delay=DEFAULT_RETRY_BASE_DELAY,
+                 max_delay=DEFAULT_RETRY_MAX_DELAY, rng=None):
+
+        if isinstance(retries, int):
+            retries = {error_class: retries for error_class in RETRYABLE_ERROR_CLASSES}
+
+        for error_class, count in retries.items():
+            if error_class not in RETRYABLE_ERROR_CLASSES:
+                raise TypeError('unknown error class "%s"' % error_class)
+
+            if not isinstance(count, int) or count < 0:
+                raise TypeError('retries should be a positive integer')
+
+        if base_delay < 0 or base_delay > max_delay:
+            raise TypeError('base_delay should be >= 0 and <= max_delay')
+
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng if rng is not None else random.Random()
+        self.stats = RetryStats()
+
+    def compute_delay(self, retries, retry_after=None):
+        """
+        Method returning the delay before the next retry of an item already
+        retried the given number of times, jittered between half & the whole
+        exponential backoff so that failed items are not all retried at once.
+        """
+        with self.stats.lock:
+            backoff = min(self.max_delay, self.base_delay * 2 ** retries)
+            delay = backoff / 2 + self.rng.uniform(0, backoff / 2)
+
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+
+        return delay
+
+    def decide(self, retries, error=None, response=None, status=None):
+        """
+        Method returning the delay before retrying an item already retried
+        the given number of times, or None if it should not be retried.
+
+        Args:
+            retries (int): Number of times the item was already retried.
+            error (Exception, optional): The request's error.
+            response (urllib3.HTTPResponse, optional): The request's response.
+            status (int, optional): The response's status, when the response
+                itself is not available.
+
+        """
+        if response is not None:
+            status = response.status
+
+        error_class = classify_retryable_error(error, status)
+
+        if error_class is None:
+            return None
+
+        if retries >= self.retries.get(error_class, 0):
+            with self.stats.lock:
+                self.stats.given_up += 1
+
+            return None
+
+        retry_after = None
+
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+
+        with self.stats.lock:
+            self.stats.retried[error_class] += 1
+
+        return self.compute_delay(retries, retry_after)
+
+
+class RetryQueue(object):
+    """
+    Thread-safe iterable yielding the items of the given iterator, along with
+    the items scheduled for a retry once their delay has elapsed. It only
+    stops once every yielded item has been marked as done.
+
+    Args:
+        iterator (iterable): Iterator over the items to process.
+        clock (callable, optional): Clock to use. Defaults to
+            `time.monotonic`.
+        on_schedule (callable, optional): Function called without argument
+            whenever an item is scheduled again.
+        on_due (callable, optional): Function called without argument
+            whenever a scheduled item is yielded again.
+
+    """
+
+    def __init__(self, iterator, clock=time.monotonic, on_schedule=None,
+                 on_due=None):
+        self.iterator = iter(iterator)
+        self.clock = clock
+        self.on_schedule = on_schedule
+        self.on_due = on_due
+        self.condition = Condition()
+        self.exhausted = False
+        self.in_flight = 0
+        self.scheduled = []
+        self.counter = 0
+        self.attempts = {}
+
+    def retries(self, item):
+        """
+        Method returning the number of times the given item was retried.
+        """
+        with self.condition:
+            return self.attempts.get(id(item), 0)
+
+    def schedule(self, item, delay):
+        self.in_flight -= 1
+
+        # NOTE: the counter breaks ties so that items are never compared
+        heappush(self.scheduled, (self.clock() + delay, self.counter, item))
+        self.counter += 1
+
+        self.condition.notify_all()
+
+    def retry(self, item, delay):
+        """
+        Method scheduling a retry of the given item after the given delay.
+        """
+        with self.condition:
+            self.attempts[id(item)] = self.attempts.get(id(item), 0) + 1
+            self.schedule(item, delay)
+
+        if self.on_schedule is not None:
+            self.on_schedule()
+
+    def defer(self, item, delay):
+        """
+        Method scheduling the given item again after the given delay, without
+        counting it as a retry, e.g. because it was released while its domain
+        asked to be left alone.
+        """
+        with self.condition:
+            self.schedule(item, delay)
+
+        if self.on_schedule is not None:
+            self.on_schedule()
+
+    def done(self, item):
+        """
+        Method marking the given item as done, i.e. it won't be retried.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.attempts.pop(id(item), None)
+
+            self.condition.notify_all()
+
+    def next_due(self):
+        with self.condition:
+            while True:
+                if self.scheduled and self.scheduled[0][0] <= self.clock():
+                    self.in_flight += 1
+                    return heappop(self.scheduled)[2]
+
+                if not self.exhausted:
+                    return None
+
+                if not self.scheduled and self.in_flight == 0:
+                    raise StopIteration
+
+                timeout = None
+
+                if self.scheduled:
+                    timeout = self.scheduled[0][0] - self.clock()
+
+                self.condition.wait(timeout)
+
+    def __iter__(self):
+        while True:
+            try:
+                item = self.next_due()
+            except StopIteration:
+                return
+
+            if item is not None:
+                if self.on_due is not None:
+                    self.on_due()
+
+                yield item
+                continue
+
+            item = next(self.iterator, self)
+
+            if item is self:
+                with self.condition:
+                    self.exhausted = True
+
+                continue
+
+            with self.condition:
+                self.in_flight += 1
+
+            yield item
@@ -4,25 +4,124 @@
 #
 # Module exposing utilities related to minet's scraping DSL.
 #
+from threading import Lock
+from collections import OrderedDict
 from bs4 import BeautifulSoup
 
 from minet.utils import load_definition
 from minet.scrape.apply import apply_scraper, tabulate
+from minet.scrape.compile import compile_scraper
+from minet.scrape.engines import parse_lxml_tree
+
+# Max number of plans compiled by `scrape` to keep, by definition
+PLAN_CACHE_SIZE = 128
+
+
+class ParsedDocument(object):
+    """
+    Class representing a html document that is parsed lazily, once, the
+    first time its soup (or raw lxml tree) is needed, so that it can be
+    shared by multiple scrapers without having to parse it again each time.
+    """
+    __slots__ = ('html', 'engine', 'parsed_soup', 'parsed_tree')
+
+    def __init__(self, html, engine='lxml'):
+        self.html = html
+        self.engine = engine
+        self.parsed_soup = None
+        self.parsed_tree = None
+
+    @property
+    def soup(self):
+        if self.parsed_soup is None:
+            self.parsed_soup = BeautifulSoup(self.html, self.engine)
+
+        return self.parsed_soup
+
+    @property
+    def tree(self):
+        if self.parsed_tree is None:
+            self.parsed_tree = parse_lxml_tree(self.html)
+
+        return self.parsed_tree
+
+    @staticmethod
+    def from_soup(soup):
+        document = ParsedDocument(str(soup))
+        document.parsed_soup = soup
+
+        return document
+
+    def __str__(self):
+        return self.html
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s parsed=%(parsed)s length=%(length)s>'
+        ) % {
+            'class_name': class_name,
+            'parsed': self.parsed_soup is not None or self.parsed_tree is not None,
+            'length': len(self.html)
+        }
+
+
+def ensure_document(html, engine='lxml'):
+    if isinstance(html, ParsedDocument):
+        return html
+
+    if isinstance(html, BeautifulSoup):
+        return ParsedDocument.from_soup(html)
+
+    return ParsedDocument(html, engine)
+
+
+# NOTE: entries hold their definition so that its id cannot be reused
+PLAN_CACHE = OrderedDict()
+PLAN_CACHE_LOCK = Lock()
+
+
+def get_plan(scraper):
+    """
+    Function returning the compiled plan of the given scraper definition,
+    memoized by definition identity. Note that this means a definition
+    should not be mutated once it has been given to `scrape`.
+    """
+    key = id(scraper)
+
+    with PLAN_CACHE_LOCK:
+        entry = PLAN_CACHE.get(key)
+
+        if entry is not None and entry[0] is scraper:
+            PLAN_CACHE.move_to_end(key)
+            return entry[1]
+
+    plan = compile_scraper(scraper)
+
+    with PLAN_CACHE_LOCK:
+        PLAN_CACHE[key] = (scraper, plan)
+        PLAN_CACHE.move_to_end(key)
+
+        while len(PLAN_CACHE) > PLAN_CACHE_SIZE:
+            PLAN_CACHE.popitem(last=False)
+
+    return plan
 
 
 def scrape(scraper, html, engine='lxml', context=None):
-    is_already_soup = isinstance(html, BeautifulSoup)
+    plan = get_plan(scraper) if not callable(scraper) else scraper
+    document = ensure_document(html, engine)
 
-    if not is_already_soup:
-        soup = BeautifulSoup(html, engine)
+    if getattr(plan, 'engine', 'bs4') == 'lxml':
+        root = document.tree
     else:
-        soup = html
+        root = document.soup
 
-    return apply_scraper(
-        scraper,
-        soup,
-        root=soup,
-        html=str(soup) if is_already_soup else html,
+    return plan(
+        root,
+        root=root,
+        html=document.html,
         context=context
     )
 
@@ -45,13 +144,15 @@ def headers_from_definition(scraper):
 
 
 class Scraper(object):
-    def __init__(self, definition):
+    def __init__(self, definition, engine=None):
         self.definition = definition
         self.headers = headers_from_definition(definition)
+        self.plan = compile_scraper(definition, engine=engine)
+        self.engine = self.plan.engine
 
     def __call__(self, html, context=None):
-        return scrape(self.definition, html, context=context)
+        return scrape(self.plan, html, context=context)
 
     @staticmethod
-    def from_file(target):
-        return Scraper(load_definition(target))
+    def from_file(target, engine=None):
+        return Scraper(load_definition(target), engine=engine)
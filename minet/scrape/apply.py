@@ -40,6 +40,9 @@ def merge_contexts(global_context, local_context):
 
 
 def extract(element, extractor_name):
+    if element is None:
+        return None
+
     if extractor_name == 'text':
         return element.get_text().strip()
 
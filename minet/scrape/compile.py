@@ -0,0 +1,398 @@
+# =============================================================================
+# Minet Compile Scraper Function
+# =============================================================================
+#
+# Function taking a scraper definition, validating it and compiling it into
+# a reusable execution plan, i.e. a tree of closures where selectors, python
+# expressions, format templates, transformers and extractors have already
+# been resolved once and for all.
+#
+# The returned plan must behave exactly as `apply_scraper` does, whatever
+# the engine used to run it.
+#
+import re
+import json
+from string import Formatter
+from urllib.parse import urljoin
+
+from minet.utils import nested_get
+from minet.scrape.apply import (
+    get_aliases,
+    merge_contexts,
+    FORMATTER,
+    DEFAULT_CONTEXT,
+    EXTRACTOR_NAMES,
+    TRANSFORMERS
+)
+from minet.scrape.engines import (
+    resolve_engine,
+    BeautifulSoupEngine,
+    LxmlEngine,
+    SelectorError
+)
+from minet.scrape.validate import validate
+from minet.exceptions import InvalidScraperError
+
+TEMPLATE_PARSER = Formatter()
+
+
+def compile_expression(expression):
+    code = compile(expression, '<scraper>', 'eval')
+
+    def evaluate(element=None, elements=None, value=None, context=None,
+                 html=None, root=None):
+
+        return eval(code, None, {
+
+            # Dependencies
+            'json': json,
+            'urljoin': urljoin,
+            're': re,
+
+            # Local values
+            'element': element,
+            'elements': elements,
+            'value': value,
+
+            # Context
+            'context': context or DEFAULT_CONTEXT,
+            'html': html,
+            'root': root
+        })
+
+    return evaluate
+
+
+def compile_template(template):
+    """
+    Function compiling a format template so that its python expressions
+    don't need to be parsed & compiled each time it is formatted, like
+    `PseudoFStringFormatter` would.
+    """
+    parts = []
+
+    for literal, field_name, format_spec, conversion in TEMPLATE_PARSER.parse(template):
+
+        # NOTE: falling back to the formatter for exotic templates
+        if field_name == '' or (format_spec and '{' in format_spec):
+            return lambda **kwargs: FORMATTER.format(template, **kwargs)
+
+        code = compile(field_name, '<template>', 'eval') if field_name is not None else None
+        parts.append((literal, code, format_spec, conversion))
+
+    def format_template(**kwargs):
+        result = []
+
+        for literal, code, format_spec, conversion in parts:
+            result.append(literal)
+
+            if code is None:
+                continue
+
+            value = eval(code, None, kwargs)
+            value = TEMPLATE_PARSER.convert_field(value, conversion)
+
+            result.append(TEMPLATE_PARSER.format_field(value, format_spec or ''))
+
+        return ''.join(result)
+
+    return format_template
+
+
+def compile_transform_chain(chain):
+    if not isinstance(chain, list):
+        chain = [chain]
+
+    fns = [TRANSFORMERS[transform] for transform in chain]
+
+    def transform(value):
+        for fn in fns:
+            value = fn(value)
+
+        return value
+
+    return transform
+
+
+def compile_leaf(scraper, engine):
+    extract = engine.extract
+    get_attr = engine.get_attr
+
+    if 'attr' in scraper:
+        attr = scraper['attr']
+        return lambda element, context: get_attr(element, attr)
+
+    if 'extract' in scraper:
+        extractor_name = scraper['extract']
+        return lambda element, context: extract(element, extractor_name)
+
+    if 'get' in scraper:
+        path = scraper['get']
+        return lambda element, context: nested_get(path, context)
+
+    if 'constant' in scraper:
+        constant = scraper['constant']
+        return lambda element, context: constant
+
+    # Default value is text
+    return lambda element, context: extract(element, 'text')
+
+
+def compile_tail(scraper, engine):
+    extract = engine.extract
+    get_attr = engine.get_attr
+
+    if scraper in EXTRACTOR_NAMES:
+        def plan(element, root=None, html=None, context=None):
+            return extract(element, scraper)
+    else:
+        def plan(element, root=None, html=None, context=None):
+            return get_attr(element, scraper)
+
+    return plan
+
+
+def compile_node(scraper, engine):
+
+    # Is this a tail call of item
+    if isinstance(scraper, str):
+        return compile_tail(scraper, engine)
+
+    sel = get_aliases(scraper, ['sel', '$'])
+    iterator = get_aliases(scraper, ['iterator', 'it', '$$'])
+
+    sel_matcher = engine.compile_selector(sel) if sel is not None else None
+    sel_eval = compile_expression(scraper['sel_eval']) if 'sel_eval' in scraper else None
+
+    iterator_matcher = engine.compile_selector(iterator) if iterator is not None else None
+    iterator_eval = compile_expression(scraper['iterator_eval']) if 'iterator_eval' in scraper else None
+
+    single_value = iterator_matcher is None and iterator_eval is None
+
+    context_plans = None
+
+    if 'context' in scraper:
+        context_plans = [(k, compile_node(v, engine)) for k, v in scraper['context'].items()]
+
+    fields_plans = None
+    item_plan = None
+    leaf = None
+    format_template = None
+    eval_value = None
+
+    if 'fields' in scraper:
+        fields_plans = [(k, compile_node(v, engine)) for k, v in scraper['fields'].items()]
+    elif 'item' in scraper:
+        item_plan = compile_node(scraper['item'], engine)
+    else:
+        leaf = compile_leaf(scraper, engine)
+
+        if 'format' in scraper:
+            format_template = compile_template(scraper['format'])
+
+        if 'eval' in scraper:
+            eval_value = compile_expression(scraper['eval'])
+
+    transform = compile_transform_chain(scraper['transform']) if 'transform' in scraper else None
+
+    has_default = 'default' in scraper
+    default = scraper.get('default')
+
+    filter_eval = compile_expression(scraper['filter_eval']) if 'filter_eval' in scraper else None
+    filtering_clause = scraper.get('filter')
+
+    has_uniq = 'uniq' in scraper
+    uniq_clause = scraper.get('uniq')
+
+    join = scraper.get('join')
+
+    def plan(element, root=None, html=None, context=None):
+
+        # First we need to solve local selection
+        if sel_matcher is not None:
+            element = sel_matcher.select_one(element)
+        elif sel_eval is not None:
+            element = sel_eval(
+                element=element,
+                elements=[],
+                context=context,
+                html=html,
+                root=root
+            )
+
+        # Then we need to solve iterator
+        if iterator_matcher is not None:
+            elements = iterator_matcher.select(element)
+        elif iterator_eval is not None:
+            elements = iterator_eval(
+                element=element,
+                elements=[],
+                context=context,
+                html=html,
+                root=root
+            )
+        else:
+            elements = [element]
+
+        # Handling local context
+        if context_plans is not None:
+            local_context = {}
+
+            for k, context_plan in context_plans:
+                local_context[k] = context_plan(
+                    element,
+                    root=root,
+                    html=html,
+                    context=context
+                )
+
+            context = merge_contexts(context, local_context)
+
+        # Actual iteration
+        acc = None if single_value else []
+
+        already_seen = set() if has_uniq and not single_value else None
+
+        for element in elements:
+            value = None
+
+            # Do we have fields?
+            if fields_plans is not None:
+                value = {}
+
+                for k, field_plan in fields_plans:
+                    value[k] = field_plan(
+                        element,
+                        root=root,
+                        html=html,
+                        context=context
+                    )
+
+            # Do we have a scalar?
+            elif item_plan is not None:
+                value = item_plan(
+                    element,
+                    root=root,
+                    html=html,
+                    context=context
+                )
+
+            else:
+                try:
+                    value = leaf(element, context)
+
+                    # Format?
+                    if format_template is not None:
+                        value = format_template(
+                            value=value,
+                            context=context
+                        )
+
+                    # Eval?
+                    if eval_value is not None:
+                        value = eval_value(
+                            element=element,
+                            elements=elements,
+                            value=value,
+                            context=context,
+                            html=html,
+                            root=root
+                        )
+                except:
+                    value = None
+
+            # Transform
+            if transform is not None and value is not None:
+                value = transform(value)
+
+            # Default value?
+            if has_default and value is None:
+                value = default
+
+            if single_value:
+                acc = value
+            else:
+
+                # Filtering?
+                if filter_eval is not None:
+                    passed_filter = filter_eval(
+                        element=element,
+                        elements=elements,
+                        value=value,
+                        context=context,
+                        html=html,
+                        root=root
+                    )
+
+                    if not passed_filter:
+                        continue
+
+                if filtering_clause is not None:
+                    if filtering_clause is True and not value:
+                        continue
+
+                    if isinstance(filtering_clause, str) and not value.get(filtering_clause):
+                        continue
+
+                if has_uniq:
+                    k = value
+
+                    if uniq_clause is True and value in already_seen:
+                        continue
+
+                    if isinstance(uniq_clause, str):
+                        k = value.get(uniq_clause)
+
+                        if k in already_seen:
+                            continue
+
+                    already_seen.add(k)
+
+                acc.append(value)
+
+        # NOTE: this opens a way for reducers
+        if not single_value and join is not None:
+            acc = join.join(acc)
+
+        return acc
+
+    return plan
+
+
+def compile_scraper(scraper, engine=None):
+    """
+    Function validating the given scraper definition and compiling it into
+    a callable plan taking an element and optional `root`, `html` and
+    `context` keyword arguments, exactly like `apply_scraper`.
+
+    The plan's `engine` attribute indicates whether it expects elements from
+    a BeautifulSoup ("bs4") or a lxml ("lxml") tree. The lxml engine can be
+    requested through the `engine` argument or the definition's "engine"
+    key, but BeautifulSoup will be used instead if the definition cannot
+    run without it.
+
+    Raises:
+        InvalidScraperError: if the definition is invalid.
+
+    """
+    errors = validate(scraper)
+
+    if errors:
+        raise InvalidScraperError(errors)
+
+    resolved_engine = resolve_engine(scraper, engine)
+
+    try:
+        plan = compile_node(scraper, resolved_engine)
+
+    # NOTE: some css selectors cannot be translated to xpath
+    except Exception as e:
+        if resolved_engine is not LxmlEngine or not isinstance(e, SelectorError):
+            raise
+
+        resolved_engine = BeautifulSoupEngine
+        plan = compile_node(scraper, resolved_engine)
+
+    plan.engine = resolved_engine.name
+
+    return plan
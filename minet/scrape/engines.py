@@ -0,0 +1,422 @@
+# =============================================================================
+# Minet Scraping Engines
+# =============================================================================
+#
+# Engines abstracting the few primitives the scraping DSL needs from the
+# underlying html tree, so that compiled plans can either run on top of
+# BeautifulSoup or directly on top of a raw lxml tree, which is way faster.
+#
+import soupsieve
+from itertools import chain
+from cssselect import HTMLTranslator, SelectorError
+from lxml import etree
+from lxml.html import document_fromstring, HTMLParser
+
+from minet.scrape.apply import extract
+
+# Attributes that BeautifulSoup splits into lists of values
+MULTI_VALUED_ATTRIBUTES = {
+    '*': set(['class', 'accesskey', 'dropzone']),
+    'a': set(['rel', 'rev']),
+    'link': set(['rel', 'rev']),
+    'td': set(['headers']),
+    'th': set(['headers']),
+    'form': set(['accept-charset']),
+    'object': set(['archive']),
+    'area': set(['rel']),
+    'icon': set(['sizes']),
+    'iframe': set(['sandbox']),
+    'output': set(['for'])
+}
+
+# Definition keys requiring a BeautifulSoup tree
+BS4_ONLY_KEYS = ['sel_eval', 'iterator_eval', 'eval', 'filter_eval', 'tabulate']
+
+PRESERVE_WHITESPACE_TAGS = set(['pre', 'textarea'])
+
+# Tags whose strings BeautifulSoup stores using specific types, which are
+# then skipped when getting the text of any other tag
+STRING_CONTAINER_TAGS = set(['rt', 'rp', 'style', 'script', 'template'])
+
+# Tags whose strings are not escaped by BeautifulSoup
+CDATA_CONTAINING_TAGS = set(['script', 'style'])
+
+VOID_ELEMENTS = set([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed',
+    'frame', 'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link',
+    'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr'
+])
+
+ASCII_SPACES = set('\x20\x0a\x09\x0c\x0d')
+
+# NOTE: libxml2 reports this doctype when the document does not declare any
+IMPLIED_DOCTYPE = (
+    '<!DOCTYPE html PUBLIC "-//W3C//DTD HTML 4.0 Transitional//EN" '
+    '"http://www.w3.org/TR/REC-html40/loose.dtd">'
+)
+
+UTF8_HTML_PARSER = HTMLParser(encoding='utf-8')
+
+ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+class BeautifulSoupEngine(object):
+    name = 'bs4'
+
+    @staticmethod
+    def compile_selector(selector):
+        return soupsieve.compile(selector)
+
+    @staticmethod
+    def extract(element, extractor_name):
+        return extract(element, extractor_name)
+
+    @staticmethod
+    def get_attr(element, name):
+        return element.get(name)
+
+
+class LxmlSelector(object):
+    __slots__ = ('xpath', 'tree_xpath')
+
+    def __init__(self, xpath, tree_xpath):
+        self.xpath = xpath
+        self.tree_xpath = tree_xpath
+
+    def select(self, element):
+
+        # NOTE: the root of a BeautifulSoup tree is the document, not <html>
+        if isinstance(element, etree._ElementTree):
+            return self.tree_xpath(element)
+
+        return self.xpath(element)
+
+    def select_one(self, element):
+        elements = self.select(element)
+
+        return elements[0] if elements else None
+
+
+def normalize_string(string, preserve_whitespace=False):
+
+    # NOTE: BeautifulSoup collapses strings made of ascii whitespace only,
+    # except within <pre> & <textarea>
+    if preserve_whitespace or not ASCII_SPACES.issuperset(string):
+        return string
+
+    return '\n' if '\n' in string else ' '
+
+
+def get_string_context(element):
+    """
+    Function returning whether whitespace is preserved within the given
+    lxml element, along with the tag determining the type BeautifulSoup
+    would give to its strings, if any.
+    """
+    preserve_whitespace = False
+    container = None
+
+    for e in chain([element], element.iterancestors()):
+        if e.tag in PRESERVE_WHITESPACE_TAGS:
+            preserve_whitespace = True
+
+        if container is None and e.tag in STRING_CONTAINER_TAGS:
+            container = e.tag
+
+    return preserve_whitespace, container
+
+
+def iter_strings(element):
+    """
+    Function iterating over the strings of the given lxml element, the same
+    way BeautifulSoup's `get_text` would, i.e. skipping the strings of
+    <script>, <style>, <template> etc. unless the element is one of them.
+    Note that the traversal is iterative so that deeply nested documents
+    cannot exceed the recursion limit.
+    """
+    preserve_whitespace, container = get_string_context(element)
+    target = element.tag if element.tag in STRING_CONTAINER_TAGS else None
+
+    if element.text and container == target:
+        yield normalize_string(element.text, preserve_whitespace)
+
+    stack = [(iter(element), preserve_whitespace, container, None)]
+
+    while stack:
+        children, preserve_whitespace, container, tail = stack[-1]
+        child = next(children, None)
+
+        if child is None:
+            stack.pop()
+
+            if tail and stack[-1][2] == target:
+                yield normalize_string(tail, stack[-1][1])
+
+            continue
+
+        # Comments & processing instructions
+        if not isinstance(child.tag, str):
+            if child.tail and container == target:
+                yield normalize_string(child.tail, preserve_whitespace)
+
+            continue
+
+        child_preserve_whitespace = (
+            preserve_whitespace or
+            child.tag in PRESERVE_WHITESPACE_TAGS
+        )
+
+        child_container = (
+            child.tag if child.tag in STRING_CONTAINER_TAGS else container
+        )
+
+        if child.text and child_container == target:
+            yield normalize_string(child.text, child_preserve_whitespace)
+
+        stack.append((iter(child), child_preserve_whitespace, child_container, child.tail))
+
+
+def format_string(string, tag, preserve_whitespace):
+    string = normalize_string(string, preserve_whitespace)
+
+    if tag in CDATA_CONTAINING_TAGS:
+        return string
+
+    return string.translate(ESCAPE_TABLE)
+
+
+def format_attribute_value(value):
+    value = value.translate(ESCAPE_TABLE)
+
+    if '"' not in value:
+        return '"%s"' % value
+
+    if "'" not in value:
+        return "'%s'" % value
+
+    return '"%s"' % value.replace('"', '&quot;')
+
+
+def format_start_tag(element):
+    attributes = []
+
+    for name, value in sorted(element.items()):
+        if (
+            name in MULTI_VALUED_ATTRIBUTES['*'] or
+            name in MULTI_VALUED_ATTRIBUTES.get(element.tag, ())
+        ):
+            value = ' '.join(value.split())
+
+        attributes.append(' %s=%s' % (name, format_attribute_value(value)))
+
+    is_empty = (
+        element.tag in VOID_ELEMENTS and
+        not element.text and
+        len(element) == 0
+    )
+
+    return '<%s%s%s>' % (element.tag, ''.join(attributes), '/' if is_empty else ''), is_empty
+
+
+def format_node(node, preserve_whitespace):
+    if node.tag is etree.Comment:
+        return '<!--%s-->' % normalize_string(node.text or '', preserve_whitespace)
+
+    if node.tag is etree.ProcessingInstruction:
+        return '<?%s %s>' % (node.target, normalize_string(node.text or '', preserve_whitespace))
+
+    return etree.tostring(node, encoding='unicode', method='html', with_tail=False)
+
+
+def iter_html(element, inner=False):
+    """
+    Function iterating over the chunks of html of the given lxml element,
+    serialized the same way BeautifulSoup would, i.e. with sorted attributes,
+    self-closing void elements & collapsed whitespace.
+    """
+    preserve_whitespace, _ = get_string_context(element)
+
+    if not inner:
+        start_tag, is_empty = format_start_tag(element)
+        yield start_tag
+
+        if is_empty:
+            return
+
+    if element.text:
+        yield format_string(element.text, element.tag, preserve_whitespace)
+
+    stack = [(iter(element), element, preserve_whitespace)]
+
+    while stack:
+        children, parent, preserve_whitespace = stack[-1]
+        child = next(children, None)
+
+        if child is None:
+            stack.pop()
+
+            if stack or not inner:
+                yield '</%s>' % parent.tag
+
+            if stack and parent.tail:
+                yield format_string(parent.tail, stack[-1][1].tag, stack[-1][2])
+
+            continue
+
+        if not isinstance(child.tag, str):
+            yield format_node(child, preserve_whitespace)
+
+            if child.tail:
+                yield format_string(child.tail, parent.tag, preserve_whitespace)
+
+            continue
+
+        start_tag, is_empty = format_start_tag(child)
+        yield start_tag
+
+        if is_empty:
+            if child.tail:
+                yield format_string(child.tail, parent.tag, preserve_whitespace)
+
+            continue
+
+        child_preserve_whitespace = (
+            preserve_whitespace or
+            child.tag in PRESERVE_WHITESPACE_TAGS
+        )
+
+        if child.text:
+            yield format_string(child.text, child.tag, child_preserve_whitespace)
+
+        stack.append((iter(child), child, child_preserve_whitespace))
+
+
+def iter_tree_html(tree):
+    root = tree.getroot()
+    doctype = tree.docinfo.doctype
+
+    if doctype and doctype != IMPLIED_DOCTYPE:
+        yield doctype + '\n'
+
+    for node in reversed(list(root.itersiblings(preceding=True))):
+        yield format_node(node, False)
+
+    yield from iter_html(root)
+
+    for node in root.itersiblings():
+        yield format_node(node, False)
+
+
+class LxmlEngine(object):
+    name = 'lxml'
+    translator = HTMLTranslator()
+
+    @staticmethod
+    def compile_selector(selector):
+
+        # NOTE: soupsieve only matches descendants of the given element
+        xpath = LxmlEngine.translator.css_to_xpath(selector, prefix='descendant::')
+        tree_xpath = LxmlEngine.translator.css_to_xpath(selector, prefix='descendant-or-self::')
+
+        return LxmlSelector(etree.XPath(xpath), etree.XPath(tree_xpath))
+
+    @staticmethod
+    def extract(element, extractor_name):
+        if extractor_name == 'text':
+            if isinstance(element, etree._ElementTree):
+                element = element.getroot()
+
+            return ''.join(iter_strings(element)).strip()
+
+        if extractor_name in ('html', 'inner_html', 'outer_html'):
+
+            # NOTE: the root of a BeautifulSoup tree is the whole document
+            if isinstance(element, etree._ElementTree):
+                return ''.join(iter_tree_html(element)).strip()
+
+            return ''.join(iter_html(element, inner=extractor_name != 'outer_html')).strip()
+
+        raise TypeError('Unknown "%s" extractor' % extractor_name)
+
+    @staticmethod
+    def get_attr(element, name):
+        if isinstance(element, etree._ElementTree):
+            element = element.getroot()
+
+        # NOTE: libxml2 gives boolean attributes without value, e.g. <input
+        # checked>, their name as value, where BeautifulSoup gives ''. This
+        # cannot be told apart from checked="checked" once the tree is built.
+
+        value = element.get(name)
+
+        if value is None:
+            return None
+
+        if (
+            name in MULTI_VALUED_ATTRIBUTES['*'] or
+            name in MULTI_VALUED_ATTRIBUTES.get(element.tag, ())
+        ):
+            return value.split()
+
+        return value
+
+
+ENGINES = {
+    'bs4': BeautifulSoupEngine,
+    'lxml': LxmlEngine
+}
+
+
+def parse_lxml_tree(html):
+    if not html or not html.strip():
+        return document_fromstring('<html></html>').getroottree()
+
+    try:
+        return document_fromstring(html).getroottree()
+
+    # NOTE: lxml refuses to parse unicode strings with an encoding declaration
+    except ValueError:
+        return document_fromstring(html.encode('utf-8'), parser=UTF8_HTML_PARSER).getroottree()
+
+
+def needs_bs4(scraper):
+    if isinstance(scraper, str):
+        return False
+
+    if not isinstance(scraper, dict):
+        return True
+
+    if any(k in scraper for k in BS4_ONLY_KEYS):
+        return True
+
+    for k in ['fields', 'context']:
+        if isinstance(scraper.get(k), dict):
+            if any(needs_bs4(s) for s in scraper[k].values()):
+                return True
+
+    if 'item' in scraper and needs_bs4(scraper['item']):
+        return True
+
+    return False
+
+
+def resolve_engine(scraper, engine=None):
+    """
+    Function returning the engine to use for the given definition. The
+    lxml engine is only used if asked to and if the definition does not
+    require BeautifulSoup, e.g. because python expressions are given access
+    to the elements.
+    """
+    if engine is None and isinstance(scraper, dict):
+        engine = scraper.get('engine')
+
+    if engine is None or engine == 'bs4':
+        return BeautifulSoupEngine
+
+    if engine != 'lxml':
+        raise TypeError('Unknown "%s" scraping engine' % engine)
+
+    if needs_bs4(scraper):
+        return BeautifulSoupEngine
+
+    return LxmlEngine
@@ -4,3 +4,109 @@
 #
 # Function validating a scraper definition expressed using minet's DSL.
 #
+import soupsieve
+from string import Formatter
+
+from minet.scrape.apply import EXTRACTOR_NAMES, TRANSFORMERS
+
+EVAL_KEYS = ['sel_eval', 'iterator_eval', 'eval', 'filter_eval']
+SELECTOR_KEYS = ['sel', '$', 'iterator', 'it', '$$']
+
+TEMPLATE_PARSER = Formatter()
+
+
+def check_expression(expression):
+    if not isinstance(expression, str):
+        return 'expression should be a string'
+
+    try:
+        compile(expression, '<scraper>', 'eval')
+    except SyntaxError as e:
+        return 'invalid python expression: %s' % e.msg
+
+
+def check_selector(selector):
+    if not isinstance(selector, str):
+        return 'css selector should be a string'
+
+    try:
+        soupsieve.compile(selector)
+    except soupsieve.SelectorSyntaxError:
+        return 'invalid css selector "%s"' % selector
+
+
+def check_template(template):
+    if not isinstance(template, str):
+        return 'format template should be a string'
+
+    try:
+        for _, field_name, _, _ in TEMPLATE_PARSER.parse(template):
+            if field_name:
+                compile(field_name, '<template>', 'eval')
+    except (ValueError, SyntaxError):
+        return 'invalid format template "%s"' % template
+
+
+def validate(scraper, path=None):
+    """
+    Function validating the given scraper definition and returning a list of
+    (path, message) tuples describing the found errors.
+    """
+    if path is None:
+        path = []
+
+    errors = []
+
+    def error(key, message):
+        if message is not None:
+            errors.append((path + [key] if key is not None else path, message))
+
+    if isinstance(scraper, str):
+        return errors
+
+    if not isinstance(scraper, dict):
+        error(None, 'scraper should be a string or a dict')
+        return errors
+
+    for k in SELECTOR_KEYS:
+        if k in scraper:
+            error(k, check_selector(scraper[k]))
+
+    for k in EVAL_KEYS:
+        if k in scraper:
+            error(k, check_expression(scraper[k]))
+
+    if not path and 'engine' in scraper and scraper['engine'] not in ['bs4', 'lxml']:
+        error('engine', 'unknown "%s" engine' % scraper['engine'])
+
+    if 'format' in scraper:
+        error('format', check_template(scraper['format']))
+
+    if 'extract' in scraper and scraper['extract'] not in EXTRACTOR_NAMES:
+        error('extract', 'unknown "%s" extractor' % scraper['extract'])
+
+    if 'transform' in scraper:
+        chain = scraper['transform']
+
+        if not isinstance(chain, list):
+            chain = [chain]
+
+        for transform in chain:
+            if transform not in TRANSFORMERS:
+                error('transform', 'unknown "%s" transformer' % transform)
+
+    for k in ['fields', 'context']:
+        if k not in scraper:
+            continue
+
+        if not isinstance(scraper[k], dict):
+            error(k, '%s should be a dict' % k)
+            continue
+
+        for name, sub_scraper in scraper[k].items():
+            errors.extend(validate(sub_scraper, path + [k, name]))
+
+    if 'item' in scraper:
+        errors.extend(validate(scraper['item'], path + ['item']))
+
+    return errors
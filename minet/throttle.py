@@ -0,0 +1,307 @@
+# =============================================================================
+# Minet Adaptive Throttle
+# =============================================================================
+#
+# Per-domain throttle policy that can be given as the `throttle` of
+# `multithreaded_fetch` & the `Crawler`, learning the response time and the
+# rate of congestion signals (429/5xx statuses, timeouts, dropped
+# connections) of every domain in order to raise or lower its throttle &
+# parallelism within configured bounds, while honouring `Retry-After`.
+#
+# Throttles only space out the start of consecutive calls to a same domain,
+# so parallelism is expressed as spacing: by Little's law, starting a call
+# every `latency / parallelism` seconds keeps about `parallelism` calls in
+# flight. Parallelism may drop below 1 for fragile domains, meaning a call
+# is only started every few response times. The hard cap remains the
+# `domain_parallelism` given to the fetching functions.
+#
+# Parallelism grows additively on success, but only once congestion has
+# become rare, and is halved on congestion (AIMD, as TCP does). Like TCP, a
+# domain is only backed off once per window, i.e. congestion signals from
+# calls started before the last back off are not taken into account again.
+# And like TCP CUBIC, the parallelism at which congestion last occurred is
+# remembered so that it is approached quickly but only exceeded slowly.
+#
+import time
+from threading import Lock
+from email.utils import parsedate_to_datetime
+from datetime import timezone
+from urllib3.exceptions import (
+    TimeoutError as Urllib3TimeoutError,
+    NewConnectionError,
+    ProtocolError
+)
+
+from minet.defaults import (
+    DEFAULT_THROTTLE,
+    DEFAULT_ADAPTIVE_THROTTLE_MIN_DELAY,
+    DEFAULT_ADAPTIVE_THROTTLE_MAX_DELAY,
+    DEFAULT_ADAPTIVE_THROTTLE_MAX_PARALLELISM
+)
+
+CONGESTION_STATUSES = {429, 502, 503, 504}
+CONGESTION_ERRORS = (Urllib3TimeoutError, ProtocolError)
+
+MIN_PARALLELISM = 0.01
+CEILING_APPROACH_RATIO = 0.9
+CEILING_PROBE_FACTOR = 0.1
+
+# NOTE: domains only speed up again once congestion has become rare enough
+MAX_ERROR_RATE_TO_SPEED_UP = 0.05
+
+
+def parse_retry_after(value, now=None):
+    """
+    Function parsing the value of a `Retry-After` header, expressed either in
+    seconds or as an HTTP date, and returning the number of seconds to wait,
+    or None if the value is invalid.
+    """
+    if value is None:
+        return None
+
+    value = value.strip()
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+    if date is None:
+        return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    if now is None:
+        now = time.time()
+
+    return max(0.0, date.timestamp() - now)
+
+
+class DomainThrottleState(object):
+    __slots__ = (
+        'parallelism',
+        'ceiling',
+        'latency',
+        'error_rate',
+        'blocked_until',
+        'backed_off_at',
+        'requests',
+        'errors',
+        'retry_afters'
+    )
+
+    def __init__(self):
+        self.parallelism = 1.0
+        self.ceiling = None
+        self.latency = None
+        self.error_rate = 0.0
+        self.blocked_until = 0.0
+        self.backed_off_at = float('-inf')
+        self.requests = 0
+        self.errors = 0
+        self.retry_afters = 0
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s parallelism=%(parallelism)s latency=%(latency)s>'
+        ) % {
+            'class_name': class_name,
+            'parallelism': self.parallelism,
+            'latency': self.latency
+        }
+
+
+class AdaptiveThrottle(object):
+    """
+    Thread-safe per-domain throttle adapting itself to the observed response
+    times & congestion signals of each domain.
+
+    It must be given as the `throttle` argument of `multithreaded_fetch` or
+    of the `Crawler`, which will then report the outcome of every call to
+    its #.observe method and requeue calls released while a domain asked to
+    be left alone using `Retry-After`, as told by its #.blocked_for method.
+
+    Args:
+        initial_delay (float, optional): Throttle of domains whose response
+            time is not known yet, in seconds. Defaults to 0.2.
+        min_delay (float, optional): Min throttle of a domain. Defaults to
+            0.05.
+        max_delay (float, optional): Max throttle of a domain, which also
+            caps the time waited because of `Retry-After`. Defaults to 30.
+        max_parallelism (int, optional): Max number of calls to a same
+            domain the throttle aims at keeping in flight. Note that it is
+            capped by the `domain_parallelism` given to the fetching
+            functions. Defaults to 4.
+        smoothing (float, optional): Weight of the last observation in the
+            moving averages of response time & error rate. Defaults to 0.2.
+        clock (callable, optional): Clock to use. Defaults to
+            `time.monotonic`.
+
+    """
+
+    def __init__(self, initial_delay=DEFAULT_THROTTLE,
+                 min_delay=DEFAULT_ADAPTIVE_THROTTLE_MIN_DELAY,
+                 max_delay=DEFAULT_ADAPTIVE_THROTTLE_MAX_DELAY,
+                 max_parallelism=DEFAULT_ADAPTIVE_THROTTLE_MAX_PARALLELISM,
+                 smoothing=0.2, clock=time.monotonic):
+
+        if min_delay < 0 or min_delay > max_delay:
+            raise TypeError('min_delay should be >= 0 and <= max_delay')
+
+        if max_parallelism < 1:
+            raise TypeError('max_parallelism should be >= 1')
+
+        if not 0 < smoothing <= 1:
+            raise TypeError('smoothing should be in ]0, 1]')
+
+        self.initial_delay = min(max(initial_delay, min_delay), max_delay)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_parallelism = max_parallelism
+        self.smoothing = smoothing
+        self.clock = clock
+
+        self.lock = Lock()
+        self.states = {}
+
+    def get_state(self, domain):
+        state = self.states.get(domain)
+
+        if state is None:
+            state = DomainThrottleState()
+            self.states[domain] = state
+
+        return state
+
+    def compute_spacing(self, state):
+        latency = state.latency if state.latency is not None else self.initial_delay
+
+        return min(self.max_delay, max(self.min_delay, latency / state.parallelism))
+
+    def compute_delay(self, state, now):
+        return min(self.max_delay, max(self.compute_spacing(state), state.blocked_until - now))
+
+    def __call__(self, domain, item=None):
+        with self.lock:
+            state = self.states.get(domain)
+
+            if state is None:
+                return self.initial_delay
+
+            return self.compute_delay(state, self.clock())
+
+    def blocked_for(self, domain):
+        """
+        Method returning the number of seconds during which the given domain
+        asked to be left alone using `Retry-After`, or 0. Calls released
+        meanwhile should be requeued rather than wait in a thread, the
+        throttle of their domain accounting for the remaining time.
+        """
+        with self.lock:
+            state = self.states.get(domain)
+
+            if state is None:
+                return 0
+
+            return max(0, state.blocked_until - self.clock())
+
+    def observe(self, domain, latency, response=None, error=None):
+        """
+        Method recording the outcome of a call to the given domain.
+
+        Args:
+            domain (str): Domain of the call.
+            latency (float): Time the call took, in seconds.
+            response (urllib3.HTTPResponse, optional): The call's response.
+            error (Exception, optional): The call's error.
+
+        """
+        status = response.status if response is not None else None
+
+        # NOTE: urllib3 raises NewConnectionError, a subclass of
+        # ConnectTimeoutError, on refused connections & unresolvable hosts
+        congested = (
+            status in CONGESTION_STATUSES or
+            (
+                isinstance(error, CONGESTION_ERRORS) and
+                not isinstance(error, NewConnectionError)
+            )
+        )
+
+        retry_after = None
+
+        if congested and response is not None:
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+
+        smoothing = self.smoothing
+
+        with self.lock:
+            now = self.clock()
+            state = self.get_state(domain)
+            state.requests += 1
+
+            # NOTE: calls failing fast, e.g. refused connections, say nothing
+            # of latency, while timeouts do
+            if response is not None or congested:
+                if state.latency is None:
+                    state.latency = latency
+                else:
+                    state.latency += smoothing * (latency - state.latency)
+
+            state.error_rate += smoothing * ((1.0 if congested else 0.0) - state.error_rate)
+
+            if congested:
+                state.errors += 1
+
+                # NOTE: calls started before the last back off were sent at
+                # a rate that is already known to be too high
+                if now - latency >= state.backed_off_at:
+                    state.backed_off_at = now
+                    state.ceiling = state.parallelism
+                    state.parallelism = max(MIN_PARALLELISM, state.parallelism / 2)
+
+                if retry_after is not None:
+                    state.retry_afters += 1
+                    state.blocked_until = max(
+                        state.blocked_until,
+                        now + min(retry_after, self.max_delay)
+                    )
+            elif state.error_rate <= MAX_ERROR_RATE_TO_SPEED_UP:
+                step = 1 / max(1.0, state.parallelism)
+
+                if state.ceiling is not None:
+                    approach = state.ceiling * CEILING_APPROACH_RATIO
+
+                    if state.parallelism >= approach:
+                        step *= CEILING_PROBE_FACTOR
+                    else:
+                        step = min(step, approach - state.parallelism)
+
+                state.parallelism = min(self.max_parallelism, state.parallelism + step)
+
+    def stats(self):
+        """
+        Method returning the current throttle, parallelism, mean response
+        time & error rate of every known domain.
+        """
+        with self.lock:
+            now = self.clock()
+
+            return {
+                domain: {
+                    'throttle': self.compute_delay(state, now),
+                    'parallelism': state.parallelism,
+                    'latency': state.latency,
+                    'error_rate': state.error_rate,
+                    'requests': state.requests,
+                    'errors': state.errors,
+                    'retry_afters': state.retry_afters
+                }
+                for domain, state in self.states.items()
+            }
@@ -0,0 +1,74 @@
+# =============================================================================
+# Minet Url Cache
+# =============================================================================
+#
+# Memoized versions of the `ural` functions used in minet's hot paths, such
+# as the groupers of the fetch, resolve & crawl functions or the url-* CLI
+# actions, since the same urls, and above all the same hosts, recur a lot
+# in the kind of inputs minet usually processes.
+#
+# Domain names are cached by the part of the url containing its host, so
+# that the cache is shared by every url of a same host, while other
+# functions are cached by full url. All caches are bounded LRU caches.
+#
+import re
+from functools import lru_cache
+from ural import (
+    get_domain_name as ural_get_domain_name,
+    get_normalized_hostname as ural_get_normalized_hostname,
+    is_url as ural_is_url,
+    normalize_url as ural_normalize_url
+)
+
+DEFAULT_URL_CACHE_SIZE = 2 ** 16
+
+# NOTE: matches the url up to the end of its netloc, which is everything the
+# domain name depends on
+HOST_PREFIX_RE = re.compile(r'^[^/?#]*(?://[^/?#]*)?')
+
+
+@lru_cache(maxsize=DEFAULT_URL_CACHE_SIZE)
+def get_domain_name_from_host_prefix(prefix):
+    return ural_get_domain_name(prefix)
+
+
+def get_domain_name(url):
+    return get_domain_name_from_host_prefix(HOST_PREFIX_RE.match(url).group(0))
+
+
+get_normalized_hostname = lru_cache(maxsize=DEFAULT_URL_CACHE_SIZE)(ural_get_normalized_hostname)
+is_url = lru_cache(maxsize=DEFAULT_URL_CACHE_SIZE)(ural_is_url)
+normalize_url = lru_cache(maxsize=DEFAULT_URL_CACHE_SIZE)(ural_normalize_url)
+
+CACHED_FUNCTIONS = {
+    'get_domain_name': get_domain_name_from_host_prefix,
+    'get_normalized_hostname': get_normalized_hostname,
+    'is_url': is_url,
+    'normalize_url': normalize_url
+}
+
+
+def url_cache_stats():
+    """
+    Function returning the hits, misses & hit rate of every url cache of
+    the current process.
+    """
+    stats = {}
+
+    for name, fn in CACHED_FUNCTIONS.items():
+        info = fn.cache_info()
+        calls = info.hits + info.misses
+
+        stats[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'hit_rate': info.hits / calls if calls else 0.0
+        }
+
+    return stats
+
+
+def clear_url_caches():
+    for fn in CACHED_FUNCTIONS.values():
+        fn.cache_clear()
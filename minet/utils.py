@@ -6,6 +6,8 @@
 #
 import re
 import cgi
+import socket
+import codecs
 import certifi
 import browser_cookie3
 import hashlib
@@ -18,11 +20,15 @@ import mimetypes
 import functools
 import cchardet as chardet
 from random import uniform
+from threading import Lock
 from collections import OrderedDict
 from json.decoder import JSONDecodeError
 from ural import is_url
 from urllib.parse import urljoin
 from urllib3 import HTTPResponse
+from urllib3.util.response import is_fp_closed
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.ssl_ import is_ipaddress
 from urllib.request import Request
 
 from minet.encodings import is_supported_encoding
@@ -32,11 +38,13 @@ from minet.exceptions import (
     InfiniteRedirectsError,
     InvalidRedirectError,
     InvalidURLError,
+    ResponseTooLargeError,
     SelfRedirectError
 )
 
 from minet.defaults import (
     DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_GROUP_PARALLELISM,
     DEFAULT_READ_TIMEOUT,
     DEFAULT_SPOOFED_UA
 )
@@ -58,6 +66,9 @@ ASCII_RE = re.compile(r'^[ -~]*$')
 
 # Constants
 CHARDET_CONFIDENCE_THRESHOLD = 0.9
+STREAM_CHUNK_SIZE = 64 * 1024
+ENCODING_SNIFF_SIZE = 16 * 1024
+CHARDET_SAMPLE_SIZE = 64 * 1024
 REDIRECT_STATUSES = set(HTTPResponse.REDIRECT_STATUSES)
 
 
@@ -67,15 +78,64 @@ def md5(string):
     return h.hexdigest()
 
 
-# TODO: add a version that tallies the possibilities
-def guess_response_encoding(response, is_xml=False, use_chardet=False):
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be')
+]
+
+
+def is_ascii(data):
+    try:
+        data.decode('ascii')
+    except UnicodeDecodeError:
+        return False
+
+    return True
+
+
+def is_valid_utf8(data, truncated=False):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+
+    try:
+        decoder.decode(data, final=not truncated)
+    except UnicodeDecodeError:
+        return False
+
+    return True
+
+
+def sniff_response_encoding(response, is_xml=False, use_chardet=False,
+                            data=None):
     """
     Function taking an urllib3 response object and attempting to guess its
-    encoding.
+    encoding without ever having to scan its whole body. Returns a tuple
+    containing the encoding and a string indicating how it was found, i.e.
+    "header", "bom", "meta", "ascii", "utf8" or "chardet".
+
+    BOMs are checked first, then the Content-Type header. Meta tags & xml
+    declarations are only searched in the first `ENCODING_SNIFF_SIZE` bytes
+    and chardet only runs on the first `CHARDET_SAMPLE_SIZE` bytes, after
+    pure ASCII & valid UTF-8 samples have been short-circuited.
+
+    If `data` is given, it will be used instead of the response's body,
+    which is handy when one only has access to the beginning of a streamed
+    response.
     """
-    content_type_header = response.getheader('content-type')
+    if data is None:
+        data = response.data
+
+    data = data or b''
+
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding, 'bom'
 
-    suboptimal_charset = None
+    suboptimal = (None, None)
+
+    content_type_header = response.getheader('content-type')
 
     if content_type_header is not None:
         parsed_header = cgi.parse_header(content_type_header)
@@ -85,50 +145,67 @@ def guess_response_encoding(response, is_xml=False, use_chardet=False):
 
             if charset is not None:
                 if is_supported_encoding(charset):
-                    return charset.lower()
+                    return charset.lower(), 'header'
                 else:
-                    suboptimal_charset = charset
-
-    data = response.data
+                    suboptimal = (charset, 'header')
 
     # Data is empty
     if not data.strip():
-        return None
+        return None, None
 
-    # TODO: use re.search to go faster!
     if is_xml:
-        matches = re.findall(CHARSET_RE, data)
+        head = data[:ENCODING_SNIFF_SIZE]
 
-        if len(matches) == 0:
-            matches = re.findall(PRAGMA_RE, data)
-
-        if len(matches) == 0:
-            matches = re.findall(XML_RE, data)
+        matches = (
+            CHARSET_RE.findall(head) or
+            PRAGMA_RE.findall(head) or
+            XML_RE.findall(head)
+        )
 
         # NOTE: here we are returning the last one, but we could also use
         # frequency at the expense of performance
-        if len(matches) != 0:
-            charset = matches[-1].lower().decode()
+        if matches:
+            charset = matches[-1].lower().decode(errors='replace')
 
             if is_supported_encoding(charset):
-                return charset
-            else:
-                suboptimal_charset = charset
+                return charset, 'meta'
+            elif suboptimal[0] is None:
+                suboptimal = (charset, 'meta')
 
     if use_chardet:
-        chardet_result = chardet.detect(data)
+        sample = data[:CHARDET_SAMPLE_SIZE]
+        truncated = len(data) > CHARDET_SAMPLE_SIZE
+
+        # NOTE: utf-8 is a superset of ascii, safer if the sample is truncated
+        if is_ascii(sample):
+            return 'utf-8', 'ascii'
+
+        if is_valid_utf8(sample, truncated=truncated):
+            return 'utf-8', 'utf8'
+
+        chardet_result = chardet.detect(sample)
 
-        # Could not detect anything
         if (
-            not chardet_result or
-            chardet_result.get('confidence') is None
+            chardet_result and
+            chardet_result.get('confidence') is not None and
+            chardet_result['confidence'] >= CHARDET_CONFIDENCE_THRESHOLD
         ):
-            return None
+            return chardet_result['encoding'].lower(), 'chardet'
 
-        if chardet_result['confidence'] >= CHARDET_CONFIDENCE_THRESHOLD:
-            return chardet_result['encoding'].lower()
+    return suboptimal
 
-    return suboptimal_charset
+
+def guess_response_encoding(response, is_xml=False, use_chardet=False, data=None):
+    """
+    Function taking an urllib3 response object and attempting to guess its
+    encoding. See `sniff_response_encoding` for more details.
+    """
+    return sniff_response_encoding(
+        response,
+        is_xml=is_xml,
+        use_chardet=use_chardet,
+        data=data
+    )[0]
 
 
 def parse_http_header(header):
@@ -210,9 +287,390 @@ def dict_to_cookie_string(d):
 DEFAULT_URLLIB3_TIMEOUT = urllib3.Timeout(connect=DEFAULT_CONNECT_TIMEOUT, read=DEFAULT_READ_TIMEOUT)
 
 
-def create_pool(proxy=None, threads=None, insecure=False, **kwargs):
+class ConnectionStats(object):
+    """
+    Thread-safe counters keeping track of the number of requests performed
+    by a pool manager and the number of connections it had to open to do so.
+    """
+    __slots__ = ('requests', 'new_connections', 'lock')
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.lock = Lock()
+
+    def add_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def add_new_connection(self):
+        with self.lock:
+            self.new_connections += 1
+
+    @property
+    def reused_connections(self):
+        return max(0, self.requests - self.new_connections)
+
+    @property
+    def reuse_rate(self):
+        if self.requests == 0:
+            return 0.0
+
+        return self.reused_connections / self.requests
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'reuse_rate': self.reuse_rate
+        }
+
+    def __repr__(self):
+        class_name = self.__class__.__name__
+
+        return (
+            '<%(class_name)s requests=%(requests)s new=%(new_connections)s reused=%(reused_connections)s>'
+        ) % {
+            'class_name': class_name,
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections
+        }
+
+
+class CachedDNSConnectionMixin(object):
+    """
+    Mixin for urllib3 connections resolving their hostname using an optional
+    `minet.dns.DNSCache` instance, then connecting to its addresses in turn.
+    """
+    dns = None
+    dns_time = 0.0
+
+    def _new_conn(self):
+        host = self._dns_host
+
+        if self.dns is None or is_ipaddress(host):
+            return super()._new_conn()
+
+        instrumentation = self.instrumentation
+
+        if instrumentation is not None:
+            start = instrumentation.clock()
+
+        try:
+            addresses = self.dns.resolve(host.rstrip('.'))
+        except socket.error as e:
+            raise NewConnectionError(
+                self,
+                'Failed to establish a new connection: %s' % e
+            )
+        finally:
+            if instrumentation is not None:
+                self.dns_time = instrumentation.clock() - start
+                instrumentation.record('dns', self.dns_time)
+
+        # NOTE: the hostname is swapped for the duration of the connection
+        # only, since it is not used for SNI nor for the Host header
+        error = None
+
+        try:
+            for address in addresses:
+                self._dns_host = address
+
+                try:
+                    return super()._new_conn()
+                except ConnectTimeoutError as e:
+                    error = e
+        finally:
+            self._dns_host = host
+
+        raise error
+
+
+class InstrumentedConnectionMixin(object):
+    """
+    Mixin for urllib3 connections recording the time spent connecting
+    (including DNS resolution, unless a `minet.dns.DNSCache` is used) and
+    waiting for the response's headers into an optional
+    `minet.instrumentation.Instrumentation` instance.
+    """
+    instrumentation = None
+    connect_time = 0.0
+
+    def _new_conn(self):
+        if self.instrumentation is None:
+            return super()._new_conn()
+
+        start = self.instrumentation.clock()
+
+        try:
+            return super()._new_conn()
+        finally:
+            self.connect_time = self.instrumentation.clock() - start
+            self.instrumentation.record('connect', self.connect_time)
+
+    def getresponse(self, *args, **kwargs):
+        if self.instrumentation is None:
+            return super().getresponse(*args, **kwargs)
+
+        with self.instrumentation.timer('ttfb'):
+            return super().getresponse(*args, **kwargs)
+
+
+class InstrumentedHTTPConnection(CachedDNSConnectionMixin, InstrumentedConnectionMixin,
+                                 urllib3.connection.HTTPConnection):
+    pass
+
+
+class InstrumentedHTTPSConnection(CachedDNSConnectionMixin, InstrumentedConnectionMixin,
+                                  urllib3.connection.HTTPSConnection):
+    def connect(self):
+        if self.instrumentation is None:
+            return super().connect()
+
+        start = self.instrumentation.clock()
+        self.connect_time = 0.0
+        self.dns_time = 0.0
+
+        try:
+            return super().connect()
+        finally:
+
+            # NOTE: the TLS handshake is whatever is not the TCP connection
+            tls_time = self.instrumentation.clock() - start - self.connect_time - self.dns_time
+            self.instrumentation.record('tls', tls_time)
+
+
+class InstrumentedHTTPResponse(HTTPResponse):
+    """
+    urllib3 response recording the time spent downloading its body into the
+    instrumentation of the pool it comes from, if any, and writing its body
+    into the HTTP cache as it is read, if given a `cache_writer`.
+    """
+
+    cache_writer = None
+
+    def wants_decoded_content(self, decode_content):
+        if decode_content is None:
+            decode_content = self.decode_content
+
+        return decode_content or 'content-encoding' not in self.headers
+
+    def read(self, amt=None, decode_content=None, cache_content=False):
+        writer = self.cache_writer
+
+        if writer is not None and not self.wants_decoded_content(decode_content):
+            writer.abort()
+
+        instrumentation = getattr(self._pool, 'instrumentation', None)
+
+        try:
+            if instrumentation is None:
+                data = super().read(amt, decode_content, cache_content)
+            else:
+                with instrumentation.timer('body'):
+                    data = super().read(amt, decode_content, cache_content)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+
+            raise
+
+        if writer is not None:
+            writer.write(data)
+
+            # NOTE: the connection is closed once the body was read entirely
+            if amt is None or is_fp_closed(self._fp):
+                if self.length_remaining:
+                    writer.abort()
+                else:
+                    writer.finish()
+
+        return data
+
+    def iter_chunks(self, *args, **kwargs):
+        instrumentation = getattr(self._pool, 'instrumentation', None)
+
+        if instrumentation is None:
+            yield from super().read_chunked(*args, **kwargs)
+            return
+
+        chunks = super().read_chunked(*args, **kwargs)
+
+        while True:
+            with instrumentation.timer('body'):
+                chunk = next(chunks, None)
+
+            if chunk is None:
+                break
+
+            yield chunk
+
+    def read_chunked(self, amt=None, decode_content=None):
+        writer = self.cache_writer
+
+        if writer is None:
+            yield from self.iter_chunks(amt, decode_content)
+            return
+
+        if not self.wants_decoded_content(decode_content):
+            writer.abort()
+
+        try:
+            for chunk in self.iter_chunks(amt, decode_content):
+                writer.write(chunk)
+                yield chunk
+        except BaseException:
+            writer.abort()
+            raise
+
+        writer.finish()
+
+    def close(self):
+        if self.cache_writer is not None:
+            self.cache_writer.abort()
+
+        super().close()
+
+
+class ConnectionStatsPoolMixin(object):
+    connection_stats = None
+    instrumentation = None
+    dns = None
+
+    def _new_conn(self):
+        if self.connection_stats is not None:
+            self.connection_stats.add_new_connection()
+
+        conn = super()._new_conn()
+        conn.instrumentation = self.instrumentation
+        conn.dns = self.dns
+
+        return conn
+
+    def _make_request(self, *args, **kwargs):
+        if self.connection_stats is not None:
+            self.connection_stats.add_request()
+
+        return super()._make_request(*args, **kwargs)
+
+
+class StatsHTTPConnectionPool(ConnectionStatsPoolMixin, urllib3.HTTPConnectionPool):
+    ConnectionCls = InstrumentedHTTPConnection
+    ResponseCls = InstrumentedHTTPResponse
+
+
+class StatsHTTPSConnectionPool(ConnectionStatsPoolMixin, urllib3.HTTPSConnectionPool):
+    ConnectionCls = InstrumentedHTTPSConnection
+    ResponseCls = InstrumentedHTTPResponse
+
+
+class ConnectionStatsManagerMixin(object):
+    """
+    Mixin for urllib3 managers recording connection reuse statistics of
+    their pools in a `connection_stats` attribute.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.connection_stats = ConnectionStats()
+        self.pool_classes_by_scheme = {
+            'http': StatsHTTPConnectionPool,
+            'https': StatsHTTPSConnectionPool
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context=request_context)
+        pool.connection_stats = self.connection_stats
+
+        return pool
+
+
+class HTTPCacheManagerMixin(object):
+    """
+    Mixin for urllib3 managers serving responses from an optional
+    `minet.http_cache.HTTPCache` instance.
+    """
+
+    def __init__(self, *args, cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.cache = cache
+
+    def urlopen(self, method, url, **kwargs):
+        if self.cache is None:
+            return super().urlopen(method, url, **kwargs)
+
+        return self.cache.urlopen(super().urlopen, method, url, **kwargs)
+
+
+class InstrumentationManagerMixin(object):
+    """
+    Mixin for urllib3 managers passing an optional
+    `minet.instrumentation.Instrumentation` instance to their pools.
+    """
+
+    def __init__(self, *args, instrumentation=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.instrumentation = instrumentation
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context=request_context)
+        pool.instrumentation = self.instrumentation
+
+        return pool
+
+
+class DNSCacheManagerMixin(object):
+    """
+    Mixin for urllib3 managers passing an optional `minet.dns.DNSCache`
+    instance to their pools.
+    """
+
+    def __init__(self, *args, dns=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.dns = dns
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context=request_context)
+        pool.dns = self.dns
+
+        return pool
+
+
+class PoolManager(HTTPCacheManagerMixin, InstrumentationManagerMixin, DNSCacheManagerMixin,
+                  ConnectionStatsManagerMixin, urllib3.PoolManager):
+    pass
+
+
+class ProxyManager(HTTPCacheManagerMixin, InstrumentationManagerMixin, DNSCacheManagerMixin,
+                   ConnectionStatsManagerMixin, urllib3.ProxyManager):
+    pass
+
+
+def create_pool(proxy=None, threads=None, insecure=False, domain_parallelism=None,
+                cache=None, instrumentation=None, dns=None, **kwargs):
     """
     Helper function returning a urllib3 pool manager with sane defaults.
+
+    Per-host pools are sized after the number of concurrent requests that
+    can be made to a same domain so that keep-alive connections can be
+    reused instead of being torn down. Connection reuse statistics can be
+    found in the `connection_stats` attribute of the returned manager.
+
+    If a `minet.http_cache.HTTPCache` is given as `cache`, responses will be
+    served from it whenever possible.
+
+    If a `minet.instrumentation.Instrumentation` is given as
+    `instrumentation`, the time spent connecting, performing TLS handshakes,
+    waiting for the first byte & downloading bodies will be recorded in it.
+
+    If a `minet.dns.DNSCache` is given as `dns`, new connections will
+    resolve their hostname using it instead of the system resolver.
     """
 
     manager_kwargs = {
@@ -228,18 +686,27 @@ def create_pool(proxy=None, threads=None, insecure=False, **kwargs):
 
         urllib3.disable_warnings()
 
-    if threads is not None:
+    if domain_parallelism is None:
+        domain_parallelism = DEFAULT_GROUP_PARALLELISM
 
-        # TODO: maxsize should increase with group_parallelism
-        manager_kwargs['maxsize'] = 1
+    if threads is not None:
+        manager_kwargs['maxsize'] = max(1, min(domain_parallelism, threads))
         manager_kwargs['num_pools'] = threads * 2
+    else:
+        manager_kwargs['maxsize'] = max(1, domain_parallelism)
 
     manager_kwargs.update(kwargs)
 
     if proxy is not None:
-        return urllib3.ProxyManager(proxy, **manager_kwargs)
+        return ProxyManager(
+            proxy,
+            cache=cache,
+            instrumentation=instrumentation,
+            dns=dns,
+            **manager_kwargs
+        )
 
-    return urllib3.PoolManager(**manager_kwargs)
+    return PoolManager(cache=cache, instrumentation=instrumentation, dns=dns, **manager_kwargs)
 
 
 def explain_request_error(error):
@@ -317,9 +784,11 @@ def raw_resolve(http, url, method='GET', headers=None, max_redirects=5,
 
     for _ in range(max_redirects):
 
+        # NOTE: closing before releasing, since a connection whose response
+        # was not entirely read cannot be reused
         if response:
-            response.release_conn()
             response.close()
+            response.release_conn()
 
         http_error, response = raw_request(
             http,
@@ -440,8 +909,8 @@ def raw_resolve(http, url, method='GET', headers=None, max_redirects=5,
         error = MaxRedirectsError('Maximum number of redirects exceeded')
 
     if response and not return_response:
-        response.release_conn()
         response.close()
+        response.release_conn()
 
     compiled_stack = list(url_stack.values())
 
@@ -475,10 +944,65 @@ def build_request_headers(headers=None, cookie=None, spoof_ua=False, json_body=F
     return final_headers
 
 
+def check_content_length(response, max_body_size):
+    content_length = response.getheader('content-length')
+
+    if content_length is None:
+        return
+
+    try:
+        content_length = int(content_length)
+    except ValueError:
+        return
+
+    if content_length > max_body_size:
+        raise ResponseTooLargeError(
+            'Response body is announced to be %i bytes long, which exceeds the %i bytes limit' % (content_length, max_body_size)
+        )
+
+
+def stream_response(response, max_body_size=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Generator yielding the (decoded) body of an urllib3 response, read with
+    `preload_content=False`, by chunks, starting with any part of it that may
+    have already been buffered.
+
+    Raises:
+        ResponseTooLargeError: if the body exceeds `max_body_size` bytes.
+
+    """
+    if max_body_size is not None:
+        check_content_length(response, max_body_size)
+
+    size = 0
+
+    if response._body:
+        size += len(response._body)
+        yield response._body
+
+    for chunk in response.stream(chunk_size, decode_content=True):
+        size += len(chunk)
+
+        if max_body_size is not None and size > max_body_size:
+            raise ResponseTooLargeError(
+                'Response body exceeds the %i bytes limit' % max_body_size
+            )
+
+        yield chunk
+
+
 def request(http, url, method='GET', headers=None, cookie=None, spoof_ua=True,
             follow_redirects=True, max_redirects=5, follow_refresh_header=True,
             follow_meta_refresh=False, follow_js_relocation=False, timeout=None,
-            body=None, json_body=None):
+            body=None, json_body=None, max_body_size=None, stream=False):
+    """
+    Generic request helper following redirections and reading the response's
+    body.
+
+    If `stream` is True, the body won't be read and it is up to the caller to
+    consume it, using `stream_response` for instance, then to release the
+    connection.
+    """
 
     # Formatting headers
     final_headers = build_request_headers(
@@ -500,12 +1024,24 @@ def request(http, url, method='GET', headers=None, cookie=None, spoof_ua=True,
         final_body = json.dumps(json_body, ensure_ascii=False).encode('utf-8')
 
     if not follow_redirects:
-        return raw_request(
+        if not stream and max_body_size is None:
+            return raw_request(
+                http,
+                url,
+                method,
+                headers=final_headers,
+                body=final_body,
+                timeout=timeout
+            )
+
+        err, response = raw_request(
             http,
             url,
             method,
             headers=final_headers,
             body=final_body,
+            preload_content=False,
+            release_conn=False,
             timeout=timeout
         )
     else:
@@ -523,20 +1059,26 @@ def request(http, url, method='GET', headers=None, cookie=None, spoof_ua=True,
             timeout=timeout
         )
 
-        if err:
-            return err, response
+    if err:
+        return err, response
 
-        # Finishing reading body
-        try:
+    if stream:
+        return None, response
+
+    # Finishing reading body
+    try:
+        if max_body_size is None:
             response._body = (response._body or b'') + response.read()
-        except Exception as e:
-            return explain_request_error(e), response
-        finally:
-            if response is not None:
-                response.close()
-                response.release_conn()
+        else:
+            response._body = b''.join(stream_response(response, max_body_size=max_body_size))
+    except Exception as e:
+        return explain_request_error(e), response
+    finally:
+        if response is not None:
+            response.close()
+            response.release_conn()
 
-        return None, response
+    return None, response
 
 
 def resolve(http, url, method='GET', headers=None, cookie=None, spoof_ua=True,
@@ -562,7 +1104,8 @@ def resolve(http, url, method='GET', headers=None, cookie=None, spoof_ua=True,
     )
 
 
-def extract_response_meta(response, guess_encoding=True, guess_extension=True):
+def extract_response_meta(response, guess_encoding=True, guess_extension=True,
+                          data=None):
     meta = {}
 
     # Guessing mime type
@@ -588,7 +1131,12 @@ def extract_response_meta(response, guess_encoding=True, guess_extension=True):
 
     # Guessing encoding
     if guess_encoding:
-        meta['encoding'] = guess_response_encoding(response, is_xml=True, use_chardet=True)
+        meta['encoding'], meta['encoding_source'] = sniff_response_encoding(
+            response,
+            is_xml=True,
+            use_chardet=True,
+            data=data
+        )
 
     return meta
 
@@ -644,7 +1192,8 @@ class RateLimiter(object):
     """
     Naive rate limiter context manager with smooth output.
 
-    Note that it won't work in a multi-threaded environment.
+    Note that it won't work in a multi-threaded environment, use
+    `minet.rate_limiting.GCRARateLimiter` instead.
 
     Args:
         max_per_period (int): Maximum number of calls per period.
@@ -838,7 +1387,9 @@ def rate_limited_method(attr='rate_limiter_state'):
         def decorated(self, *args, **kwargs):
             state = getattr(self, attr)
 
-            if not isinstance(state, RateLimiterState):
+            # NOTE: any object exposing a compatible interface can be used,
+            # e.g. a `minet.rate_limiting.GCRARateLimiter`
+            if not hasattr(state, 'wait_if_needed') or not hasattr(state, 'update'):
                 raise ValueError
 
             state.wait_if_needed()
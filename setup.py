@@ -27,6 +27,7 @@ setup(name='minet',
         'browser-cookie3==0.7.6',
         'casanova==0.7.0',
         'cchardet==2.1.4',
+        'cssselect>=1.0.3',
         'cython>=0.29.4',
         'dateparser>=0.7.1',
         'json5>=0.8.5',
@@ -34,7 +35,6 @@ setup(name='minet',
         'lxml>=4.3.0',
         'ndjson>=0.3.1',
         'numpy>=1.16.1',
-        'persist-queue>=0.4.2',
         'pytz>=2019.3',
         'pyyaml',
         'quenouille>=0.6.0',
@@ -43,6 +43,9 @@ setup(name='minet',
         'ural>=0.24.1',
         'urllib3[secure]>=1.25.3'
       ],
+      extras_require={
+        'async': ['aiohttp>=3.6.2']
+      },
       entry_points={
         'console_scripts': ['minet=minet.cli.__main__:main']
       },
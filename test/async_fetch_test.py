@@ -0,0 +1,55 @@
+# =============================================================================
+# Minet Async Fetch Unit Tests
+# =============================================================================
+import socket
+import asyncio
+import aiohttp
+from types import SimpleNamespace
+
+from minet import async_fetch as async_fetch_module
+from minet.async_fetch import async_fetch, to_urllib3_error
+from minet.retry import classify_retryable_error
+from minet.cli.reporters import report_error
+
+
+class TestAsyncFetch(object):
+    def test_parking(self, monkeypatch):
+        async def fake_request(session, url, **kwargs):
+            await asyncio.sleep(0.01)
+            return ValueError(url), None
+
+        monkeypatch.setattr(async_fetch_module, 'async_request', fake_request)
+
+        urls = ['http://lemonde.fr/%i' % i for i in range(10)] + ['http://liberation.fr']
+
+        results = list(async_fetch(urls, throttle=0.05, buffer_size=2))
+
+        assert sorted(r.url for r in results) == sorted(urls)
+
+        # A domain whose buffer is full does not block other domains
+        assert [r.url for r in results].index('http://liberation.fr') < 3
+
+    def test_errors(self):
+        key = SimpleNamespace(host='lemonde.fr', port=80, ssl=True)
+        url = 'http://lemonde.fr'
+
+        def convert(error):
+            return to_urllib3_error(error, url)
+
+        refused = convert(aiohttp.ClientConnectorError(key, ConnectionRefusedError(111, 'Connection refused')))
+        unknown_host = convert(aiohttp.ClientConnectorError(key, socket.gaierror(-2, 'Name or service not known')))
+
+        assert report_error(refused) == 'connection-refused'
+        assert report_error(unknown_host) == 'unknown-host'
+        assert report_error(convert(asyncio.TimeoutError())) == 'read-timeout'
+        assert report_error(convert(aiohttp.ServerDisconnectedError())) == 'connection-error'
+
+        if hasattr(aiohttp, 'ConnectionTimeoutError'):
+            assert report_error(convert(aiohttp.ConnectionTimeoutError())) == 'connect-timeout'
+
+        # Converted errors are retried as the ones of the threads engine
+        assert classify_retryable_error(convert(asyncio.TimeoutError())) == 'read-timeout'
+        assert classify_retryable_error(refused) is None
+
+        error = ValueError()
+        assert convert(error) is error
@@ -0,0 +1,242 @@
+# =============================================================================
+# Minet CLI Actions Unit Tests
+# =============================================================================
+import csv
+import time
+import json
+import pytest
+import importlib
+
+from minet.cli.__main__ import build_parser
+from minet.cli.commands import MINET_COMMANDS
+from minet.cli.crowdtangle import summary, utils as crowdtangle_utils
+from minet.crowdtangle.constants import (
+    CROWDTANGLE_SUMMARY_CSV_HEADERS,
+    CROWDTANGLE_POST_CSV_HEADERS,
+    CROWDTANGLE_LEADERBOARD_CSV_HEADERS_WITH_BREAKDOWN
+)
+
+PARSER, SUBPARSER_INDEX = build_parser(MINET_COMMANDS)
+
+
+def run(*args):
+    namespace = PARSER.parse_args([str(arg) for arg in args])
+    command = SUBPARSER_INDEX[namespace.action]['command']
+
+    m = importlib.import_module(command['package'])
+    getattr(m, command['action'])(namespace)
+
+
+def read_csv(path):
+    with open(str(path)) as f:
+        return list(csv.DictReader(f))
+
+
+class TestScrapeAction(object):
+    def test_processes(self, tmp_path):
+        content = tmp_path / 'content'
+        content.mkdir()
+
+        report = tmp_path / 'report.csv'
+        definition = tmp_path / 'scraper.json'
+
+        with open(str(report), 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'status', 'filename', 'encoding'])
+
+            for i in range(100):
+                (content / ('%i.html' % i)).write_text('<h1>Page %i</h1>' % i)
+                writer.writerow([i * 2, 200, '%i.html' % i, 'utf-8'])
+
+        with open(str(definition), 'w') as f:
+            json.dump({
+                'fields': {
+                    'title': {
+                        'sel': 'h1'
+                    },
+                    'id': {
+                        'eval': 'context["line"]["id"]'
+                    }
+                }
+            }, f)
+
+        outputs = []
+
+        for processes in [1, 2]:
+            output = tmp_path / ('output-%i.csv' % processes)
+
+            run(
+                'scrape', definition, report,
+                '-i', content,
+                '-o', output,
+                '-p', processes
+            )
+
+            outputs.append(sorted(read_csv(output), key=lambda row: int(row['id'])))
+
+        assert outputs[0] == outputs[1]
+        assert len(outputs[0]) == 100
+        assert outputs[0][7] == {'title': 'Page 7', 'id': '14'}
+
+
+class FakeCrowdTangleClient(object):
+    calls = []
+
+    def __init__(self, token, **kwargs):
+        pass
+
+    def summary(self, link, with_top_posts=False, **kwargs):
+        FakeCrowdTangleClient.calls.append(link)
+
+        # NOTE: making later links complete first
+        time.sleep(0.01 * (10 - int(link.rsplit('/', 1)[-1]) % 10))
+
+        stats = [link] + ['0'] * (len(CROWDTANGLE_SUMMARY_CSV_HEADERS) - 1)
+        posts = [
+            ['%s-%i' % (link, i), link] + [''] * (len(CROWDTANGLE_POST_CSV_HEADERS) - 2)
+            for i in range(2)
+        ]
+
+        return stats, posts
+
+
+class FakeCrowdTangleLeaderboardClient(object):
+    kwargs = None
+
+    def __init__(self, token, **kwargs):
+        pass
+
+    def leaderboard(self, **kwargs):
+        FakeCrowdTangleLeaderboardClient.kwargs = kwargs
+
+        for page in range(2):
+            yield None, [
+                ['%i-%i' % (page, i)] + [''] * (len(CROWDTANGLE_LEADERBOARD_CSV_HEADERS_WITH_BREAKDOWN) - 1)
+                for i in range(3)
+            ]
+
+
+class TestCrowdTangleLeaderboardAction(object):
+    def test_leaderboard(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(crowdtangle_utils, 'CrowdTangleClient', FakeCrowdTangleLeaderboardClient)
+
+        output = tmp_path / 'output.csv'
+
+        run('crowdtangle', 'leaderboard', '--token', 'token', '-o', output)
+
+        rows = read_csv(output)
+
+        assert [row['ct_id'] for row in rows] == ['0-0', '0-1', '0-2', '1-0', '1-1', '1-2']
+        assert FakeCrowdTangleLeaderboardClient.kwargs['threads'] == 1
+
+
+class TestCrowdTangleSummaryAction(object):
+    def test_resume(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(summary, 'CrowdTangleClient', FakeCrowdTangleClient)
+
+        urls = ['http://lemonde.fr/%i' % i for i in range(20)]
+        links = tmp_path / 'links.csv'
+        output = tmp_path / 'output.csv'
+        posts = tmp_path / 'posts.csv'
+
+        links.write_text('url\n' + '\n'.join(urls) + '\n')
+
+        def summarize(*args):
+            FakeCrowdTangleClient.calls = []
+
+            run(
+                'crowdtangle', 'summary', 'url', links,
+                '--token', 'token',
+                '-o', output,
+                '--start-date', '2020-01-01',
+                '--posts', posts,
+                '--threads', 4,
+                *args
+            )
+
+        # Rows are written in input order
+        summarize()
+
+        rows = read_csv(output)
+        expected_posts = read_csv(posts)
+
+        assert [row['url'] for row in rows] == urls
+        assert [row[CROWDTANGLE_SUMMARY_CSV_HEADERS[0]] for row in rows] == urls
+        assert len(expected_posts) == 40
+        # Posts are prefixed with their link
+        assert [post['url'] for post in expected_posts[:3]] == [urls[0], urls[0], urls[1]]
+        assert [post['ct_id'] for post in expected_posts[:3]] == [urls[0] + '-0', urls[0] + '-1', urls[1] + '-0']
+
+        # Interrupted after the posts of row 12 were written, but not the row
+        with open(str(output)) as f:
+            lines = f.readlines()
+
+        with open(str(output), 'w') as f:
+            f.writelines(lines[:13])
+
+        with open(str(posts)) as f:
+            lines = f.readlines()
+
+        with open(str(posts), 'w') as f:
+            f.writelines(lines[:27])
+
+        summarize('--resume')
+
+        assert FakeCrowdTangleClient.calls == urls[12:]
+        assert read_csv(output) == rows
+        assert read_csv(posts) == expected_posts
+
+    def test_resume_without_output(self, tmp_path, monkeypatch, capfd):
+        monkeypatch.setattr(summary, 'CrowdTangleClient', FakeCrowdTangleClient)
+
+        links = tmp_path / 'links.csv'
+        posts = tmp_path / 'posts.csv'
+
+        links.write_text('url\nhttp://lemonde.fr/1\n')
+        posts.write_text('')
+
+        with pytest.raises(SystemExit):
+            run(
+                'crowdtangle', 'summary', 'url', links,
+                '--token', 'token',
+                '--start-date', '2020-01-01',
+                '--posts', posts,
+                '--resume'
+            )
+
+        assert 'Cannot --resume' in capfd.readouterr().err
+        assert posts.read_text() == ''
+
+
+class TestUrlActions(object):
+    def test_processes(self, tmp_path):
+        urls = tmp_path / 'urls.csv'
+        texts = tmp_path / 'texts.csv'
+
+        with open(str(urls), 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'url'])
+
+            for i in range(3000):
+                writer.writerow([i, 'https://www.lemonde.fr/article-%i.html?utm_source=%i#top' % (i, i % 7)])
+
+        with open(str(texts), 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'text'])
+
+            for i in range(3000):
+                writer.writerow([i, 'See http://lemonde.fr/%i and www.liberation.fr/%i.' % (i, i) if i % 3 else 'Nothing'])
+
+        for action, column, path in [('url-parse', 'url', urls), ('url-extract', 'text', texts)]:
+            outputs = []
+
+            for processes in [1, 2]:
+                output = tmp_path / ('%s-%i.csv' % (action, processes))
+
+                run(action, column, path, '-o', output, '-p', processes)
+
+                with open(str(output)) as f:
+                    outputs.append(f.read())
+
+            assert outputs[0] == outputs[1]
+            assert outputs[0].count('\n') > 2000
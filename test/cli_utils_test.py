@@ -0,0 +1,279 @@
+# =============================================================================
+# Minet CLI Utils Unit Tests
+# =============================================================================
+import io
+import csv
+import pytest
+import atexit
+import codecs
+from tqdm import tqdm
+from multiprocessing import Pool
+
+from minet.cli.utils import (
+    custom_reader,
+    ByteOffsetLineReader,
+    ResumeCheckpoint,
+    DummyTqdmFile,
+    BufferedStdoutFile,
+    imap_chunks
+)
+from minet.contiguous_range_set import ContiguousRangeSet
+from minet.defaults import DEFAULT_PENDING_CHUNKS_PER_PROCESS
+
+CSV = (
+    'url,name\r\n'
+    'http://lemonde.fr,"Le\r\nMonde"\r\n'
+    'http://liberation.fr,Libé\r\n'
+    'http://lefigaro.fr,Figaro\r\n'
+)
+
+
+def read_tracked(path, encoding='utf-8'):
+    tracker = ByteOffsetLineReader(path, encoding=encoding)
+    headers, pos, reader = custom_reader(tracker, 'url')
+
+    rows = []
+
+    for row in reader:
+        rows.append((row, tracker.offset))
+
+    return tracker, headers, rows
+
+
+class TestByteOffsetLineReader(object):
+    def test_offsets(self, tmp_path):
+        path = str(tmp_path / 'input.csv')
+
+        for prefix in [b'', codecs.BOM_UTF8]:
+            data = prefix + CSV.encode('utf-8')
+
+            with open(path, 'wb') as f:
+                f.write(data)
+
+            tracker, headers, rows = read_tracked(path)
+
+            assert headers == ['url', 'name']
+            assert [row for row, _ in rows] == list(csv.reader(CSV.splitlines(True)))[1:]
+            assert rows[-1][1] == len(data)
+
+            # Seeking by byte offset must yield the same rows
+            for i, (_, offset) in enumerate(rows[:-1]):
+                tracker.seek(offset)
+
+                assert next(csv.reader(tracker)) == rows[i + 1][0]
+                assert tracker.offset == rows[i + 1][1]
+
+            tracker.close()
+
+    def test_encoding(self, tmp_path):
+        path = str(tmp_path / 'input.csv')
+
+        with open(path, 'wb') as f:
+            f.write(CSV.encode('latin-1'))
+
+        tracker, _, rows = read_tracked(path, encoding='latin-1')
+
+        assert rows[1][0] == ['http://liberation.fr', 'Libé']
+        tracker.close()
+
+        # Encodings where newlines are not single ascii bytes are rejected
+        assert ByteOffsetLineReader.supports('utf-8-sig')
+        assert ByteOffsetLineReader.supports('cp1252')
+
+        for encoding in ['utf-16', 'utf-16-le', 'utf-32', 'unknown']:
+            assert not ByteOffsetLineReader.supports(encoding)
+
+            with pytest.raises(TypeError):
+                ByteOffsetLineReader(path, encoding=encoding)
+
+
+class TestResumeCheckpoint(object):
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / 'report.csv.checkpoint')
+
+        assert ResumeCheckpoint.load(path) is None
+
+        checkpoint = ResumeCheckpoint(path)
+
+        for i, offset in enumerate([10, 25, 40, 52]):
+            checkpoint.track(i, offset)
+
+        checkpoint.add(0)
+        checkpoint.add(1)
+        checkpoint.add(3)
+
+        with open(str(tmp_path / 'report.csv'), 'w') as report:
+            report.write('line\n0\n1\n3\n')
+            checkpoint.save(report)
+
+        done, report_offset, prefix, input_offset = ResumeCheckpoint.load(path)
+
+        assert list(done) == [0, 1, 3]
+        assert report_offset == 11
+        assert prefix == 2
+        assert input_offset == 40
+
+        # Only offsets of lines not done yet are kept
+        assert checkpoint.input_offsets == {2: 40}
+
+        # Even when an early line never gets done
+        for i in range(4, 1000):
+            checkpoint.track(i, i * 10)
+            checkpoint.add(i)
+
+        assert checkpoint.input_offsets == {2: 40}
+
+        # Nothing done from the start
+        checkpoint = ResumeCheckpoint(path)
+        checkpoint.add(1)
+
+        with open(str(tmp_path / 'report.csv'), 'w') as report:
+            checkpoint.save(report)
+
+        assert ResumeCheckpoint.load(path)[2:] == (0, -1)
+
+    def test_invalid(self, tmp_path):
+        path = str(tmp_path / 'report.csv.checkpoint')
+        report_path = str(tmp_path / 'report.csv')
+
+        checkpoint = ResumeCheckpoint(path)
+        checkpoint.done = ContiguousRangeSet.from_indices(range(100))
+
+        with open(report_path, 'w') as report:
+            report.write('line\n' + ''.join('%i\n' % i for i in range(100)))
+            checkpoint.save(report)
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        # Truncated or corrupt sidecar
+        for corrupt in [data[:-3], data[:10], b'', b'x' * len(data)]:
+            with open(path, 'wb') as f:
+                f.write(corrupt)
+
+            assert ResumeCheckpoint.load(path) is None
+
+        # Report truncated back to the checkpointed size, or before it
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        report_offset = ResumeCheckpoint.load(path)[1]
+
+        assert ResumeCheckpoint.load(path, report_size=report_offset) is not None
+        assert ResumeCheckpoint.load(path, report_size=report_offset - 1) is None
+
+        ResumeCheckpoint.remove(path)
+        ResumeCheckpoint.remove(path)
+
+        assert ResumeCheckpoint.load(path) is None
+
+
+ROWS = [['url', 'name'], ['http://lemonde.fr', 'Le "Monde"'], ['http://liberation.fr', 'Libé\nration']]
+
+
+def track_atexit(monkeypatch):
+    registered = []
+
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    monkeypatch.setattr(atexit, 'unregister', registered.remove)
+
+    return registered
+
+
+class TestOutputFiles(object):
+    def test_dummy_tqdm_file(self, monkeypatch):
+        registered = track_atexit(monkeypatch)
+
+        output = io.StringIO()
+        f = DummyTqdmFile(output, interval=60)
+
+        assert f.flush in registered
+
+        # Lines are handed over to tqdm at most every interval
+        f.write('one\n')
+        f.write('two\n')
+
+        assert output.getvalue() == ''
+
+        f.last_write_time -= 60
+        f.write('three\n')
+
+        assert output.getvalue() == 'one\ntwo\nthree\n'
+        assert f.tell() == 3
+
+        # Pending lines are flushed on close
+        f.write('four\n')
+
+        assert output.getvalue() == 'one\ntwo\nthree\n'
+
+        f.close()
+
+        assert output.getvalue() == 'one\ntwo\nthree\nfour\n'
+        assert f.flush not in registered
+
+    def test_buffered_stdout_file(self, monkeypatch, capfdbinary):
+        registered = track_atexit(monkeypatch)
+
+        # What the former path, writing every row through tqdm, would output
+        expected = io.StringIO()
+
+        class TqdmFile(object):
+            def write(self, x):
+                tqdm.write(x, file=expected, end='')
+
+        writer = csv.writer(TqdmFile())
+
+        for row in ROWS:
+            writer.writerow(row)
+
+        f = BufferedStdoutFile()
+        writer = csv.writer(f)
+
+        for row in ROWS:
+            writer.writerow(row)
+
+        assert f.flush in registered
+        assert f.tell() == len(ROWS)
+
+        f.close()
+
+        assert capfdbinary.readouterr().out == expected.getvalue().encode(f.file.encoding)
+        assert f.flush not in registered
+
+
+def square_all(numbers):
+    return [n * n for n in numbers]
+
+
+class TestImapChunks(object):
+    def test_imap_chunks(self):
+        processes = 2
+        max_ahead = processes * DEFAULT_PENDING_CHUNKS_PER_PROCESS
+
+        with Pool(processes) as pool:
+            for p in [None, pool]:
+                consumed = []
+
+                def numbers():
+                    for i in range(100):
+                        consumed.append(i)
+                        yield {'n': i}
+
+                results = []
+
+                chunks = imap_chunks(
+                    p,
+                    square_all,
+                    numbers(),
+                    key=lambda item: item['n'],
+                    chunksize=3,
+                    processes=processes
+                )
+
+                for chunk, squares in chunks:
+                    results.extend(zip(chunk, squares))
+
+                    # The input is only consumed a bounded number of chunks ahead
+                    assert len(consumed) <= len(results) + max_ahead * 3
+
+                assert results == [({'n': i}, i * i) for i in range(100)]
@@ -79,3 +79,46 @@ class TestContiguousRangeSet(object):
         s.add(10)
 
         assert len(s) == 7
+
+    def test_from_indices(self):
+        s = ContiguousRangeSet.from_indices([7, 1, 2, 10, 3, 6, 2, 0])
+
+        assert s.intervals == [(0, 3), (6, 7), (10, 10)]
+        assert len(s) == 7
+
+        assert ContiguousRangeSet.from_indices(i for i in [5, 4]).intervals == [(4, 5)]
+        assert len(ContiguousRangeSet.from_indices([])) == 0
+
+    def test_contains(self):
+        s = ContiguousRangeSet.from_indices([0, 1, 2, 5, 6, 7, 10])
+
+        assert 10 in s
+        assert 1 in s
+        assert 6 in s
+        assert 3 not in s
+        assert -1 not in s
+        assert 11 not in s
+
+        assert not s.add(6)
+        assert s.add(4)
+        assert s.intervals == [(0, 2), (4, 7), (10, 10)]
+        assert len(s) == 8
+
+    def test_union_intersection(self):
+        a = ContiguousRangeSet.from_indices([0, 1, 2, 5, 6, 7, 10])
+        b = ContiguousRangeSet.from_indices([2, 3, 7, 8, 12])
+
+        assert (a | b).intervals == [(0, 3), (5, 8), (10, 10), (12, 12)]
+        assert (a & b).intervals == [(2, 2), (7, 7)]
+        assert len(a | b) == 10
+
+    def test_persistence(self, tmp_path):
+        s = ContiguousRangeSet.from_indices([0, 1, 2, 5, 6, 7, 10, 2 ** 40])
+        path = str(tmp_path / 'done.bin')
+
+        s.save(path)
+
+        loaded = ContiguousRangeSet.load(path)
+
+        assert loaded == s
+        assert len(loaded) == len(s)
@@ -0,0 +1,113 @@
+# =============================================================================
+# Minet CrowdTangle Unit Tests
+# =============================================================================
+import time
+from urllib.parse import urlsplit, parse_qs
+
+from minet.crowdtangle.utils import (
+    day_range,
+    iterate_pages,
+    iterate_day_pages_concurrently,
+    default_item_id_getter,
+    PartitionStrategyDay,
+    CrowdTangleExhaustedPagination,
+    DAY_PAGES_BUFFER_SIZE
+)
+
+
+def url_forge(start_date=None, end_date=None, **kwargs):
+    return 'https://api.crowdtangle.com/posts?startDate=%s&endDate=%s' % (start_date, end_date)
+
+
+def fake_step(http, url, item_key):
+    query = parse_qs(urlsplit(url).query)
+    day = query['startDate'][0]
+    page = int(query.get('page', ['0'])[0])
+
+    if day == '2020-01-02':
+        raise CrowdTangleExhaustedPagination
+
+    items = [{'id': '%s-%i-%i' % (day, page, i)} for i in range(2)]
+    next_page = (url + '&page=1') if page == 0 else None
+
+    return items, next_page
+
+
+class TestCrowdTangle(object):
+    def test_day_range(self):
+        assert list(day_range('2020-01-01', '2020-01-03')) == [
+            ('2020-01-02', '2020-01-03'),
+            ('2020-01-01', '2020-01-02')
+        ]
+
+        assert list(day_range('2020-01-01', '2020-01-02T12:00:00')) == [
+            ('2020-01-02', '2020-01-02T12:00:00'),
+            ('2020-01-01', '2020-01-02')
+        ]
+
+        assert list(day_range('2020-01-01T06:00:00', '2020-01-02')) == [
+            ('2020-01-01T06:00:00', '2020-01-02')
+        ]
+
+    def test_concurrent_days(self):
+        kwargs = {'start_date': '2019-12-30', 'end_date': '2020-01-04'}
+
+        sequential = list(iterate_pages(
+            fake_step,
+            None,
+            PartitionStrategyDay(dict(kwargs), url_forge),
+            'posts',
+            default_item_id_getter
+        ))
+
+        concurrent = list(iterate_day_pages_concurrently(
+            fake_step,
+            None,
+            kwargs,
+            url_forge,
+            'posts',
+            default_item_id_getter,
+            threads=3
+        ))
+
+        assert len(concurrent) == 8
+        assert concurrent == sequential
+        assert concurrent[0] == ({'day': '2020-01-03'}, [{'id': '2020-01-03-0-0'}, {'id': '2020-01-03-0-1'}])
+
+    def test_concurrent_days_streaming(self):
+        calls = []
+
+        def endless_step(http, url, item_key):
+            calls.append(url)
+
+            return [{'id': '%s-%i' % (url, len(calls))}], url + '&page=n'
+
+        pages = iterate_day_pages_concurrently(
+            endless_step,
+            None,
+            {'start_date': '2019-01-01', 'end_date': '2020-01-01'},
+            url_forge,
+            'posts',
+            default_item_id_getter,
+            threads=3
+        )
+
+        details, _ = next(pages)
+
+        assert details == {'day': '2019-12-31'}
+
+        # Threads only run a bounded number of pages ahead of the consumer
+        time.sleep(0.2)
+
+        assert len(calls) <= 3 * (DAY_PAGES_BUFFER_SIZE + 1) + 1
+
+        for _ in range(10):
+            assert next(pages)[0] == {'day': '2019-12-31'}
+
+        # And stop paginating once the consumer is done
+        pages.close()
+        time.sleep(0.1)
+        n = len(calls)
+        time.sleep(0.2)
+
+        assert len(calls) == n
@@ -0,0 +1,171 @@
+# =============================================================================
+# Minet Deduplicator Unit Tests
+# =============================================================================
+import pytest
+from threading import Thread
+
+from minet.dedupe import Deduplicator, dedupe_key
+from minet.fetch import create_retry_queue, multithreaded_resolve
+from minet.exceptions import InvalidURLError
+
+
+def identity(x):
+    return x
+
+
+class TestDedupe(object):
+    def test_validation(self):
+        with pytest.raises(TypeError):
+            Deduplicator(max_size=-1)
+
+        with pytest.raises(TypeError):
+            Deduplicator(max_ready=0)
+
+    def test_dedupe_key(self):
+        assert dedupe_key('http://www.lemonde.fr/') == dedupe_key('http://lemonde.fr')
+        assert dedupe_key('http://lemonde.fr') != dedupe_key('https://lemonde.fr')
+        assert dedupe_key('http://lemonde.fr/#a') != dedupe_key('http://lemonde.fr/#b')
+        assert dedupe_key('http://en.wikipedia.org') != dedupe_key('http://fr.wikipedia.org')
+
+    def test_deduplicator(self):
+        dedupe = Deduplicator(max_size=1)
+
+        urls = iter([
+            'http://lemonde.fr',
+            'http://www.lemonde.fr/',
+            None,
+            'http://liberation.fr',
+            'http://lemonde.fr',
+            'http://liberation.fr',
+            'http://lemonde.fr'
+        ])
+
+        processed = dedupe.filter(urls, url=identity)
+
+        # Duplicates of a url being processed wait for its result
+        assert next(processed) == 'http://lemonde.fr'
+        assert next(processed) is None
+        assert next(processed) == 'http://liberation.fr'
+        assert dedupe.stats.joined == 1
+
+        assert dedupe.complete('http://lemonde.fr', 'lemonde') == ['http://www.lemonde.fr/']
+        assert dedupe.complete('http://liberation.fr', 'liberation') == []
+
+        # Later duplicates are served from the cache, within its size
+        assert list(processed) == ['http://lemonde.fr']
+        assert dedupe.complete('http://lemonde.fr', 'lemonde') == ['http://lemonde.fr']
+        assert dedupe.drain() == [('http://liberation.fr', 'liberation')]
+        assert dedupe.drain() == []
+
+        assert dedupe.stats.to_dict() == {
+            'processed': 3,
+            'joined': 2,
+            'cached': 1,
+            'evicted': 2,
+            'duplicate_rate': 0.5
+        }
+
+    def test_fan_out(self):
+        dedupe = Deduplicator()
+
+        def results():
+            for url in dedupe.filter(['a', 'b', 'a', 'a', 'c'], url=identity):
+                yield (url, url.upper())
+
+        def copy(result, url):
+            return (url, result[1])
+
+        fanned_out = list(dedupe.fan_out(results(), url=lambda r: r[0], copy=copy))
+
+        assert sorted(fanned_out) == [('a', 'A'), ('a', 'A'), ('a', 'A'), ('b', 'B'), ('c', 'C')]
+
+    def test_multithreaded_resolve(self):
+        dedupe = Deduplicator()
+
+        items = [{'url': 'ttps://lemonde.fr' if i % 3 else None, 'id': i} for i in range(30)]
+
+        results = sorted(
+            multithreaded_resolve(items, key=lambda x: x['url'], throttle=0, dedupe=dedupe),
+            key=lambda r: r.item['id']
+        )
+
+        assert [r.item['id'] for r in results] == list(range(30))
+
+        for result in results:
+            if result.item['url'] is None:
+                assert result.url is None
+            else:
+                assert result.url == 'ttps://lemonde.fr'
+                assert type(result.error) is InvalidURLError
+
+        assert dedupe.stats.processed == 1
+        assert dedupe.stats.duplicates == 19
+
+    def test_max_ready(self):
+        dedupe = Deduplicator(max_ready=2)
+        consumed = []
+
+        def urls():
+            for url in ['a', 'a', 'a', 'a', 'a', 'b']:
+                consumed.append(url)
+                yield url
+
+        processed = dedupe.filter(urls(), url=identity)
+
+        # Without any result to come, the consumer must not be starved
+        assert next(processed) == 'a'
+        dedupe.complete('a', 'A')
+        dedupe.acknowledge()
+
+        assert next(processed) == 'a'
+        assert len(consumed) == 4
+        assert len(dedupe.ready) == 2
+
+        # Otherwise, the filter waits for cached duplicates to be drained
+        thread = Thread(target=lambda: consumed.append(next(processed)))
+        thread.start()
+        thread.join(0.1)
+
+        assert thread.is_alive()
+        assert len(consumed) == 5
+
+        assert len(dedupe.drain()) == 2
+        thread.join(1)
+
+        assert not thread.is_alive()
+        assert consumed[-1] == 'b'
+        assert dedupe.stats.processed == 3
+
+    def test_retries(self):
+        dedupe = Deduplicator(max_ready=1)
+        retry_queue = create_retry_queue(
+            dedupe.filter(['a', 'b', 'a', 'a'], url=identity),
+            dedupe
+        )
+
+        items = iter(retry_queue)
+
+        assert next(items) == 'a'
+        assert next(items) == 'b'
+
+        # The result of a was consumed while b waits for its retry
+        dedupe.complete('a', 'A')
+        dedupe.acknowledge()
+        retry_queue.done('a')
+        retry_queue.retry('b', 0.2)
+
+        # NOTE: the filter used to wait for the retry of b, which can only come
+        # back through the very iterator it is blocking
+        consumed = []
+        thread = Thread(target=lambda: consumed.append(next(items)), daemon=True)
+        thread.start()
+        thread.join(1)
+
+        assert not thread.is_alive()
+        assert consumed == ['a']
+        assert dedupe.drain() == [('a', 'A')]
+
+        retry_queue.done('a')
+
+        assert next(items) == 'b'
+        assert dedupe.outstanding == 2
@@ -0,0 +1,126 @@
+# =============================================================================
+# Minet DNS Cache Unit Tests
+# =============================================================================
+import time
+import socket
+import pytest
+from threading import Thread
+
+from minet.dns import DNSCache, get_hostname
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResolver(object):
+    def __init__(self, delay=0):
+        self.calls = []
+        self.delay = delay
+
+    def __call__(self, host, port, family=0, type=0):
+        self.calls.append(host)
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        if host.startswith('unknown'):
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+
+        return [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 0)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.2', 0)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 0))
+        ]
+
+
+class TestDNS(object):
+    def test_get_hostname(self):
+        assert get_hostname('https://www.LeMonde.fr./page') == 'www.lemonde.fr'
+        assert get_hostname('http://[::1]:8000/') == '::1'
+        assert get_hostname('lemonde') is None
+        assert get_hostname(None) is None
+
+    def test_cache(self):
+        clock = FakeClock()
+        resolver = FakeResolver()
+        dns = DNSCache(ttl=10, negative_ttl=1, max_size=2, resolver=resolver, clock=clock)
+
+        assert dns.resolve('lemonde.fr') == ['10.0.0.1', '10.0.0.2']
+        assert dns.resolve('lemonde.fr') == ['10.0.0.1', '10.0.0.2']
+        assert resolver.calls == ['lemonde.fr']
+
+        # Failed lookups are cached for a shorter time
+        for _ in range(2):
+            with pytest.raises(socket.gaierror):
+                dns.resolve('unknown.fr')
+
+        assert resolver.calls == ['lemonde.fr', 'unknown.fr']
+
+        clock.now = 5
+
+        with pytest.raises(socket.gaierror):
+            dns.resolve('unknown.fr')
+
+        dns.resolve('lemonde.fr')
+
+        assert resolver.calls == ['lemonde.fr', 'unknown.fr', 'unknown.fr']
+
+        # Lookups expire
+        clock.now = 20
+        dns.resolve('lemonde.fr')
+
+        assert resolver.calls[-1] == 'lemonde.fr'
+
+        # Least recently used hostnames are evicted
+        dns.resolve('liberation.fr')
+
+        assert list(dns.entries) == ['lemonde.fr', 'liberation.fr']
+
+        assert dns.stats.to_dict()['hits'] == 2
+        assert dns.stats.negative_hits == 1
+        assert dns.stats.misses == 5
+        assert dns.stats.failures == 2
+        assert dns.stats.evicted == 1
+
+    def test_concurrency(self):
+        resolver = FakeResolver(delay=0.1)
+        dns = DNSCache(resolver=resolver)
+
+        threads = [Thread(target=dns.resolve, args=('lemonde.fr',)) for _ in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert resolver.calls == ['lemonde.fr']
+        assert dns.stats.misses == 1
+        assert dns.stats.waits == 3
+
+    def test_prefetch(self):
+        resolver = FakeResolver()
+        dns = DNSCache(resolver=resolver)
+
+        urls = ['https://lemonde.fr/1', 'https://lemonde.fr/2', 'https://liberation.fr', 'http://127.0.0.1/']
+
+        assert list(dns.lookahead(urls, size=2)) == urls
+
+        for _ in range(100):
+            if dns.stats.prefetches == 2:
+                break
+
+            time.sleep(0.01)
+
+        assert sorted(resolver.calls) == ['lemonde.fr', 'liberation.fr']
+
+        dns.resolve('lemonde.fr')
+        dns.resolve('lemonde.fr')
+
+        assert dns.stats.prefetch_hits == 1
+        assert len(resolver.calls) == 2
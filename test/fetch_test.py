@@ -2,8 +2,10 @@
 # Minet Fetch Unit Tests
 # =============================================================================
 import pytest
-from minet.utils import create_pool, request
-from minet.exceptions import InvalidURLError
+from io import BytesIO
+from urllib3 import HTTPResponse
+from minet.utils import create_pool, request, stream_response
+from minet.exceptions import InvalidURLError, ResponseTooLargeError
 
 
 class TestFetch(object):
@@ -13,3 +15,41 @@ class TestFetch(object):
         err, _ = request(http, 'ttps://lemonde.fr')
 
         assert type(err) is InvalidURLError
+
+    def test_async_fetch(self):
+        from minet.async_fetch import async_fetch
+
+        items = [
+            {'url': None, 'id': 0},
+            {'url': 'ttps://lemonde.fr', 'id': 1},
+            {'url': '', 'id': 2}
+        ]
+
+        results = sorted(
+            async_fetch(items, key=lambda x: x['url'], throttle=0),
+            key=lambda r: r.item['id']
+        )
+
+        assert [r.item['id'] for r in results] == [0, 1, 2]
+        assert results[0].url is None and results[0].error is None
+        assert type(results[1].error) is InvalidURLError
+        assert results[2].response is None
+
+    def test_stream_response(self):
+        def response(body, headers=None):
+            return HTTPResponse(
+                body=BytesIO(body),
+                headers=headers,
+                preload_content=False
+            )
+
+        body = b'a' * 1000
+
+        assert b''.join(stream_response(response(body), chunk_size=64)) == body
+        assert b''.join(stream_response(response(body), max_body_size=1000)) == body
+
+        with pytest.raises(ResponseTooLargeError):
+            b''.join(stream_response(response(body), max_body_size=999, chunk_size=64))
+
+        with pytest.raises(ResponseTooLargeError):
+            next(stream_response(response(body, {'Content-Length': '1000'}), max_body_size=10))
@@ -0,0 +1,232 @@
+# =============================================================================
+# Minet Crawl Frontier Unit Tests
+# =============================================================================
+import time
+from threading import Thread
+
+from minet.crawl import CrawlJob
+from minet.frontier import MemoryFrontier, SQLiteFrontier
+
+
+class TestFrontier(object):
+    def test_memory(self):
+        frontier = MemoryFrontier()
+
+        assert frontier.put(CrawlJob('https://www.lemonde.fr/page'))
+        assert not frontier.put(CrawlJob('http://lemonde.fr/page/#top'))
+        assert frontier.put(CrawlJob('https://www.lemonde.fr/page', spider='other'))
+
+        assert frontier.put_many([
+            CrawlJob('https://www.lemonde.fr/other'),
+            CrawlJob('https://www.lemonde.fr/other')
+        ]) == 1
+
+        assert frontier.qsize() == 3
+
+        job = frontier.get()
+
+        assert job.url == 'https://www.lemonde.fr/page'
+        assert frontier.stats.to_dict() == {'pending': 2, 'in_flight': 1, 'done': 0}
+
+        frontier.done(job)
+
+        assert frontier.stats.to_dict() == {'pending': 2, 'in_flight': 0, 'done': 1}
+        assert not frontier.put(job)
+
+    def test_sqlite(self, tmp_path):
+        path = str(tmp_path / 'frontier.sqlite')
+        frontier = SQLiteFrontier(path)
+
+        assert frontier.put_many([
+            CrawlJob('https://www.lemonde.fr/1', data={'n': 1}),
+            CrawlJob('https://www.lemonde.fr/2', data={'n': 2}),
+            CrawlJob('https://lemonde.fr/1'),
+            CrawlJob('https://www.lemonde.fr/3')
+        ]) == 3
+
+        first = frontier.get()
+        frontier.done(first)
+
+        second = frontier.get()
+
+        assert first.data == {'n': 1}
+        assert second.data == {'n': 2}
+
+        # Simulating an interrupted crawl
+        frontier.close()
+        frontier = SQLiteFrontier(path)
+
+        assert frontier.stats.to_dict() == {'pending': 2, 'in_flight': 0, 'done': 1}
+        assert not frontier.put(CrawlJob('https://www.lemonde.fr/1'))
+        assert frontier.get().url == 'https://www.lemonde.fr/2'
+        assert frontier.get().url == 'https://www.lemonde.fr/3'
+        assert frontier.qsize() == 0
+
+        frontier.close()
+
+    def test_scheduling(self):
+        frontier = MemoryFrontier(throttle=0.2, parallelism=1)
+
+        frontier.put_many([
+            CrawlJob('https://www.lemonde.fr/1'),
+            CrawlJob('https://www.lemonde.fr/2'),
+            CrawlJob('https://www.lemonde.fr/3', priority=5),
+            CrawlJob('https://www.lefigaro.fr/1', level=1),
+            CrawlJob('https://www.lefigaro.fr/2'),
+            CrawlJob('https://www.liberation.fr/1')
+        ])
+
+        start = time.time()
+        urls = [frontier.get().url for _ in range(4)]
+
+        # Domains are served round-robin, and by priority & level, once ready
+        assert time.time() - start >= 0.2
+        assert urls == [
+            'https://www.lemonde.fr/3',
+            'https://www.lefigaro.fr/2',
+            'https://www.liberation.fr/1',
+            'https://www.lemonde.fr/1'
+        ]
+
+    def test_sqlite_scheduling(self, tmp_path):
+        frontier = SQLiteFrontier(str(tmp_path / 'frontier.sqlite'), throttle=0.2)
+
+        frontier.put_many([
+            CrawlJob('https://www.lemonde.fr/1'),
+            CrawlJob('https://www.lemonde.fr/2', priority=1),
+            CrawlJob('https://www.lefigaro.fr/1')
+        ])
+
+        urls = [frontier.get().url for _ in range(3)]
+
+        assert urls == [
+            'https://www.lemonde.fr/2',
+            'https://www.lefigaro.fr/1',
+            'https://www.lemonde.fr/1'
+        ]
+
+        frontier.close()
+
+    def test_priority_across_domains(self, tmp_path):
+        frontiers = [
+            MemoryFrontier(throttle=0),
+            SQLiteFrontier(str(tmp_path / 'frontier.sqlite'), throttle=0)
+        ]
+
+        for frontier in frontiers:
+            frontier.put_many([
+                CrawlJob('https://www.lemonde.fr/1'),
+                CrawlJob('https://www.lemonde.fr/2'),
+                CrawlJob('https://www.lefigaro.fr/1'),
+                CrawlJob('https://www.liberation.fr/1', priority=1)
+            ])
+
+            assert frontier.get().url == 'https://www.liberation.fr/1'
+            assert frontier.get().url == 'https://www.lemonde.fr/1'
+
+            # Ready domains are served by their best pending priority
+            frontier.put_many([
+                CrawlJob('https://www.liberation.fr/2', priority=5),
+                CrawlJob('https://www.lemonde.fr/3', priority=3)
+            ])
+
+            assert [frontier.get().url for _ in range(4)] == [
+                'https://www.liberation.fr/2',
+                'https://www.lemonde.fr/3',
+                'https://www.lefigaro.fr/1',
+                'https://www.lemonde.fr/2'
+            ]
+
+            frontier.close()
+
+    def test_throttled_priority(self):
+        frontier = MemoryFrontier(throttle=0.2)
+
+        frontier.put_many([
+            CrawlJob('https://www.lemonde.fr/1', priority=5),
+            CrawlJob('https://www.lemonde.fr/2', priority=5),
+            CrawlJob('https://www.lefigaro.fr/1')
+        ])
+
+        # A domain that is not ready yet does not take precedence
+        assert [frontier.get().url for _ in range(3)] == [
+            'https://www.lemonde.fr/1',
+            'https://www.lefigaro.fr/1',
+            'https://www.lemonde.fr/2'
+        ]
+
+    def test_callable_throttle(self):
+        calls = []
+
+        def throttle(domain, job):
+            calls.append((domain, job.url))
+            return 10 if domain == 'lemonde.fr' else 0
+
+        frontier = MemoryFrontier(throttle=throttle, parallelism=1)
+
+        frontier.put_many([
+            CrawlJob('https://www.lemonde.fr/1'),
+            CrawlJob('https://www.lemonde.fr/2'),
+            CrawlJob('https://www.lefigaro.fr/1')
+        ])
+
+        job = frontier.get()
+        frontier.done(job)
+        job = frontier.get()
+        frontier.done(job)
+
+        assert calls == [
+            ('lemonde.fr', 'https://www.lemonde.fr/1'),
+            ('lefigaro.fr', 'https://www.lefigaro.fr/1')
+        ]
+        assert frontier.scheduler.ready_at['lemonde.fr'] > frontier.scheduler.ready_at['lefigaro.fr'] + 9
+
+    def test_wait_for_ready_domain(self):
+        frontier = MemoryFrontier(throttle=10)
+
+        frontier.put_many([
+            CrawlJob('https://www.lemonde.fr/1'),
+            CrawlJob('https://www.lemonde.fr/2')
+        ])
+
+        assert frontier.get().url == 'https://www.lemonde.fr/1'
+
+        # The next job is held back until its domain is ready, but jobs of
+        # other domains added in the meantime are not
+        urls = []
+        thread = Thread(target=lambda: urls.append(frontier.get().url), daemon=True)
+        thread.start()
+        thread.join(0.1)
+
+        assert thread.is_alive()
+
+        frontier.put(CrawlJob('https://www.lefigaro.fr/1'))
+        thread.join(1)
+
+        assert not thread.is_alive()
+        assert urls == ['https://www.lefigaro.fr/1']
+
+    def test_requeue(self, tmp_path):
+        frontiers = [
+            MemoryFrontier(throttle=0),
+            SQLiteFrontier(str(tmp_path / 'frontier.sqlite'), throttle=0)
+        ]
+
+        for frontier in frontiers:
+            frontier.put_many([
+                CrawlJob('https://www.lemonde.fr/1'),
+                CrawlJob('https://www.lemonde.fr/2'),
+                CrawlJob('https://www.liberation.fr/1')
+            ])
+
+            job = frontier.get()
+
+            assert job.url == 'https://www.lemonde.fr/1'
+
+            # Other domains are preferred while the domain is blocked
+            frontier.requeue(job, 0.2)
+
+            assert frontier.stats.to_dict() == {'pending': 3, 'in_flight': 0, 'done': 0}
+            assert frontier.get().url == 'https://www.liberation.fr/1'
+            assert frontier.get().url == 'https://www.lemonde.fr/1'
+            assert frontier.get().url == 'https://www.lemonde.fr/2'
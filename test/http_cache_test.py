@@ -0,0 +1,193 @@
+# =============================================================================
+# Minet HTTP Cache Unit Tests
+# =============================================================================
+import pytest
+from io import BytesIO
+from threading import Thread
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib3 import HTTPResponse
+
+from minet.http_cache import HTTPCache
+from minet.utils import create_pool, stream_response, InstrumentedHTTPResponse
+from minet.exceptions import ResponseTooLargeError
+
+
+class ChunkedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    calls = 0
+
+    def do_GET(self):
+        ChunkedHandler.calls += 1
+
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        for _ in range(int(self.path.strip('/'))):
+            self.wfile.write(b'a\r\n' + b'x' * 10 + b'\r\n')
+
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def chunked_server():
+    ChunkedHandler.calls = 0
+    server = HTTPServer(('127.0.0.1', 0), ChunkedHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    yield 'http://127.0.0.1:%i' % server.server_port
+
+    server.shutdown()
+    server.server_close()
+
+
+class FakeServer(object):
+    def __init__(self, body, status=200, headers=None):
+        self.body = body
+        self.status = status
+        self.headers = headers or {}
+        self.calls = []
+
+    def __call__(self, method, url, headers=None, **kwargs):
+        self.calls.append(headers or {})
+
+        if self.headers.get('ETag') and (headers or {}).get('If-None-Match') == self.headers['ETag']:
+            return HTTPResponse(
+                body=BytesIO(b''),
+                status=304,
+                headers=self.headers,
+                preload_content=False
+            )
+
+        return HTTPResponse(
+            body=BytesIO(self.body),
+            status=self.status,
+            headers=self.headers,
+            preload_content=False
+        )
+
+
+class TestHTTPCache(object):
+    def test_basics(self, tmp_path):
+        cache = HTTPCache(str(tmp_path))
+        server = FakeServer(b'hello')
+
+        for _ in range(3):
+            response = cache.urlopen(server, 'GET', 'http://lemonde.fr')
+
+            assert response.status == 200
+            assert response.data == b'hello'
+            assert response.geturl() == 'http://lemonde.fr'
+
+        assert len(server.calls) == 1
+        assert cache.stats.hits == 2
+        assert cache.stats.misses == 1
+
+        # Headers are part of the key, POST is not cached
+        cache.urlopen(server, 'GET', 'http://lemonde.fr', headers={'Cookie': 'id=1'})
+        cache.urlopen(server, 'POST', 'http://lemonde.fr')
+        cache.urlopen(server, 'POST', 'http://lemonde.fr')
+
+        assert len(server.calls) == 4
+
+        # Streaming
+        response = cache.urlopen(server, 'GET', 'http://lemonde.fr', preload_content=False)
+
+        assert b''.join(response.stream(2)) == b'hello'
+
+        # Persistence
+        cache.close()
+        cache = HTTPCache(str(tmp_path))
+
+        assert len(cache) == 2
+        assert cache.urlopen(server, 'GET', 'http://lemonde.fr').data == b'hello'
+        assert len(server.calls) == 4
+
+    def test_errors(self, tmp_path):
+        cache = HTTPCache(str(tmp_path))
+        server = FakeServer(b'error', status=503)
+
+        cache.urlopen(server, 'GET', 'http://lemonde.fr')
+        response = cache.urlopen(server, 'GET', 'http://lemonde.fr')
+
+        assert response.data == b'error'
+        assert len(server.calls) == 2
+        assert len(cache) == 0
+
+    def test_revalidation(self, tmp_path):
+        cache = HTTPCache(str(tmp_path), ttl=0)
+        server = FakeServer(b'hello', headers={'ETag': '"v1"'})
+
+        cache.urlopen(server, 'GET', 'http://lemonde.fr')
+        response = cache.urlopen(server, 'GET', 'http://lemonde.fr')
+
+        assert response.status == 200
+        assert response.data == b'hello'
+        assert server.calls[-1]['If-None-Match'] == '"v1"'
+        assert cache.stats.revalidated == 1
+
+    def test_eviction(self, tmp_path):
+        cache = HTTPCache(str(tmp_path), max_size=100)
+
+        for i in range(10):
+            server = FakeServer(('page %i' % i).encode())
+            cache.urlopen(server, 'GET', 'http://lemonde.fr/%i' % i)
+
+        assert 0 < len(cache) < 10
+        assert cache.total_size <= 100
+
+        # Identical bodies are only stored once
+        cache = HTTPCache(str(tmp_path / 'dedupe'))
+        server = FakeServer(b'same')
+
+        cache.urlopen(server, 'GET', 'http://lemonde.fr/1')
+        size = cache.total_size
+        cache.urlopen(server, 'GET', 'http://lemonde.fr/2')
+
+        assert len(cache) == 2
+        assert cache.total_size == size
+
+    def test_streaming(self, tmp_path, chunked_server):
+        cache = HTTPCache(str(tmp_path))
+        http = create_pool(cache=cache)
+
+        def fetch(url, max_body_size=None):
+            response = http.request('GET', url, preload_content=False, release_conn=False)
+
+            try:
+                return b''.join(stream_response(response, max_body_size=max_body_size, chunk_size=10))
+            finally:
+                response.close()
+                response.release_conn()
+
+        # Misses are not buffered beforehand
+        response = http.request('GET', chunked_server + '/1', preload_content=False)
+
+        assert isinstance(response, InstrumentedHTTPResponse)
+        assert response.cache_writer is not None
+        response.close()
+
+        # Bodies are streamed & the size limit is enforced on chunked bodies
+        with pytest.raises(ResponseTooLargeError):
+            fetch(chunked_server + '/100', max_body_size=500)
+
+        assert len(cache) == 0
+        assert list((tmp_path / 'objects').glob('*.tmp')) == []
+
+        # Bodies read entirely are cached as they are streamed
+        assert fetch(chunked_server + '/30', max_body_size=500) == b'x' * 300
+        assert fetch(chunked_server + '/30') == b'x' * 300
+        assert http.request('GET', chunked_server + '/30').data == b'x' * 300
+
+        assert ChunkedHandler.calls == 3
+        assert len(cache) == 1
+        assert cache.stats.hits == 2
+
+        # Bodies larger than max_entry_size are streamed but not cached
+        cache.max_entry_size = 100
+
+        assert fetch(chunked_server + '/20') == b'x' * 200
+        assert len(cache) == 1
@@ -0,0 +1,111 @@
+# =============================================================================
+# Minet Instrumentation Unit Tests
+# =============================================================================
+import json
+from os.path import join
+
+from minet.instrumentation import (
+    Histogram,
+    Instrumentation,
+    NULL_INSTRUMENTATION,
+    OTHER_DOMAINS
+)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestInstrumentation(object):
+    def test_histogram(self):
+        histogram = Histogram()
+
+        assert histogram.percentile(0.5) is None
+
+        for i in range(1, 101):
+            histogram.add(i / 1000)
+
+        assert histogram.count == 100
+        assert histogram.min == 0.001
+        assert histogram.max == 0.1
+        assert abs(histogram.mean - 0.0505) < 1e-9
+
+        for p in [0.5, 0.9, 0.99]:
+            assert abs(histogram.percentile(p) - p / 10) <= 0.2 * p / 10
+
+        assert histogram.percentile(1) == 0.1
+
+    def test_jobs(self):
+        clock = FakeClock()
+        instrumentation = Instrumentation(max_domains=1, clock=clock)
+
+        items = list(instrumentation.track_queue(['a', 'b']))
+
+        clock.now = 1.0
+        instrumentation.start_job('lemonde.fr', items[0])
+
+        with instrumentation.timer('ttfb'):
+            clock.now = 1.5
+
+        # Timings of a same stage are summed, e.g. across redirections
+        instrumentation.record('ttfb', 0.25)
+        instrumentation.increment('bytes', 10)
+
+        clock.now = 2.0
+        timings = instrumentation.end_job()
+
+        assert timings == {'queue': 1.0, 'ttfb': 0.75}
+
+        instrumentation.start_job('liberation.fr', items[1])
+        clock.now = 2.5
+        instrumentation.increment('errors')
+        instrumentation.end_job()
+
+        # Timings recorded outside of any job are aggregated as is
+        instrumentation.record('ttfb', 0.5)
+
+        data = instrumentation.to_dict()
+
+        assert data['jobs']['count'] == 2
+        assert data['jobs']['total'] == 1.5
+        assert data['stages']['queue']['total'] == 3.0
+        assert data['stages']['ttfb']['count'] == 2
+        assert data['stages']['ttfb']['total'] == 1.25
+        assert data['counters'] == {'bytes': 10, 'errors': 1}
+        assert list(data['domains']) == ['lemonde.fr', OTHER_DOMAINS]
+        assert data['domains'][OTHER_DOMAINS]['counters'] == {'errors': 1}
+
+        assert instrumentation.postfix()['slowest'] == 'queue 71%'
+        assert instrumentation.format_stats().startswith('jobs=2 ')
+
+    def test_dump(self, tmpdir):
+        instrumentation = Instrumentation()
+
+        instrumentation.start_job('lemonde.fr')
+        instrumentation.record('body', 0.1)
+        instrumentation.end_job()
+
+        path = join(str(tmpdir), 'metrics.json')
+        instrumentation.dump(path, extra={'connections': {'requests': 1}})
+
+        with open(path) as f:
+            data = json.load(f)
+
+        assert data['stages']['body']['count'] == 1
+        assert data['connections'] == {'requests': 1}
+
+    def test_null_instrumentation(self):
+        items = [1, 2]
+
+        assert NULL_INSTRUMENTATION.track_queue(items) is items
+        assert NULL_INSTRUMENTATION.start_job('lemonde.fr', 1) is None
+
+        with NULL_INSTRUMENTATION.timer('body'):
+            NULL_INSTRUMENTATION.record('body', 1.0)
+            NULL_INSTRUMENTATION.increment('bytes')
+
+        assert NULL_INSTRUMENTATION.end_job() is None
@@ -0,0 +1,113 @@
+# =============================================================================
+# Minet Rate Limiting Unit Tests
+# =============================================================================
+import time
+from os.path import join
+from threading import Thread
+from multiprocessing import Process
+
+from minet.utils import rate_limited_method
+from minet.rate_limiting import (
+    GCRARateLimiter,
+    MemoryRateLimiterBackend,
+    SharedMemoryRateLimiterBackend,
+    FileRateLimiterBackend
+)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def reserve_many(limiter, n):
+    for _ in range(n):
+        limiter.reserve()
+
+
+class TestRateLimiting(object):
+    def test_gcra(self):
+        clock = FakeClock()
+        limiter = GCRARateLimiter(
+            6,
+            period=60,
+            backend=MemoryRateLimiterBackend(clock=clock)
+        )
+
+        assert limiter.reserve() == 0
+        assert limiter.reserve() == 10
+        assert limiter.reserve() == 20
+
+        clock.now = 100
+        assert limiter.reserve() == 0
+
+        clock.now = 105
+        assert limiter.reserve() == 5
+
+    def test_burst(self):
+        clock = FakeClock()
+        limiter = GCRARateLimiter(
+            1,
+            burst=3,
+            backend=MemoryRateLimiterBackend(clock=clock)
+        )
+
+        assert [limiter.reserve() for _ in range(5)] == [0, 0, 0, 1, 2]
+
+        # Bucket refills with time
+        clock.now = 10
+        assert [limiter.reserve() for _ in range(4)] == [0, 0, 0, 1]
+
+    def test_threads(self):
+        limiter = GCRARateLimiter(50, burst=5)
+
+        def worker():
+            for _ in range(5):
+                limiter.acquire()
+
+        threads = [Thread(target=worker) for _ in range(4)]
+
+        start = time.monotonic()
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        # 20 calls, 5 of them being allowed at once
+        assert time.monotonic() - start >= 15 / 50 - 0.01
+
+    def test_shared_backends(self, tmpdir):
+        backends = [
+            SharedMemoryRateLimiterBackend(),
+            FileRateLimiterBackend(join(str(tmpdir), 'rate_limit'))
+        ]
+
+        for backend in backends:
+            limiter = GCRARateLimiter(1, period=60, backend=backend)
+
+            processes = [Process(target=reserve_many, args=(limiter, 3)) for _ in range(2)]
+
+            for process in processes:
+                process.start()
+
+            for process in processes:
+                process.join()
+
+            # 6 slots were already reserved by the other processes
+            assert limiter.reserve() >= 5 * 60 - 1
+
+    def test_rate_limited_method(self):
+        class Client(object):
+            def __init__(self):
+                self.rate_limiter_state = GCRARateLimiter(1000)
+
+            @rate_limited_method()
+            def call(self):
+                return 'ok'
+
+        assert Client().call() == 'ok'
@@ -0,0 +1,101 @@
+# =============================================================================
+# Minet Retry Unit Tests
+# =============================================================================
+import pytest
+from random import Random
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    NewConnectionError,
+    ProtocolError,
+    ReadTimeoutError
+)
+
+from minet.retry import RetryPolicy, RetryQueue, classify_retryable_error
+
+
+class FakeResponse(object):
+    def __init__(self, status=200, headers={}):
+        self.status = status
+        self.headers = headers
+
+
+class TestRetry(object):
+    def test_classify_retryable_error(self):
+        assert classify_retryable_error(ConnectTimeoutError()) == 'connect-timeout'
+        assert classify_retryable_error(ReadTimeoutError(None, None, 'timeout')) == 'read-timeout'
+        assert classify_retryable_error(ProtocolError('Connection aborted.')) == 'connection-error'
+        assert classify_retryable_error(NewConnectionError(None, 'refused')) is None
+        assert classify_retryable_error(ValueError()) is None
+
+        assert classify_retryable_error(status=429) == 'too-many-requests'
+        assert classify_retryable_error(status=503) == 'server-error'
+        assert classify_retryable_error(status=500) is None
+        assert classify_retryable_error(status=200) is None
+
+    def test_policy(self):
+        with pytest.raises(TypeError):
+            RetryPolicy(retries={'unknown': 3})
+
+        with pytest.raises(TypeError):
+            RetryPolicy(retries=-1)
+
+        with pytest.raises(TypeError):
+            RetryPolicy(base_delay=10, max_delay=1)
+
+        policy = RetryPolicy(
+            retries={'read-timeout': 2, 'too-many-requests': 1},
+            base_delay=1,
+            max_delay=3,
+            rng=Random(0)
+        )
+
+        error = ReadTimeoutError(None, None, 'timeout')
+
+        # Backoff is exponential, jittered & capped
+        for retries, (low, high) in enumerate([(0.5, 1), (1, 2)]):
+            delay = policy.decide(retries, error=error)
+            assert low <= delay <= high
+
+        assert 1.5 <= policy.compute_delay(5) <= 3
+
+        assert policy.decide(2, error=error) is None
+        assert policy.decide(0, error=ConnectTimeoutError()) is None
+        assert policy.decide(0, response=FakeResponse(200)) is None
+
+        # Retry-After is honoured, up to max_delay
+        response = FakeResponse(429, {'retry-after': '2'})
+        assert policy.decide(0, response=response) == 2
+
+        response = FakeResponse(429, {'retry-after': '3600'})
+        assert policy.decide(0, response=response) == 3
+
+        assert policy.stats.to_dict() == {
+            'retries': 4,
+            'retried': {'read-timeout': 2, 'too-many-requests': 2},
+            'given_up': 2
+        }
+
+    def test_queue(self):
+        queue = RetryQueue(['a', 'b'])
+        seen = []
+
+        for item in queue:
+            seen.append(item)
+
+            # Deferring "b" once, which is not a retry
+            if item == 'b' and seen.count('b') == 1:
+                queue.defer(item, 0)
+                continue
+
+            # Retrying "a" twice
+            if item == 'a' and queue.retries(item) < 2:
+                queue.retry(item, 0)
+                continue
+
+            assert queue.retries(item) == (2 if item == 'a' else 0)
+            queue.done(item)
+
+        # Due retries come before new items
+        assert seen == ['a', 'a', 'a', 'b', 'b']
+        assert queue.in_flight == 0
+        assert queue.attempts == {}
@@ -1,8 +1,13 @@
 # =============================================================================
 # Minet Scrape Unit Tests
 # =============================================================================
+import sys
+import pytest
 from bs4 import BeautifulSoup
-from minet.scrape import scrape, headers_from_definition, tabulate
+from minet.scrape import scrape, headers_from_definition, tabulate, ParsedDocument, Scraper
+from minet.scrape.apply import apply_scraper
+from minet.scrape.compile import compile_scraper
+from minet.exceptions import InvalidScraperError
 
 BASIC_HTML = """
     <ul>
@@ -66,6 +71,33 @@ TABLE_TH_HTML = """
     </table>
 """
 
+NON_CONTENT_HTML = """
+    <!DOCTYPE html>
+    <!-- Before -->
+    <html>
+        <head>
+            <title>Title</title>
+            <style>.a > b { color: red; }</style>
+            <meta charset="utf-8">
+        </head>
+        <body>
+            <div id="a">Hello <b>world</b>
+                <!-- c --> <p class=" x  y " data-q='"quoted"'>para &amp; stuff</p>
+                <script>if (1 < 2 && 3) alert(1);</script>
+                <style>p { margin: 0; }</style>
+                <template><p>tpl <b>bold</b></p></template>
+                <pre>  x
+  y <b>  </b></pre>
+                <ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>
+                <ul><li>one<br>two</li><li>&lt;three&gt;&nbsp;<img src="a.png"></li></ul>
+            </div>
+            <script id="s">var x = "<b>";</script>
+            <template id="t"><p>in <i>tpl</i></p><script>z</script></template>
+            <div id="empty"> \t </div>
+        </body>
+    </html>
+"""
+
 
 class TestScrape(object):
     def test_basics(self):
@@ -473,3 +505,132 @@ class TestScrape(object):
         assert headers == ['id']
 
         headers = headers_from_definition({'sel': 'table', 'tabulate': True})
+
+    def test_parsed_document(self):
+        document = ParsedDocument(BASIC_HTML)
+
+        assert document.parsed_soup is None
+
+        ids = scrape({'iterator': 'li', 'item': 'id'}, document)
+        soup = document.parsed_soup
+
+        texts = Scraper({'iterator': 'li'})(document)
+        html = scrape({'sel': 'ul', 'eval': 'len(html)'}, document)
+
+        assert ids == ['li1', 'li2']
+        assert texts == ['One', 'Two']
+        assert html == len(BASIC_HTML)
+        assert document.parsed_soup is soup
+
+    def test_compile(self):
+        soup = BeautifulSoup(NESTED_HTML, 'lxml')
+
+        definitions = [
+            {'iterator': 'li', 'item': 'id'},
+            {'sel': 'li', 'fields': {'first': {'sel': '.first'}, 'id': 'id'}},
+            {'iterator': 'span', 'item': {'format': '<{value}>', 'transform': ['upper', 'strip']}},
+            {'iterator': 'li', 'item': {'eval': 'element.get("id") * 2'}, 'filter_eval': '"1" in value'},
+            {'iterator': '.second', 'uniq': True, 'join': '|'},
+            {'$$': 'li', 'context': {'first': {'sel': '.first'}}, 'item': {'get': 'first'}}
+        ]
+
+        for definition in definitions:
+            plan = compile_scraper(definition)
+
+            assert plan(soup, root=soup, html=NESTED_HTML) == apply_scraper(definition, soup, root=soup, html=NESTED_HTML)
+
+    def test_plan_cache(self, monkeypatch):
+        compiled = []
+
+        def counting_compile_scraper(definition):
+            compiled.append(definition)
+            return compile_scraper(definition)
+
+        monkeypatch.setattr(sys.modules['minet.scrape'], 'compile_scraper', counting_compile_scraper)
+
+        definition = {'iterator': 'li', 'item': 'id'}
+
+        for _ in range(3):
+            assert scrape(definition, NESTED_HTML) == ['li1', 'li2']
+
+        assert compiled == [definition]
+
+        # An equal but distinct definition gets its own plan
+        assert scrape(dict(definition), NESTED_HTML) == ['li1', 'li2']
+        assert len(compiled) == 2
+
+    def test_validate(self):
+        with pytest.raises(InvalidScraperError) as info:
+            Scraper({
+                'iterator': 'li[',
+                'fields': {
+                    'id': {'attr': 'id', 'eval': 'value +'},
+                    'text': {'transform': 'unknown'}
+                }
+            })
+
+        assert [path for path, _ in info.value.errors] == [
+            ['iterator'],
+            ['fields', 'id', 'eval'],
+            ['fields', 'text', 'transform']
+        ]
+
+    def test_lxml_engine(self):
+        definitions = [
+            ({'iterator': 'li', 'item': 'id'}, BASIC_HTML),
+            ({'sel': '#ok', 'iterator': 'li', 'item': {'attr': 'id'}}, META_HTML),
+            ({'sel': 'ul'}, META_HTML),
+            ({'iterator': 'li', 'item': {'attr': 'class', 'default': 'no-class'}}, BASIC_HTML),
+            ({'iterator': 'li:nth-child(2)', 'item': {'format': '<{value}>'}}, HOLEY_HTML),
+            ({'iterator': 'li', 'fields': {'first': {'sel': '.first'}, 'class': 'class'}}, NESTED_HTML),
+            ({'iterator': 'li', 'item': {'extract': 'inner_html'}}, NESTED_HTML),
+            ({'iterator': 'tbody > tr', 'item': {'sel': 'td', 'transform': 'upper'}}, TABLE_TH_HTML)
+        ]
+
+        for definition, html in definitions:
+            scraper = Scraper(definition, engine='lxml')
+
+            assert scraper.engine == 'lxml'
+            assert scraper(html) == scrape(definition, html)
+
+        scraper = Scraper({'iterator': 'li', 'engine': 'lxml'})
+
+        assert scraper.engine == 'lxml'
+        assert scraper(ParsedDocument(BASIC_HTML)) == ['One', 'Two']
+
+        # Definitions relying on python evaluation need BeautifulSoup
+        scraper = Scraper({
+            'iterator': 'li',
+            'item': {'eval': 'element.get("id") + "-ok"'}
+        }, engine='lxml')
+
+        assert scraper.engine == 'bs4'
+        assert scraper(BASIC_HTML) == ['li1-ok', 'li2-ok']
+
+        with pytest.raises(InvalidScraperError):
+            Scraper({'iterator': 'li', 'engine': 'unknown'})
+
+    def test_lxml_engine_parity(self):
+        selectors = [
+            None, 'html', 'head', 'title', 'body', '#a', '#a p', 'pre',
+            'pre b', '#s', '#t', '#t p', 'ruby', 'rt', 'ul', 'li', '#empty',
+            '#missing'
+        ]
+
+        for html in [NON_CONTENT_HTML, BASIC_HTML, NESTED_HTML, TABLE_TH_HTML]:
+            for sel in selectors:
+                for extractor_name in ['text', 'html', 'inner_html', 'outer_html']:
+                    definition = {'extract': extractor_name}
+
+                    if sel is not None:
+                        definition['sel'] = sel
+
+                    expected = scrape(definition, html)
+
+                    assert Scraper(definition, engine='lxml')(html) == expected
+                    assert apply_scraper(definition, BeautifulSoup(html, 'lxml')) == expected
+
+        # Strings of <script>, <style>, <template>, <rt> & <rp> are skipped
+        text = Scraper({'sel': '#a'}, engine='lxml')(NON_CONTENT_HTML)
+
+        assert text == 'Hello world\n para & stuff\n\n\n\n  x\n  y   \n漢\nonetwo<three>'
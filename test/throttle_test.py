@@ -0,0 +1,144 @@
+# =============================================================================
+# Minet Adaptive Throttle Unit Tests
+# =============================================================================
+import pytest
+from urllib3.exceptions import ReadTimeoutError, NewConnectionError
+
+from minet.throttle import AdaptiveThrottle, parse_retry_after
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse(object):
+    def __init__(self, status=200, headers={}):
+        self.status = status
+        self.headers = headers
+
+
+class TestThrottle(object):
+    def test_parse_retry_after(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('120') == 120
+        assert parse_retry_after(' 3 ') == 3
+        assert parse_retry_after('test') is None
+        assert parse_retry_after('-5') is None
+
+        now = 784111777 - 30
+
+        assert parse_retry_after('Sun, 06 Nov 1994 08:49:37 GMT', now=now) == 30
+        assert parse_retry_after('Sun, 06 Nov 1994 08:49:37 GMT', now=now + 60) == 0
+
+    def test_validation(self):
+        with pytest.raises(TypeError):
+            AdaptiveThrottle(min_delay=-1)
+
+        with pytest.raises(TypeError):
+            AdaptiveThrottle(min_delay=5, max_delay=1)
+
+        with pytest.raises(TypeError):
+            AdaptiveThrottle(max_parallelism=0)
+
+        with pytest.raises(TypeError):
+            AdaptiveThrottle(smoothing=0)
+
+    def test_adaptation(self):
+        clock = FakeClock()
+        throttle = AdaptiveThrottle(
+            initial_delay=0.5,
+            min_delay=0.01,
+            max_parallelism=4,
+            smoothing=0.5,
+            clock=clock
+        )
+
+        # Unknown domains use the initial delay
+        assert throttle('lemonde.fr') == 0.5
+
+        # Known domains are spaced by latency / parallelism
+        throttle.observe('lemonde.fr', 0.2, response=FakeResponse())
+        stats = throttle.stats()['lemonde.fr']
+
+        assert stats['parallelism'] == 2
+        assert throttle('lemonde.fr') == 0.1
+
+        for _ in range(10):
+            throttle.observe('lemonde.fr', 0.2, response=FakeResponse())
+
+        assert throttle.stats()['lemonde.fr']['parallelism'] == 4
+        assert throttle('lemonde.fr') == 0.05
+
+        # Congestion halves parallelism
+        clock.now = 10
+        throttle.observe('lemonde.fr', 0.2, response=FakeResponse(503))
+
+        assert throttle.stats()['lemonde.fr']['parallelism'] == 2
+
+        # But only once per window
+        clock.now = 10.1
+        throttle.observe('lemonde.fr', 0.2, response=FakeResponse(429))
+
+        assert throttle.stats()['lemonde.fr']['parallelism'] == 2
+
+        clock.now = 11
+        throttle.observe('lemonde.fr', 0.2, error=ReadTimeoutError(None, None, 'timeout'))
+
+        assert throttle.stats()['lemonde.fr']['parallelism'] == 1
+
+        # Not speeding up again while congestion is still frequent
+        throttle.observe('lemonde.fr', 0.2, response=FakeResponse())
+
+        assert throttle.stats()['lemonde.fr']['parallelism'] == 1
+
+        # Errors that are not congestion signals are not penalized
+        throttle.observe('liberation.fr', 5, error=NewConnectionError(None, 'refused'))
+        stats = throttle.stats()['liberation.fr']
+
+        assert stats['latency'] is None
+        assert stats['errors'] == 0
+        assert stats['parallelism'] == 2
+
+        # Parallelism is probed slowly near the last congestion point
+        throttle = AdaptiveThrottle(smoothing=1, clock=clock)
+        throttle.observe('lefigaro.fr', 0.1, response=FakeResponse(429))
+        throttle.observe('lefigaro.fr', 0.1, response=FakeResponse())
+
+        assert abs(throttle.stats()['lefigaro.fr']['parallelism'] - 0.9) < 1e-9
+
+        throttle.observe('lefigaro.fr', 0.1, response=FakeResponse())
+
+        assert abs(throttle.stats()['lefigaro.fr']['parallelism'] - 1.0) < 1e-9
+
+    def test_retry_after(self):
+        clock = FakeClock()
+        throttle = AdaptiveThrottle(max_delay=10, clock=clock)
+
+        assert throttle.blocked_for('lemonde.fr') == 0
+
+        response = FakeResponse(429, {'retry-after': '5'})
+        throttle.observe('lemonde.fr', 0.1, response=response)
+
+        stats = throttle.stats()['lemonde.fr']
+
+        assert stats['retry_afters'] == 1
+        assert stats['throttle'] == 5
+        assert throttle.blocked_for('lemonde.fr') == 5
+
+        clock.now = 4
+        assert throttle('lemonde.fr') == 1
+        assert throttle.blocked_for('lemonde.fr') == 1
+
+        clock.now = 6
+        assert throttle.blocked_for('lemonde.fr') == 0
+        clock.now = 4
+
+        # Retry-After is capped by max_delay
+        response = FakeResponse(503, {'retry-after': '3600'})
+        throttle.observe('lemonde.fr', 0.1, response=response)
+
+        assert throttle('lemonde.fr') == 10
@@ -0,0 +1,33 @@
+# =============================================================================
+# Minet Url Cache Unit Tests
+# =============================================================================
+from ural import get_domain_name as ural_get_domain_name
+
+from minet.url_cache import get_domain_name, url_cache_stats, clear_url_caches
+
+URLS = [
+    'https://www.lemonde.fr/politique/article.html?q=1',
+    'http://www.lemonde.fr',
+    'lemonde.fr/path//other',
+    '//user:pass@sub.example.co.uk:8080/?x=//test.com',
+    'http:/lemonde.fr',
+    'example.com?next=//other.com/#frag',
+    'mailto:someone@example.com',
+    '[::1',
+    ''
+]
+
+
+class TestUrlCache(object):
+    def test_get_domain_name(self):
+        clear_url_caches()
+
+        for url in URLS:
+            assert get_domain_name(url) == ural_get_domain_name(url), url
+
+        assert get_domain_name('https://www.lemonde.fr/other') == 'lemonde.fr'
+
+        stats = url_cache_stats()['get_domain_name']
+
+        assert stats['hits'] == 1
+        assert stats['misses'] == len(URLS)
@@ -1,7 +1,11 @@
 # =============================================================================
 # Minet Utils Unit Tests
 # =============================================================================
+from urllib3 import HTTPResponse
+
 from minet.utils import (
+    create_pool,
+    sniff_response_encoding,
     nested_get,
     parse_http_refresh,
     find_meta_refresh,
@@ -89,3 +93,45 @@ class TestUtils(object):
         location = find_javascript_relocation(b'NOTHING')
 
         assert location is None
+
+    def test_create_pool(self):
+        http = create_pool(threads=10, domain_parallelism=4)
+        pool = http.connection_from_url('https://www.lemonde.fr')
+
+        assert pool.pool.maxsize == 4
+        assert pool.connection_stats is http.connection_stats
+
+        http = create_pool(threads=2, domain_parallelism=4)
+
+        assert http.connection_from_url('https://www.lemonde.fr').pool.maxsize == 2
+
+        stats = http.connection_stats
+
+        for _ in range(4):
+            stats.add_request()
+
+        stats.add_new_connection()
+
+        assert stats.reused_connections == 3
+        assert stats.reuse_rate == 0.75
+
+    def test_sniff_response_encoding(self):
+        def sniff(body, content_type='text/html'):
+            response = HTTPResponse(body=body, headers={'Content-Type': content_type})
+
+            return sniff_response_encoding(response, is_xml=True, use_chardet=True)
+
+        text = '東京は日本の首都であり、世界有数の大都市です。' * 5
+
+        assert sniff(b'') == (None, None)
+        assert sniff(b'<p>Hello</p>', 'text/html; charset=ISO-8859-1') == ('iso-8859-1', 'header')
+        assert sniff(b'\xef\xbb\xbf<p>Hello</p>', 'text/html; charset=latin1') == ('utf-8', 'bom')
+        assert sniff(b'<meta charset="windows-1252"><p>Hello</p>') == ('windows-1252', 'meta')
+        assert sniff(b'<?xml version="1.0" encoding="ISO-8859-15"?><a/>') == ('iso-8859-15', 'meta')
+        assert sniff(b'<meta charset="utf-8">\n<meta charset="windows-1252">') == ('windows-1252', 'meta')
+        assert sniff(b'<p>Hello</p>') == ('utf-8', 'ascii')
+        assert sniff(('<p>%s</p>' % text).encode('utf-8')) == ('utf-8', 'utf8')
+        assert sniff(('<p>%s</p>' % text).encode('shift_jis')) == ('shift_jis', 'chardet')
+
+        # Meta tags are only searched in the head of the document
+        assert sniff(b' ' * 100000 + b'<meta charset="windows-1252">')[1] == 'ascii'